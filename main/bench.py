@@ -0,0 +1,461 @@
+import asyncio
+import io
+import json
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.hashers import make_password
+from django.core.handlers.wsgi import WSGIHandler
+from django.db.models import Count
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from django.utils import timezone
+
+from services.cache import POPULAR_SERVICES, bump_field_versions, bump_version
+from services.conditional import SERVICES, touch
+from services.facets import get_facets, invalidate_facets
+from services.models import Service, ServiceRequest, Review
+from users.models import User, Company, Customer
+from utils import AsyncViewsASGIHandler
+
+from .instrumentation import QueryStats
+
+FIELDS = [name for name, _ in Company.FIELD_CHOICES]
+# Roughly how often each status shows up in a real request history
+STATUS_WEIGHTS = {'PENDING': 20, 'ACCEPTED': 15, 'COMPLETED': 55, 'CANCELLED': 10}
+# Reviews lean towards four and five stars
+RATING_WEIGHTS = [5, 5, 10, 30, 50]
+BENCH_PASSWORD = 'bench-password'
+# Read-only pages that have async views, for comparing ASGI with WSGI
+ASYNC_VIEW_URLS = ('main:home', 'services_list', 'service_detail', 'service_field', 'profile')
+
+
+def _zipf_weights(n, s=1.1):
+    return [1 / (rank ** s) for rank in range(1, n + 1)]
+
+
+def seed(companies=50, customers=500, services=400, requests=5000, review_ratio=0.6,
+         prefix='bench', random_seed=0, batch_size=1000, stdout=None):
+    """
+    Bulk-insert a benchmark dataset whose shape follows real traffic: a few
+    companies own most services, a few services get most requests, most
+    customers book once or twice and completed requests are usually reviewed.
+    Every account shares the password ``BENCH_PASSWORD``. Returns the number
+    of rows created per model.
+    """
+    rng = random.Random(random_seed)
+    now = timezone.now()
+    password = make_password(BENCH_PASSWORD)
+    log = stdout.write if stdout else (lambda message: None)
+
+    # Accounts
+    company_names = [f'{prefix}-company-{i}' for i in range(companies)]
+    customer_names = [f'{prefix}-customer-{i}' for i in range(customers)]
+    User.objects.bulk_create([
+        User(username=name, email=f'{name}@example.com', password=password,
+             is_company=i < companies, is_customer=i >= companies)
+        for i, name in enumerate(company_names + customer_names)
+    ], batch_size=batch_size)
+    # SQLite does not hand back primary keys from bulk_create
+    user_ids = dict(User.objects.filter(username__startswith=f'{prefix}-').values_list('username', 'id'))
+
+    company_fields = rng.choices(FIELDS, weights=[4] + [1] * (len(FIELDS) - 1), k=companies)
+    Company.objects.bulk_create([
+        Company(user_id=user_ids[name], field=field, description=f'{field} specialists')
+        for name, field in zip(company_names, company_fields)
+    ], batch_size=batch_size)
+    Customer.objects.bulk_create([
+        Customer(user_id=user_ids[name],
+                 date_of_birth=(now - timedelta(days=rng.randint(18 * 365, 80 * 365))).date())
+        for name in customer_names
+    ], batch_size=batch_size)
+    log(f"Created {companies} companies and {customers} customers")
+
+    # Services, most of them owned by the first few companies
+    owners = rng.choices(range(companies), weights=_zipf_weights(companies), k=services)
+    service_objs = []
+    for i, owner in enumerate(owners):
+        field = company_fields[owner]
+        if field == 'All in One':
+            field = rng.choice(FIELDS[1:])
+        service_objs.append(Service(
+            company_id=user_ids[company_names[owner]],
+            name=f'{field} service {i}'[:40],
+            description=f'{field} work by {company_names[owner]}: repairs, installs and maintenance.',
+            price_hour=Decimal(rng.randint(1500, 12000)) / 100,
+            field=field,
+        ))
+    Service.objects.bulk_create(service_objs, batch_size=batch_size)
+    service_ids = list(Service.objects.filter(
+        company__user__username__startswith=f'{prefix}-').order_by('id').values_list('id', 'price_hour'))
+    log(f"Created {len(service_ids)} services")
+
+    # Requests: popular services and a few heavy customers dominate
+    service_weights = _zipf_weights(len(service_ids))
+    customer_weights = _zipf_weights(customers, s=0.8)
+    statuses, status_weights = zip(*STATUS_WEIGHTS.items())
+    request_objs = []
+    for service_id, price_hour in rng.choices(service_ids, weights=service_weights, k=requests):
+        status = rng.choices(statuses, weights=status_weights)[0]
+        # Finished work lies in the past, open work mostly ahead
+        days = -rng.randint(1, 365) if status in ('COMPLETED', 'CANCELLED') else rng.randint(-7, 60)
+        hours_needed = rng.randint(1, 8)
+        request_objs.append(ServiceRequest(
+            service_id=service_id,
+            customer_id=user_ids[rng.choices(customer_names, weights=customer_weights)[0]],
+            requested_date=now + timedelta(days=days, hours=rng.randint(8, 18)),
+            address=f'{rng.randint(1, 200)} Bench Street',
+            hours_needed=hours_needed,
+            total_cost=price_hour * hours_needed,
+            status=status,
+        ))
+    ServiceRequest.objects.bulk_create(request_objs, batch_size=batch_size)
+    log(f"Created {len(request_objs)} service requests")
+
+    completed = ServiceRequest.objects.filter(
+        customer__user__username__startswith=f'{prefix}-', status='COMPLETED'
+    ).values_list('id', 'service_id', 'customer_id')
+    review_objs = [
+        Review(service_request_id=request_id, service_id=service_id, customer_id=customer_id,
+               rating=rng.choices(range(1, 6), weights=RATING_WEIGHTS)[0],
+               comment=rng.choice(['', '', 'Great work.', 'On time and tidy.', 'Would book again.']))
+        for request_id, service_id, customer_id in completed.iterator()
+        if rng.random() < review_ratio
+    ]
+    Review.objects.bulk_create(review_objs, batch_size=batch_size)
+    log(f"Created {len(review_objs)} reviews")
+
+    # bulk_create skips the signals and save() overrides behind these
+    Service.reconcile_request_counts()
+    Review.recompute_ratings()
+    bump_version(POPULAR_SERVICES)
+    bump_field_versions(FIELDS)
+    invalidate_facets(FIELDS)
+    touch(SERVICES)
+    # Measured requests shouldn't pay for the navbar's first facet computation
+    get_facets()
+
+    return {
+        'companies': companies,
+        'customers': customers,
+        'services': len(service_ids),
+        'requests': len(request_objs),
+        'reviews': len(review_objs),
+    }
+
+
+def _walk(patterns, namespace=None):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            ns = pattern.namespace
+            if ns and namespace:
+                ns = f'{namespace}:{ns}'
+            yield from _walk(pattern.url_patterns, ns or namespace)
+        elif isinstance(pattern, URLPattern):
+            name = pattern.name and (f'{namespace}:{pattern.name}' if namespace else pattern.name)
+            yield name, list(pattern.pattern.regex.groupindex)
+
+
+def discover_urls(skip=('admin:', 'main:logout')):
+    """Every named URL in the project as ``(name, kwarg names)``, minus ``skip`` prefixes."""
+    return [
+        (name, kwargs) for name, kwargs in _walk(get_resolver().url_patterns)
+        if name and not name.startswith(skip)
+    ]
+
+
+class Role:
+    def __init__(self, name, user=None):
+        self.name = name
+        self.user = user
+        self.cookie = None
+
+    def login(self):
+        if self.user is None:
+            return
+        engine = import_module(settings.SESSION_ENGINE)
+        session = engine.SessionStore()
+        session[SESSION_KEY] = self.user._meta.pk.value_to_string(self.user)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = self.user.get_session_auth_hash()
+        session.create()
+        self.session = session
+        self.cookie = f'{settings.SESSION_COOKIE_NAME}={session.session_key}'
+
+    def logout(self):
+        if self.cookie:
+            self.session.delete()
+
+
+def default_roles(prefix='bench'):
+    """Anonymous visitor plus the busiest customer and company, preferring benchmark data."""
+    customers = Customer.objects.select_related('user').annotate(n=Count('servicerequest')).order_by('-n')
+    companies = Company.objects.select_related('user').annotate(n=Count('service')).order_by('-n')
+    customer = customers.filter(user__username__startswith=f'{prefix}-').first() or customers.first()
+    company = companies.filter(user__username__startswith=f'{prefix}-').first() or companies.first()
+    roles = [Role('anonymous')]
+    if customer:
+        roles.append(Role('customer', customer.user))
+    if company:
+        roles.append(Role('company', company.user))
+    return roles
+
+
+def sample_kwargs(role, kwarg_names):
+    """Realistic URL arguments for ``role``: the most requested service, one of its own requests, etc."""
+    service = Service.objects.order_by('-request_count', '-id').first()
+    requests = ServiceRequest.objects.order_by('-requested_date')
+    if role.name == 'company':
+        request = requests.filter(service__company__user=role.user).first()
+        username = role.user.username
+    elif role.name == 'customer':
+        request = (requests.filter(customer__user=role.user, status='COMPLETED', review__isnull=True).first()
+                   or requests.filter(customer__user=role.user).first())
+        username = role.user.username
+    else:
+        request = requests.first()
+        username = service.company.user.username if service else None
+    values = {
+        'id': service and service.id,
+        'request_id': request and request.id,
+        'field': service and service.field,
+        'username': username,
+    }
+    if any(values.get(name) is None for name in kwarg_names):
+        return None
+    return {name: values[name] for name in kwarg_names}
+
+
+def percentile(samples, pct):
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method='inclusive')[pct - 1]
+
+
+def _environ(path, host, cookie=None, query_string=''):
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': query_string,
+        'SCRIPT_NAME': '',
+        'SERVER_NAME': host,
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': host,
+        'wsgi.url_scheme': 'http',
+        'wsgi.errors': sys.stderr,
+    }
+    if cookie:
+        environ['HTTP_COOKIE'] = cookie
+    return environ
+
+
+def _wsgi_get(handler, environ):
+    """Make one request through a WSGI handler, reading the whole body, and return the status code."""
+    start_response_status = []
+    response = handler(
+        dict(environ, **{'wsgi.input': io.BytesIO()}),
+        lambda status, headers, exc_info=None: start_response_status.append(status),
+    )
+    try:
+        for _ in response:
+            pass
+    finally:
+        response.close()
+    return int(start_response_status[0].split()[0])
+
+
+def _asgi_scope(path, host, cookie=None):
+    headers = [(b'host', host.encode())]
+    if cookie:
+        headers.append((b'cookie', cookie.encode()))
+    return {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': b'',
+        'root_path': '',
+        'headers': headers,
+        'client': ('127.0.0.1', 0),
+        'server': (host, 80),
+    }
+
+
+async def _asgi_get(handler, scope):
+    """Make one request through an ASGI handler and return the status code."""
+    status = None
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    await handler(scope, receive, send)
+    return status
+
+
+def read_only_paths(role=None):
+    """Paths of the pages served by async views, filled in with sample data for ``role``."""
+    role = role or Role('anonymous')
+    urls = dict(discover_urls())
+    paths = []
+    for name in ASYNC_VIEW_URLS:
+        kwargs = sample_kwargs(role, urls[name])
+        if kwargs is not None:
+            paths.append(reverse(name, kwargs=kwargs))
+    return paths
+
+
+def run(iterations=20, warmup=2, roles=None, urls=None, host='localhost', stdout=None):
+    """
+    Drive every URL through the WSGI handler once per role, ``warmup`` times
+    untimed and then ``iterations`` times, and return one result per
+    (role, URL) with latency percentiles in milliseconds, queries per request
+    and requests per second.
+    """
+    handler = WSGIHandler()
+    roles = roles if roles is not None else default_roles()
+    urls = urls if urls is not None else discover_urls()
+    log = stdout.write if stdout else (lambda message: None)
+    results = []
+
+    for role in roles:
+        role.login()
+        try:
+            for name, kwarg_names in urls:
+                kwargs = sample_kwargs(role, kwarg_names)
+                if kwargs is None:
+                    log(f"Skipping {name} for {role.name}: no data to fill {', '.join(kwarg_names)}")
+                    continue
+                path = reverse(name, kwargs=kwargs)
+                environ = _environ(path, host, role.cookie, 'q=repair' if name == 'service_search' else '')
+
+                timings, queries, status = [], [], None
+                for i in range(warmup + iterations):
+                    stats = QueryStats()
+                    started = time.perf_counter()
+                    with stats.record():
+                        status = _wsgi_get(handler, environ)
+                    elapsed = time.perf_counter() - started
+                    if i >= warmup:
+                        timings.append(elapsed * 1000)
+                        queries.append(stats.queries)
+
+                result = {
+                    'name': name,
+                    'role': role.name,
+                    'path': path,
+                    'status': status,
+                    'iterations': iterations,
+                    'p50_ms': round(percentile(timings, 50), 3),
+                    'p95_ms': round(percentile(timings, 95), 3),
+                    'p99_ms': round(percentile(timings, 99), 3),
+                    'mean_ms': round(statistics.mean(timings), 3),
+                    'queries': max(queries),
+                    'throughput_rps': round(len(timings) / (sum(timings) / 1000), 1),
+                }
+                results.append(result)
+                log(
+                    f"{role.name:<10} {name:<32} {status} p50 {result['p50_ms']:8.2f}ms "
+                    f"p95 {result['p95_ms']:8.2f}ms p99 {result['p99_ms']:8.2f}ms "
+                    f"{result['queries']:3d} queries {result['throughput_rps']:8.1f} req/s"
+                )
+        finally:
+            role.logout()
+    return results
+
+
+def _summarize(interface, concurrency, timings, statuses, wall_time):
+    return {
+        'interface': interface,
+        'concurrency': concurrency,
+        'requests': len(timings),
+        'errors': sum(1 for status in statuses if status not in (200, 304)),
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'throughput_rps': round(len(timings) / wall_time, 1),
+    }
+
+
+def run_wsgi_concurrency(paths, concurrency, requests, host='localhost', cookie=None):
+    """
+    Send ``requests`` GETs, cycling through ``paths``, to the WSGI handler
+    from ``concurrency`` threads, as a threaded WSGI server would.
+    """
+    handler = WSGIHandler()
+    environs = [_environ(path, host, cookie) for path in paths]
+
+    def get(i):
+        started = time.perf_counter()
+        status = _wsgi_get(handler, environs[i % len(environs)])
+        return (time.perf_counter() - started) * 1000, status
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(get, range(requests)))
+    wall_time = time.perf_counter() - started
+    return _summarize('wsgi', concurrency, [t for t, _ in samples], [s for _, s in samples], wall_time)
+
+
+def run_asgi_concurrency(paths, concurrency, requests, host='localhost', cookie=None):
+    """
+    Send ``requests`` GETs, cycling through ``paths``, to the ASGI handler
+    from ``concurrency`` tasks on one event loop, as an ASGI server would.
+    """
+    handler = AsyncViewsASGIHandler()
+    scopes = [_asgi_scope(path, host, cookie) for path in paths]
+    samples = []
+
+    async def client(numbers):
+        for i in numbers:
+            started = time.perf_counter()
+            status = await _asgi_get(handler, scopes[i % len(scopes)])
+            samples.append(((time.perf_counter() - started) * 1000, status))
+
+    async def main():
+        numbers = iter(range(requests))
+        await asyncio.gather(*(client(numbers) for _ in range(concurrency)))
+
+    started = time.perf_counter()
+    asyncio.run(main())
+    wall_time = time.perf_counter() - started
+    return _summarize('asgi', concurrency, [t for t, _ in samples], [s for _, s in samples], wall_time)
+
+
+def compare(previous, current):
+    """Lines describing how p95 latency and query counts moved between two bench runs."""
+    before = {(r['role'], r['name']): r for r in previous['results']}
+    lines = []
+    for result in current['results']:
+        old = before.get((result['role'], result['name']))
+        if old is None:
+            lines.append(f"{result['role']:<10} {result['name']:<32} new")
+            continue
+        change = (result['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100 if old['p95_ms'] else 0
+        queries = result['queries'] - old['queries']
+        lines.append(
+            f"{result['role']:<10} {result['name']:<32} p95 {old['p95_ms']:.2f} -> {result['p95_ms']:.2f}ms "
+            f"({change:+.0f}%), queries {old['queries']} -> {result['queries']}"
+            + (f" ({queries:+d})" if queries else "")
+        )
+    return lines
+
+
+def write_report(path, results, **meta):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'meta': meta, 'results': results}, f, indent=2, sort_keys=True)
@@ -0,0 +1,177 @@
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('netfix.performance')
+
+_current_stats = contextvars.ContextVar('query_stats', default=None)
+
+# Budgets describe page views; logins, signups and other writes are expected
+# to cost more and aren't checked
+BUDGETED_METHODS = ('GET', 'HEAD')
+
+
+def current_query_stats():
+    """The QueryStats recording the current request, if any; follows it into sync_to_async threads."""
+    return _current_stats.get()
+
+
+class QueryStats:
+    """Database execute wrapper that counts queries and the time spent in them."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.wall_time = 0.0
+        # Whether the request filled a site-wide cache, see note_cold_cache
+        self.cold = False
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - start
+
+    @contextmanager
+    def count_queries(self):
+        """Count the queries run on this thread's connections."""
+        with ExitStack() as stack:
+            for connection in connections.all():
+                if self not in connection.execute_wrappers:
+                    stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+    @contextmanager
+    def record(self):
+        start = time.perf_counter()
+        token = _current_stats.set(self)
+        try:
+            with self.count_queries():
+                yield self
+        finally:
+            _current_stats.reset(token)
+            self.wall_time += time.perf_counter() - start
+
+
+class ViewStats:
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.max_queries = 0
+        self.db_time = 0.0
+        self.wall_time = 0.0
+
+    def add(self, stats):
+        self.requests += 1
+        self.queries += stats.queries
+        self.max_queries = max(self.max_queries, stats.queries)
+        self.db_time += stats.db_time
+        self.wall_time += stats.wall_time
+
+    def as_dict(self):
+        return {
+            'requests': self.requests,
+            'avg_queries': self.queries / self.requests,
+            'max_queries': self.max_queries,
+            'avg_db_ms': self.db_time * 1000 / self.requests,
+            'avg_wall_ms': self.wall_time * 1000 / self.requests,
+        }
+
+
+_view_stats = {}
+_lock = threading.Lock()
+
+
+def get_view_stats():
+    """Per-URL-name totals recorded by the middleware since startup (or the last reset)."""
+    with _lock:
+        return {name: stats.as_dict() for name, stats in _view_stats.items()}
+
+
+def reset_view_stats():
+    with _lock:
+        _view_stats.clear()
+
+
+def note_cold_cache():
+    """
+    Record that the current request is filling a cache every page shares,
+    like the navbar's facets, so it is held to its cold budget.
+    """
+    stats = current_query_stats()
+    if stats is not None:
+        stats.cold = True
+
+
+def get_query_budget(view_name, cold=False):
+    budget = getattr(settings, 'QUERY_BUDGETS', {}).get(view_name)
+    if cold:
+        return getattr(settings, 'COLD_QUERY_BUDGETS', {}).get(view_name, budget)
+    return budget
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Record query count, database time and wall time for every request under
+    its resolved URL name, and warn when a GET or HEAD goes over its view's
+    query budget from settings.QUERY_BUDGETS, or COLD_QUERY_BUDGETS when it
+    filled a shared cache. The numbers for the current request are left
+    on ``request.query_stats`` for tests to inspect.
+
+    Keep it first in MIDDLEWARE so session and user lookups are counted too.
+    Under ASGI only queries on the request's own thread or run through
+    utils.db_sync_to_async are seen.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Lets Django await this middleware instead of giving it a thread
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        stats = QueryStats()
+        with stats.record():
+            response = self.get_response(request)
+        return self.process_stats(request, response, stats)
+
+    async def __acall__(self, request):
+        stats = QueryStats()
+        with stats.record():
+            response = await self.get_response(request)
+        return self.process_stats(request, response, stats)
+
+    def process_stats(self, request, response, stats):
+        request.query_stats = stats
+
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return response
+        view_name = match.view_name
+        with _lock:
+            _view_stats.setdefault(view_name, ViewStats()).add(stats)
+
+        budget = get_query_budget(view_name, stats.cold) if request.method in BUDGETED_METHODS else None
+        if budget is not None and stats.queries > budget:
+            logger.warning(
+                "%s ran %d queries (budget %d) for %s",
+                view_name, stats.queries, budget, request.path,
+            )
+        if settings.DEBUG:
+            response['Server-Timing'] = (
+                f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries", '
+                f'total;dur={stats.wall_time * 1000:.1f}'
+            )
+        return response
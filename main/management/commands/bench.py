@@ -0,0 +1,61 @@
+import json
+import os
+import platform
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from main import bench
+
+
+class Command(BaseCommand):
+    help = (
+        "Request every URL in the project through the WSGI handler as an anonymous visitor, "
+        "a customer and a company, and report p50/p95/p99 latency, queries per request and "
+        "throughput. Results are written as JSON for comparing releases."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20, help="Timed requests per URL and role.")
+        parser.add_argument('--warmup', type=int, default=2, help="Untimed requests before timing starts.")
+        parser.add_argument('--output', default='bench.json', help="Where to write the JSON report.")
+        parser.add_argument('--compare', help="Earlier JSON report to compare against.")
+        parser.add_argument('--only', action='append', default=[], help="Limit to URL names starting with this.")
+        parser.add_argument('--host', default='localhost', help="Host header; must be in ALLOWED_HOSTS.")
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError("--iterations must be at least 1")
+        previous = None
+        if options['compare']:
+            if not os.path.exists(options['compare']):
+                raise CommandError(f"{options['compare']} does not exist")
+            with open(options['compare'], encoding='utf-8') as f:
+                previous = json.load(f)
+
+        urls = bench.discover_urls()
+        if options['only']:
+            urls = [(name, kwargs) for name, kwargs in urls if name.startswith(tuple(options['only']))]
+        results = bench.run(
+            iterations=options['iterations'],
+            warmup=options['warmup'],
+            urls=urls,
+            host=options['host'],
+            stdout=self.stdout,
+        )
+        bench.write_report(
+            options['output'],
+            results,
+            created_at=timezone.now().isoformat(),
+            django=django.get_version(),
+            python=platform.python_version(),
+            database=connection.vendor,
+            iterations=options['iterations'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(results)} results to {options['output']}"))
+
+        if previous:
+            for line in bench.compare(previous, {'results': results}):
+                self.stdout.write(line)
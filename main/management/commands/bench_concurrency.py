@@ -0,0 +1,61 @@
+import platform
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from main import bench
+
+
+class Command(BaseCommand):
+    help = (
+        "Load the read-only pages that have async views at increasing concurrency, once through "
+        "the WSGI handler on a thread pool and once through the ASGI handler on an event loop, "
+        "and report latency percentiles and throughput for each. Run it on a seeded database "
+        "(see seed_benchmark)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, action='append', default=[],
+                            help="Requests in flight at once; repeat for several levels (default 1, 8 and 32).")
+        parser.add_argument('--requests', type=int, default=200, help="Requests per interface and level.")
+        parser.add_argument('--parallel-db', action='store_true',
+                            help="Run async views' queries on worker threads (ASYNC_DB_THREAD_SENSITIVE=False).")
+        parser.add_argument('--output', default='bench-concurrency.json', help="Where to write the JSON report.")
+        parser.add_argument('--host', default='localhost', help="Host header; must be in ALLOWED_HOSTS.")
+
+    def handle(self, *args, **options):
+        levels = options['concurrency'] or [1, 8, 32]
+        if min(levels) < 1 or options['requests'] < 1:
+            raise CommandError("--concurrency and --requests must be at least 1")
+        paths = bench.read_only_paths()
+        if not paths:
+            raise CommandError("No services to request; run seed_benchmark first")
+
+        thread_sensitive = settings.ASYNC_DB_THREAD_SENSITIVE and not options['parallel_db']
+        results = []
+        with override_settings(ASYNC_DB_THREAD_SENSITIVE=thread_sensitive):
+            for concurrency in levels:
+                for run in (bench.run_wsgi_concurrency, bench.run_asgi_concurrency):
+                    result = run(paths, concurrency, options['requests'], host=options['host'])
+                    results.append(result)
+                    self.stdout.write(
+                        f"{result['interface']:<5} x{concurrency:<4} p50 {result['p50_ms']:8.2f}ms "
+                        f"p95 {result['p95_ms']:8.2f}ms p99 {result['p99_ms']:8.2f}ms "
+                        f"{result['throughput_rps']:8.1f} req/s {result['errors']} errors"
+                    )
+
+        bench.write_report(
+            options['output'],
+            results,
+            created_at=timezone.now().isoformat(),
+            django=django.get_version(),
+            python=platform.python_version(),
+            database=connection.vendor,
+            paths=paths,
+            async_db_thread_sensitive=thread_sensitive,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(results)} results to {options['output']}"))
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from main import bench
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with a synthetic benchmark dataset: companies, customers, services, "
+        "requests and reviews with skewed, realistic distributions. Every account uses the "
+        f"password '{bench.BENCH_PASSWORD}'."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--companies', type=int, default=50)
+        parser.add_argument('--customers', type=int, default=500)
+        parser.add_argument('--services', type=int, default=400)
+        parser.add_argument('--requests', type=int, default=5000)
+        parser.add_argument('--review-ratio', type=float, default=0.6, help="Share of completed requests reviewed.")
+        parser.add_argument('--prefix', default='bench', help="Username prefix of the generated accounts.")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed, for repeatable datasets.")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows per INSERT.")
+
+    def handle(self, *args, **options):
+        if options['companies'] < 1 or options['customers'] < 1:
+            raise CommandError("--companies and --customers must be at least 1")
+        if not 0 <= options['review_ratio'] <= 1:
+            raise CommandError("--review-ratio must be between 0 and 1")
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=f'{prefix}-').exists():
+            raise CommandError(
+                f"Accounts starting with '{prefix}-' already exist; use another --prefix or a fresh database"
+            )
+
+        with transaction.atomic():
+            created = bench.seed(
+                companies=options['companies'],
+                customers=options['customers'],
+                services=options['services'],
+                requests=options['requests'],
+                review_ratio=options['review_ratio'],
+                prefix=prefix,
+                random_seed=options['seed'],
+                batch_size=options['batch_size'],
+                stdout=self.stdout,
+            )
+        self.stdout.write(self.style.SUCCESS(
+            ', '.join(f"{count} {label}" for label, count in created.items()) + " seeded."
+        ))
@@ -0,0 +1,122 @@
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connections
+from django.utils import timezone
+
+from users.models import User, Company, Customer
+from services.models import Service, ServiceRequest, Review
+
+from .instrumentation import get_query_budget
+
+
+def seed_catalog(companies=4, services_per_company=6, customers=8, requests_per_customer=6):
+    """
+    Build a small but realistically shaped catalog through the ORM: every
+    field of the navbar has services, customers have a mix of statuses and
+    completed requests are mostly reviewed.
+    """
+    fields = [name for name, _ in Company.FIELD_CHOICES if name != 'All in One']
+    now = timezone.now()
+
+    company_objs = []
+    for i in range(companies):
+        company_objs.append(Company.objects.create(
+            user=User.objects.create_user(
+                username=f'company{i}',
+                password='testpass123',
+                email=f'company{i}@test.com',
+                is_company=True
+            ),
+            field='All in One',
+            description=f'Company {i}'
+        ))
+
+    services = []
+    for i, company in enumerate(company_objs):
+        for j in range(services_per_company):
+            services.append(Service.objects.create(
+                company=company,
+                name=f'Service {i}-{j}',
+                description='Test Description',
+                price_hour=Decimal('20.00') + j,
+                field=fields[(i * services_per_company + j) % len(fields)]
+            ))
+
+    customer_objs = []
+    for i in range(customers):
+        customer_objs.append(Customer.objects.create(
+            user=User.objects.create_user(
+                username=f'customer{i}',
+                password='testpass123',
+                email=f'customer{i}@test.com',
+                is_customer=True
+            ),
+            date_of_birth=now.date().replace(year=now.year - 30)
+        ))
+
+    statuses = ['PENDING', 'ACCEPTED', 'COMPLETED', 'COMPLETED', 'CANCELLED']
+    for i, customer in enumerate(customer_objs):
+        for j in range(requests_per_customer):
+            status = statuses[(i + j) % len(statuses)]
+            service = services[(i * requests_per_customer + j) % len(services)]
+            service_request = ServiceRequest.objects.create(
+                service=service,
+                customer=customer,
+                requested_date=now + timezone.timedelta(days=j + 1, hours=i),
+                address='1 Test Street',
+                hours_needed=j % 4 + 1,
+                status=status
+            )
+            if status == 'COMPLETED' and j % 3:
+                Review.objects.create(
+                    service_request=service_request,
+                    service=service,
+                    customer=customer,
+                    rating=j % 5 + 1
+                )
+
+    return company_objs, customer_objs, services
+
+
+@contextmanager
+def on_commit_callbacks(using='default'):
+    """
+    Run the transaction.on_commit callbacks registered inside the block, as
+    committing would. TestCase never commits, so invalidation that waits for
+    the commit otherwise never happens in tests.
+    """
+    connection = connections[using]
+    start = len(connection.run_on_commit)
+    yield
+    callbacks = connection.run_on_commit[start:]
+    del connection.run_on_commit[start:]
+    for _, callback in callbacks:
+        callback()
+
+
+class QueryBudgetMixin:
+    """TestCase mixin for checking responses against settings.QUERY_BUDGETS."""
+
+    def assertWithinBudget(self, response):
+        request = response.wsgi_request
+        view_name = request.resolver_match.view_name
+        stats = request.query_stats
+        budget = get_query_budget(view_name, stats.cold)
+        self.assertIsNotNone(budget, f"No query budget declared for {view_name}")
+        self.assertLessEqual(
+            stats.queries, budget,
+            f"{view_name} ran {stats.queries} queries, over its {'cold ' if stats.cold else ''}budget of {budget}"
+        )
+
+    def assertPagesWithinBudget(self, urls):
+        """GET each of ``urls`` from an empty cache, then again once the cache is filled."""
+        for url in urls:
+            with self.subTest(url=url, cache='cold'):
+                cache.clear()
+                self.assertWithinBudget(self.client.get(url))
+            with self.subTest(url=url, cache='warm'):
+                response = self.client.get(url)
+                self.assertFalse(response.wsgi_request.query_stats.cold)
+                self.assertWithinBudget(response)
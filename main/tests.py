@@ -1,3 +1,381 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import sqlite3
+import tempfile
+from io import StringIO
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connections
+from django.db.models import Count
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.urls import resolve, reverse
+from django.utils.http import urlencode
+from django.utils import timezone
+from decimal import Decimal
+
+from netfix.routers import PRIMARY_PIN_COOKIE, ReplicaRouter
+from users.models import User, Company, Customer
+from services.facets import get_facets
+from services.models import Service, ServiceRequest, Review
+from utils import ASGI_URLCONF
+
+from .bench import BENCH_PASSWORD, seed
+from .instrumentation import get_view_stats, reset_view_stats
+from .testing import QueryBudgetMixin, on_commit_callbacks, seed_catalog
+
+
+class HomePageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.company = Company.objects.create(
+            user=User.objects.create_user(
+                username='testcompany',
+                password='testpass123',
+                email='company@test.com',
+                is_company=True
+            ),
+            field='Plumbing'
+        )
+        self.customer = Customer.objects.create(
+            user=User.objects.create_user(
+                username='testcustomer',
+                password='testpass123',
+                email='customer@test.com',
+                is_customer=True
+            ),
+            date_of_birth=timezone.now().date()
+        )
+        self.service = Service.objects.create(
+            company=self.company,
+            name='Test Plumbing Service',
+            description='Test Description',
+            price_hour=Decimal('50.00'),
+            field='Plumbing'
+        )
+        self.url = reverse('main:home')
+
+    def test_repeat_visits_are_served_from_cache(self):
+        """Test the popular block is only queried on the first visit"""
+        get_facets()  # the navbar's facets are cached on their own
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertContains(response, 'Test Plumbing Service')
+
+    def test_new_request_invalidates_cache(self):
+        """Test booking a service refreshes the cached request counts once it commits"""
+        self.client.get(self.url)
+        with on_commit_callbacks():
+            ServiceRequest.objects.create(
+                service=self.service,
+                customer=self.customer,
+                requested_date=timezone.now() + timezone.timedelta(days=1)
+            )
+            # Rendered before the commit, the old counts stay under the old version
+            response = self.client.get(self.url)
+            self.assertContains(response, '0 requests')
+        response = self.client.get(self.url)
+        self.assertContains(response, '1 requests')
+
+    def test_service_change_invalidates_cache(self):
+        """Test editing a service refreshes the cached block"""
+        self.client.get(self.url)
+        self.service.name = 'Renamed Service'
+        self.service.save()
+        response = self.client.get(self.url)
+        self.assertContains(response, 'Renamed Service')
+
+    def test_customers_get_their_own_fragment(self):
+        """Test the cached anonymous fragment is not shown to customers"""
+        response = self.client.get(self.url)
+        self.assertNotContains(response, 'request-btn')
+        self.client.force_login(self.customer.user)
+        response = self.client.get(self.url)
+        self.assertContains(response, 'request-btn')
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed(companies=10, customers=60, services=80, requests=600)
+        cls.company = Company.objects.annotate(n=Count('service')).order_by('-n').first()
+        cls.service = cls.company.service_set.order_by('-request_count').first()
+        cls.completed = ServiceRequest.objects.filter(status='COMPLETED', review__isnull=True).first()
+        cls.customer = cls.completed.customer
+
+    def setUp(self):
+        cache.clear()
+
+    def public_urls(self):
+        return [
+            reverse('main:home'),
+            reverse('services_list'),
+            reverse('service_detail', args=[self.service.id]),
+            reverse('service_search') + '?q=service',
+            reverse('service_availability', args=[self.service.id]),
+            reverse('available_companies') + '?' + urlencode({
+                'field': self.service.field,
+                'start': (timezone.now() + timezone.timedelta(days=2)).strftime('%Y-%m-%d %H:%M'),
+                'hours': 2,
+            }),
+            reverse('service_field', args=[self.service.field]),
+            reverse('users:login'),
+            reverse('users:register'),
+            reverse('users:register_company'),
+            reverse('users:register_customer'),
+            reverse('api:services'),
+            reverse('api:service_detail', args=[self.service.id]),
+            reverse('api:categories'),
+            reverse('api:category', args=[self.service.field]),
+            reverse('profile', args=[self.company.user.username]),
+            reverse('profile', args=[self.customer.user.username]),
+            reverse('profile_section', args=[self.company.user.username, 'services']),
+        ]
+
+    def test_anonymous_pages_within_budget(self):
+        """Test public pages stay within their query budgets"""
+        self.assertPagesWithinBudget(self.public_urls())
+
+    def test_customer_pages_within_budget(self):
+        """Test pages seen by a customer stay within their query budgets"""
+        self.client.force_login(self.customer.user)
+        urls = self.public_urls() + [
+            reverse('request_service', args=[self.service.id]),
+            reverse('api:requests'),
+            reverse('service_requests_list'),
+            reverse('profile_section', args=[self.customer.user.username, 'history']),
+            reverse('service_request_detail', args=[self.completed.id]),
+            reverse('create_review', args=[self.completed.id]),
+        ]
+        self.assertPagesWithinBudget(urls)
+
+    def test_company_pages_within_budget(self):
+        """Test pages seen by a company stay within their query budgets"""
+        self.client.force_login(self.company.user)
+        received = ServiceRequest.objects.filter(service__company=self.company).first()
+        urls = self.public_urls() + [
+            reverse('create_service'),
+            reverse('api:requests'),
+            reverse('service_requests_list'),
+            reverse('profile_section', args=[self.company.user.username, 'pending']),
+            reverse('service_request_detail', args=[received.id]),
+        ]
+        self.assertPagesWithinBudget(urls)
+
+    def test_stats_recorded_per_view(self):
+        """Test the middleware aggregates numbers under the URL name"""
+        self.client.get(reverse('services_list'))
+        reset_view_stats()
+        self.client.get(reverse('services_list'))
+        self.client.get(reverse('services_list'))
+        stats = get_view_stats()['services_list']
+        self.assertEqual(stats['requests'], 2)
+        self.assertEqual(stats['max_queries'], 1)
+        self.assertGreater(stats['avg_wall_ms'], 0)
+
+    def test_over_budget_is_logged(self):
+        """Test a view going over budget logs a warning"""
+        self.client.get(reverse('services_list'))
+        with self.settings(QUERY_BUDGETS={'services_list': 0}):
+            with self.assertLogs('netfix.performance', 'WARNING') as logs:
+                self.client.get(reverse('services_list'))
+        self.assertIn('services_list ran 1 queries (budget 0)', logs.output[0])
+
+    def test_writes_are_not_budgeted(self):
+        """Test a POST over its view's budget, like a login, logs nothing"""
+        with self.settings(QUERY_BUDGETS={'users:login': 0}):
+            with self.assertNoLogs('netfix.performance', 'WARNING'):
+                self.client.post(reverse('users:login'), {'email': self.customer.user.email, 'password': BENCH_PASSWORD})
+
+
+class BenchmarkCommandTests(TestCase):
+    def seed(self, **options):
+        options = dict(companies=3, customers=10, services=12, requests=80, stdout=StringIO(), **options)
+        call_command('seed_benchmark', **options)
+
+    def test_seed_creates_consistent_dataset(self):
+        """Test seeded counters and ratings agree with the generated rows"""
+        self.seed()
+        self.assertEqual(Company.objects.count(), 3)
+        self.assertEqual(Customer.objects.count(), 10)
+        self.assertEqual(Service.objects.count(), 12)
+        self.assertEqual(ServiceRequest.objects.count(), 80)
+        self.assertEqual(Service.reconcile_request_counts(), 0)
+        self.assertEqual(Review.recompute_ratings(), (0, 0))
+
+    def test_seed_refuses_existing_prefix(self):
+        """Test seeding twice with one prefix is rejected"""
+        self.seed()
+        with self.assertRaises(CommandError):
+            self.seed()
+
+    def test_bench_writes_report(self):
+        """Test the bench command reports every role for the chosen URLs"""
+        self.seed()
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, 'bench.json')
+            call_command('bench', iterations=2, warmup=0, only=['services_list', 'service_detail'],
+                         output=output, host='testserver', stdout=StringIO())
+            with open(output) as f:
+                report = json.load(f)
+
+            stdout = StringIO()
+            call_command('bench', iterations=1, warmup=0, only=['services_list'],
+                         output=os.path.join(tmp, 'next.json'), compare=output, host='testserver',
+                         stdout=stdout)
+
+        results = {(r['role'], r['name']): r for r in report['results']}
+        self.assertEqual(len(results), 6)
+        listing = results[('anonymous', 'services_list')]
+        self.assertEqual(listing['status'], 200)
+        self.assertEqual(listing['queries'], 1)
+        self.assertLessEqual(listing['p50_ms'], listing['p99_ms'])
+        self.assertIn('queries 1 -> 1', stdout.getvalue())
+
+
+@override_settings(ROOT_URLCONF=ASGI_URLCONF)
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.companies, cls.customers, cls.services = seed_catalog(companies=2, customers=2)
+
+    def setUp(self):
+        cache.clear()
+        self.urls = [
+            reverse('main:home'),
+            reverse('services_list'),
+            reverse('service_detail', args=[self.services[0].id]),
+            reverse('service_field', args=[self.services[0].field]),
+            reverse('profile', args=[self.companies[0].user.username]),
+        ]
+
+    def test_read_only_views_are_async(self):
+        """Test the read-heavy pages are coroutines under ASGI, and stay plain views under WSGI"""
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertTrue(asyncio.iscoroutinefunction(resolve(url).func))
+                self.assertFalse(asyncio.iscoroutinefunction(resolve(url, urlconf='netfix.urls').func))
+
+    async def test_pages_served_over_asgi(self):
+        """Test the async views render, revalidate and are instrumented under ASGI"""
+        client = AsyncClient()
+        for url in self.urls:
+            response = await client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertGreater(response.asgi_request.query_stats.queries, 0)
+            if response.has_header('ETag'):
+                # AsyncClient takes headers by their plain names
+                revalidated = await client.get(url, **{'if-none-match': response['ETag']})
+                self.assertEqual(revalidated.status_code, 304)
+
+
+class BenchConcurrencyCommandTests(TransactionTestCase):
+    # The handlers are driven from other threads, which only see committed data
+
+    def test_report_covers_both_interfaces(self):
+        """Test each concurrency level is run through WSGI and ASGI without errors"""
+        call_command('seed_benchmark', companies=2, customers=4, services=6, requests=20, stdout=StringIO())
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, 'bench.json')
+            call_command('bench_concurrency', concurrency=[1, 2], requests=6, host='testserver',
+                         output=output, stdout=StringIO())
+            with open(output) as f:
+                report = json.load(f)
+
+        self.assertEqual(
+            [(r['interface'], r['concurrency']) for r in report['results']],
+            [('wsgi', 1), ('asgi', 1), ('wsgi', 2), ('asgi', 2)],
+        )
+        for result in report['results']:
+            self.assertEqual((result['requests'], result['errors']), (6, 0))
+        self.assertEqual(len(report['meta']['paths']), 5)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(TransactionTestCase):
+    # SQLite can't copy a database with a transaction open, so nothing is wrapped in one
+
+    def setUp(self):
+        cache.clear()
+        self.company = Company.objects.create(
+            user=User.objects.create_user(
+                username='testcompany',
+                password='testpass123',
+                email='company@test.com',
+                is_company=True
+            ),
+            field='Plumbing'
+        )
+        Service.objects.create(
+            company=self.company,
+            name='Old Service',
+            description='Test Description',
+            price_hour=Decimal('50.00'),
+            field='Plumbing'
+        )
+
+        # The replica is a second SQLite file holding a snapshot of the primary
+        self.tmp = tempfile.TemporaryDirectory()
+        replica = sqlite3.connect(os.path.join(self.tmp.name, 'replica.sqlite3'))
+        connections['default'].connection.backup(replica)
+        replica.close()
+        connections.databases['replica'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(self.tmp.name, 'replica.sqlite3'),
+        }
+
+        # Changes after the snapshot exist only on the primary
+        Service.objects.create(
+            company=self.company,
+            name='New Service',
+            description='Test Description',
+            price_hour=Decimal('50.00'),
+            field='Plumbing'
+        )
+
+    def tearDown(self):
+        connections['replica'].close()
+        delattr(connections._connections, 'replica')
+        del connections.databases['replica']
+        self.tmp.cleanup()
+
+    def test_reads_go_to_replica(self):
+        """Test listings are read from the replica, which lags the primary"""
+        response = self.client.get(reverse('services_list'))
+        self.assertContains(response, 'Old Service')
+        self.assertNotContains(response, 'New Service')
+        self.assertNotIn(PRIMARY_PIN_COOKIE, response.cookies)
+
+    def test_writer_reads_own_writes(self):
+        """Test a write pins the visitor to the primary"""
+        self.client.force_login(self.company.user)
+        response = self.client.post(reverse('create_service'), {
+            'name': 'Posted Service',
+            'description': 'Test Description',
+            'price_hour': '40.00',
+            'field': 'Plumbing',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(PRIMARY_PIN_COOKIE, response.cookies)
+        self.assertEqual(response.cookies[PRIMARY_PIN_COOKIE]['max-age'], 5)
+
+        response = self.client.get(reverse('services_list'))
+        self.assertContains(response, 'Posted Service')
+        self.assertContains(response, 'New Service')
+
+    def test_validators_withheld_while_replicas_lag(self):
+        """Test a page read just after a change isn't given an ETag"""
+        response = self.client.get(reverse('services_list'))
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_routing_outside_requests(self):
+        """Test commands and the shell always use the primary"""
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(Service), 'default')
+        self.assertEqual(router.db_for_write(Service), 'default')
+        self.assertFalse(router.allow_migrate('replica', 'services'))
+        self.assertEqual(Service.objects.count(), 2)
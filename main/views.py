@@ -1,12 +1,19 @@
+from django.conf import settings
 from django.shortcuts import render
 from django.contrib.auth import logout as django_logout
 from django.contrib import messages
-from services.models import Service
+from django.utils.functional import SimpleLazyObject
+from services.cache import POPULAR_SERVICES, get_popular_services, get_version
+from utils import async_view
 
+@async_view
 def home(request):
-    popular_services = Service.get_most_requested()
+    # Only evaluated when the cached fragment for this version is missing
+    popular_services = SimpleLazyObject(get_popular_services)
     return render(request, "main/home.html", {
-        'popular_services': popular_services
+        'popular_services': popular_services,
+        'popular_version': get_version(POPULAR_SERVICES),
+        'popular_timeout': settings.POPULAR_SERVICES_CACHE_TIMEOUT,
     })
 
 def logout(request):
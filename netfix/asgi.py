@@ -0,0 +1,21 @@
+"""
+ASGI config for netfix project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server, e.g. ``uvicorn netfix.asgi:application``.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
+"""
+
+import os
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "netfix.settings")
+django.setup(set_prefix=False)
+
+from utils import AsyncViewsASGIHandler  # noqa: E402 (needs the apps loaded)
+
+# Serves the async twins of the read-heavy views (utils.ASGI_URLCONF)
+application = AsyncViewsASGIHandler()
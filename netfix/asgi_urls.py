@@ -0,0 +1,9 @@
+"""
+netfix.urls as served under ASGI: the read-heavy views made by
+utils.async_view are replaced by their coroutine twins.
+"""
+from utils import async_urlpatterns
+
+from .urls import urlpatterns as wsgi_urlpatterns
+
+urlpatterns = async_urlpatterns(wsgi_urlpatterns)
@@ -0,0 +1,102 @@
+import asyncio
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# Apps whose reads may be served by a replica; everything else (sessions,
+# auth permissions, admin) stays on the primary
+REPLICATED_APPS = {'services', 'users'}
+PRIMARY_PIN_COOKIE = 'netfix_primary'
+
+_routing = ContextVar('db_routing', default=None)
+
+
+class RoutingState:
+    def __init__(self, use_replicas):
+        self.use_replicas = use_replicas
+        self.wrote = False
+
+
+class ReplicaRouter:
+    """
+    Send writes to the primary and, during requests that may use them, reads
+    of REPLICATED_APPS to a random alias from settings.DATABASE_REPLICAS.
+    A request that writes reads from the primary for the rest of the request;
+    ReplicaRoutingMiddleware pins the visitor's following requests too.
+    Outside requests (commands, shell) everything uses the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        if state and state.use_replicas and model._meta.app_label in REPLICATED_APPS:
+            return random.choice(settings.DATABASE_REPLICAS)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state and model._meta.app_label in REPLICATED_APPS:
+            state.wrote = True
+            state.use_replicas = False
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {'default', *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Let safe requests read from replicas, unless the visitor wrote something
+    in the last settings.REPLICA_LAG_SECONDS, so they always see their own
+    changes. A write sets a short-lived cookie that pins them to the primary.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        state = self.routing_state(request)
+        token = _routing.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.pin_after_write(state, response)
+
+    async def __acall__(self, request):
+        state = self.routing_state(request)
+        token = _routing.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.pin_after_write(state, response)
+
+    def routing_state(self, request):
+        return RoutingState(use_replicas=bool(
+            settings.DATABASE_REPLICAS
+            and request.method in ('GET', 'HEAD', 'OPTIONS')
+            and PRIMARY_PIN_COOKIE not in request.COOKIES
+        ))
+
+    def pin_after_write(self, state, response):
+        if state.wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                PRIMARY_PIN_COOKIE, '1', max_age=settings.REPLICA_LAG_SECONDS, httponly=True, samesite='Lax'
+            )
+        return response
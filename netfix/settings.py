@@ -46,8 +46,12 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so it sees every query the request makes
+    'main.instrumentation.QueryInstrumentationMiddleware',
+    'netfix.routers.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'users.middleware.LegacySessionBackendMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -68,6 +72,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'services.context_processors.service_facets',
             ],
         },
     },
@@ -75,6 +80,12 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'netfix.wsgi.application'
 
+# Whether the ORM work of async views (utils.db_sync_to_async) shares
+# Django's single sync thread. Set NETFIX_ASYNC_DB_THREAD_SENSITIVE=0 under
+# ASGI to let requests query in parallel worker threads, each holding its own
+# connection; CONN_MAX_AGE then decides whether those are reused.
+ASYNC_DB_THREAD_SENSITIVE = os.environ.get('NETFIX_ASYNC_DB_THREAD_SENSITIVE', '1') != '0'
+
 
 # Database
 # https://docs.djangoproject.com/en/1.11/ref/settings/#databases
@@ -86,6 +97,52 @@ DATABASES = {
     }
 }
 
+# Read replicas: NETFIX_DATABASE_REPLICAS lists, comma separated, SQLite
+# files kept in step with the primary (e.g. by Litestream). netfix.routers
+# sends GET requests' reads of the services and users apps to them.
+DATABASE_REPLICAS = []
+for number, name in enumerate(filter(None, os.environ.get('NETFIX_DATABASE_REPLICAS', '').split(',')), 1):
+    DATABASES[f'replica{number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': name.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['netfix.routers.ReplicaRouter']
+
+# Seconds a replica may trail the primary: how long a visitor reads from the
+# primary after writing, and how long validators are withheld after a change
+REPLICA_LAG_SECONDS = 5
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+# Point NETFIX_CACHE_BACKEND/NETFIX_CACHE_LOCATION at a shared cache
+# (memcached, redis, database) when running more than one process.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('NETFIX_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('NETFIX_CACHE_LOCATION', 'netfix'),
+    }
+}
+
+# Seconds the home page's popular services block may be served from cache
+POPULAR_SERVICES_CACHE_TIMEOUT = 300
+
+# Seconds a page of a category listing stays cached; any change to a service
+# in the field invalidates it sooner
+FIELD_PAGE_CACHE_TIMEOUT = 300
+
+# Seconds the per-field counts and price statistics (services.facets) stay
+# cached; changes to a field's services or reviews invalidate them sooner
+FACETS_CACHE_TIMEOUT = 60 * 60
+
+# Seconds a company's index of accepted bookings (services.availability)
+# stays cached; changes to its requests invalidate it sooner
+AVAILABILITY_CACHE_TIMEOUT = 60 * 60
+
 
 # Password validation
 # https://docs.djangoproject.com/en/1.11/ref/settings/#auth-password-validators
@@ -131,10 +188,79 @@ STATICFILES_DIRS = [
 MEDIA_URL = 'media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Threads resizing uploaded company images into users.images.VARIANT_WIDTHS
+IMAGE_VARIANT_WORKERS = 2
+
 # Add custom backend to handle email validation
 AUTHENTICATION_BACKENDS = [
-    'django.contrib.auth.backends.ModelBackend',  # Default backend first
-    'users.backend.EmailBackend',  # Custom backend second
+    # Logins are by email, so try it first: one user lookup and one hash
+    'users.backend.EmailBackend',
+    'users.backend.RoleModelBackend',  # username logins (admin)
 ]
 
+# Failed logins allowed per sliding window before users.throttle locks the
+# email or client IP out; each further lockout doubles, up to the maximum
+LOGIN_FAILURE_LIMITS = {'email': 5, 'ip': 20}
+LOGIN_FAILURE_WINDOW = 15 * 60
+LOGIN_LOCKOUT_BASE = 60
+LOGIN_LOCKOUT_MAX = 60 * 60
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Most SQL queries a GET or HEAD may run, per URL name, counting the session
+# and user lookups of a logged-in visitor. main.instrumentation logs a warning
+# when a view goes over, and main.tests fails on seeded data, from a cold
+# cache and a warm one.
+QUERY_BUDGETS = {
+    'main:home': 3,
+    'services_list': 3,
+    'service_detail': 3,
+    'service_search': 4,
+    'available_companies': 4,
+    'service_field': 3,
+    'create_service': 3,
+    'request_service': 3,
+    'service_availability': 4,
+    'service_request_detail': 7,
+    'create_review': 9,
+    'service_requests_list': 3,
+    'profile': 10,
+    'profile_section': 9,
+    'api:services': 3,
+    'api:service_detail': 3,
+    'api:categories': 2,
+    'api:category': 3,
+    'api:requests': 5,
+    'users:login': 2,
+    'users:register': 2,
+    'users:register_company': 2,
+    'users:register_customer': 2,
+}
+# Budgets for requests that fill a cache every page shares (the navbar's
+# facets, the modified markers), which can happen on any page after a
+# deploy or eviction. Views missing here keep their QUERY_BUDGETS entry.
+COLD_QUERY_BUDGETS = {
+    'main:home': 4,
+    'services_list': 5,
+    'service_detail': 5,
+    'service_search': 5,
+    'available_companies': 5,
+    'service_field': 5,
+    'request_service': 4,
+    'service_requests_list': 4,
+    'profile': 12,
+    'api:categories': 3,
+    'users:login': 3,
+    'users:register': 3,
+    'users:register_company': 3,
+    'users:register_customer': 3,
+}
+
+# Most requests one bulk status update may move at once
+BULK_UPDATE_MAX_REQUESTS = 100
+
+# Number of services shown per page on cursor-paginated listings
+SERVICES_PAGE_SIZE = 20
+
+# Items in the first page of each profile section, and per "Load more"
+PROFILE_SECTION_PAGE_SIZE = 10
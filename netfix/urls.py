@@ -3,7 +3,7 @@ from django.urls import include, path
 from django.conf.urls.static import static
 
 from . import settings
-from users.views import ProfileView
+from users.views import ProfileView, profile_section
 
 admin.site.site_header = 'My Site Administration'
 admin.site.site_title = 'My Site Admin'
@@ -15,5 +15,7 @@ urlpatterns = [
     path('', include('main.urls')),
     path('', include('users.urls')),
     path('services/', include('services.urls')),
+    path('api/', include('services.api_urls')),
     path('profile/<str:username>/', ProfileView, name='profile'),
+    path('profile/<str:username>/<slug:section>/', profile_section, name='profile_section'),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
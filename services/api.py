@@ -0,0 +1,157 @@
+from functools import wraps
+
+from django.http import JsonResponse
+from django.urls import reverse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_GET
+
+from .conditional import requests_etag, requests_last_modified, services_etag, services_last_modified
+from .facets import get_facets
+from .models import Service
+from .pagination import InvalidCursor, get_page_size, paginate
+from .views import requests_for
+
+MAX_PAGE_SIZE = 100
+REQUEST_ORDER = ('-created_at', '-id')
+
+SERVICE_FIELDS = {
+    'id': lambda s: s.id,
+    'name': lambda s: s.name,
+    'description': lambda s: s.description,
+    'price_hour': lambda s: s.price_hour,
+    'field': lambda s: s.field,
+    'company': lambda s: s.company.user.username,
+    'rating': lambda s: s.rating,
+    'average_rating': lambda s: s.average_rating,
+    'request_count': lambda s: s.request_count,
+    'date': lambda s: s.date,
+    'url': lambda s: reverse('api:service_detail', args=[s.id]),
+}
+
+REQUEST_FIELDS = {
+    'id': lambda r: r.id,
+    'service': lambda r: r.service_id,
+    'service_name': lambda r: r.service.name,
+    'company': lambda r: r.service.company.user.username,
+    'customer': lambda r: r.customer.user.username,
+    'status': lambda r: r.status,
+    'requested_date': lambda r: r.requested_date,
+    'hours_needed': lambda r: r.hours_needed,
+    'total_cost': lambda r: r.total_cost,
+    'address': lambda r: r.address,
+    'notes': lambda r: r.notes,
+    'created_at': lambda r: r.created_at,
+}
+
+
+class ApiError(ValueError):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def api_view(view):
+    """Report ApiError and bad cursors as JSON instead of HTML error pages."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except InvalidCursor as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        except ApiError as e:
+            return JsonResponse({'error': str(e)}, status=e.status)
+    return wrapper
+
+
+def selected_fields(request, available):
+    """Names from ``?fields=a,b``, or every field when the parameter is absent."""
+    requested = [name.strip() for name in request.GET.get('fields', '').split(',') if name.strip()]
+    unknown = [name for name in requested if name not in available]
+    if unknown:
+        raise ApiError(f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(available)}")
+    return requested or list(available)
+
+
+def serialize(obj, fields, available):
+    return {name: available[name](obj) for name in fields}
+
+
+def _page_link(request, param, cursor):
+    query = request.GET.copy()
+    query.pop('after', None)
+    query.pop('before', None)
+    query[param] = cursor
+    return f'{request.path}?{query.urlencode()}'
+
+
+def paginated_response(request, queryset, ordering, available):
+    fields = selected_fields(request, available)
+    try:
+        limit = int(request.GET.get('limit', get_page_size()))
+    except ValueError:
+        raise ApiError("limit must be a number")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ApiError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+
+    page = paginate(
+        queryset, ordering,
+        after=request.GET.get('after'), before=request.GET.get('before'), page_size=limit
+    )
+    return JsonResponse({
+        'results': [serialize(obj, fields, available) for obj in page],
+        'next': _page_link(request, 'after', page.next_cursor) if page.has_next else None,
+        'previous': _page_link(request, 'before', page.previous_cursor) if page.has_previous else None,
+    })
+
+
+def catalog_view(view):
+    """
+    Public catalog endpoints: conditional on the services' last change, and
+    cacheable by anyone as long as they revalidate, which costs a 304.
+    """
+    view = api_view(view)
+    view = condition(etag_func=services_etag, last_modified_func=services_last_modified)(view)
+    view = cache_control(public=True, no_cache=True)(view)
+    return require_GET(view)
+
+
+@catalog_view
+def service_list(request):
+    services = Service.objects.select_related('company__user')
+    return paginated_response(request, services, Service.LISTING_ORDER, SERVICE_FIELDS)
+
+
+@catalog_view
+def service_detail(request, id):
+    service = Service.objects.select_related('company__user').filter(id=id).first()
+    if service is None:
+        raise ApiError("Service not found.", status=404)
+    return JsonResponse(serialize(service, selected_fields(request, SERVICE_FIELDS), SERVICE_FIELDS))
+
+
+@catalog_view
+def category_list(request):
+    return JsonResponse({'results': [
+        dict(facet, url=reverse('api:category', args=[facet['slug']])) for facet in get_facets()
+    ]})
+
+
+@catalog_view
+def category(request, field):
+    services = Service.objects.filter(field=field).select_related('company__user')
+    return paginated_response(request, services, Service.LISTING_ORDER, SERVICE_FIELDS)
+
+
+@require_GET
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=requests_etag, last_modified_func=requests_last_modified)
+@api_view
+def request_list(request):
+    """The signed-in customer's own requests, or the requests a company has received."""
+    user = request.user
+    if not user.is_authenticated:
+        raise ApiError("Authentication required.", status=401)
+    if not (user.is_customer or user.is_company):
+        raise ApiError("Only customers and companies have service requests.", status=403)
+    requests = requests_for(user).select_related('service__company__user', 'customer__user')
+    return paginated_response(request, requests, REQUEST_ORDER, REQUEST_FIELDS)
@@ -0,0 +1,15 @@
+from django.urls import path, register_converter
+from . import api
+from .converters import FieldConverter
+
+register_converter(FieldConverter, 'field')
+
+app_name = 'api'
+
+urlpatterns = [
+    path('services/', api.service_list, name='services'),
+    path('services/<int:id>/', api.service_detail, name='service_detail'),
+    path('categories/', api.category_list, name='categories'),
+    path('categories/<field:field>/', api.category, name='category'),
+    path('requests/', api.request_list, name='requests'),
+]
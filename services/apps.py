@@ -1,5 +1,20 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def ensure_search_index(sender, using, **kwargs):
+    from django.db import connections
+    from .search import create_search_index
+
+    connection = connections[using]
+    # Nothing to index until the services table has been migrated in
+    if 'services_service' in connection.introspection.table_names():
+        create_search_index(connection)
 
 
 class ServicesConfig(AppConfig):
     name = 'services'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        post_migrate.connect(ensure_search_index, sender=self)
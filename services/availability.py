@@ -0,0 +1,183 @@
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from .cache import bump_version, get_versions
+from users.models import Company
+
+from .models import ServiceRequest
+
+# How far ahead customers may book, see RequestServiceForm.clean_requested_date
+BOOKING_WINDOW = timedelta(days=30)
+# Length assumed for bookings that don't say how many hours they need
+DEFAULT_BOOKING_HOURS = 1
+# The longest booking the request form allows, so the index also holds
+# bookings that started before the window and still run into it
+MAX_BOOKING = timedelta(hours=24)
+# Indexes each process keeps in memory, least recently used dropped first
+LOCAL_INDEXES = 256
+
+_local_indexes = OrderedDict()
+_local_lock = threading.Lock()
+
+
+def availability_version(company_id):
+    return f'availability:{company_id}'
+
+
+def invalidate_availability(company_id):
+    bump_version(availability_version(company_id))
+
+
+class BookingIndex:
+    """
+    A company's accepted bookings as intervals of epoch seconds, sorted by
+    start. ``reach[i]`` is the latest end among the first ``i + 1``
+    bookings, so an overlap check is one bisect whatever the volume, even
+    when older bookings overlap each other. ``booked`` is the seconds of
+    work they add up to, the company's workload.
+    """
+
+    def __init__(self, intervals, horizon):
+        intervals = sorted(intervals)
+        self.starts = [start for start, _ in intervals]
+        self.ends = [end for _, end in intervals]
+        self.reach = []
+        latest = float('-inf')
+        for end in self.ends:
+            latest = max(latest, end)
+            self.reach.append(latest)
+        self.booked = sum(end - start for start, end in intervals)
+        self.horizon = horizon
+
+    def overlaps(self, start, end):
+        # Bookings starting before ``end`` are the first ``i``; one of them
+        # overlaps when the latest of their ends is after ``start``
+        i = bisect_left(self.starts, end)
+        return i > 0 and self.reach[i - 1] > start
+
+    def free(self, start, end):
+        """The gaps between bookings within [start, end), as (start, end) pairs."""
+        gaps = []
+        cursor = start
+        i = bisect_left(self.reach, start)
+        while i < len(self.starts) and self.starts[i] < end:
+            if self.starts[i] > cursor:
+                gaps.append((cursor, self.starts[i]))
+            cursor = max(cursor, self.ends[i])
+            i += 1
+        if cursor < end:
+            gaps.append((cursor, end))
+        return gaps
+
+
+def booking_end(start, hours):
+    return start + timedelta(hours=hours or DEFAULT_BOOKING_HOURS)
+
+
+def _datetime(timestamp):
+    return datetime.fromtimestamp(timestamp, tz=dt_timezone.utc)
+
+
+def _build_indexes(company_ids, now):
+    # Reach past the window by as long as an index may stay cached
+    horizon = now + BOOKING_WINDOW + timedelta(seconds=settings.AVAILABILITY_CACHE_TIMEOUT)
+    intervals = {company_id: [] for company_id in company_ids}
+    bookings = ServiceRequest.objects.filter(
+        service__company_id__in=company_ids,
+        status='ACCEPTED',
+        requested_date__gte=now - MAX_BOOKING,
+        requested_date__lt=horizon,
+    ).values_list('service__company_id', 'requested_date', 'hours_needed')
+    for company_id, start, hours in bookings:
+        intervals[company_id].append((start.timestamp(), booking_end(start, hours).timestamp()))
+    return {company_id: BookingIndex(found, horizon.timestamp()) for company_id, found in intervals.items()}
+
+
+def get_booking_indexes(company_ids):
+    """
+    The interval indexes of the companies' accepted bookings from now to the
+    end of the booking window, as ``{company_id: BookingIndex}``. Each is
+    cached until one of its company's requests changes, or until the window
+    moves past the bookings it was built from; those missing are built
+    together in one query. Each process keeps the indexes it used last, so a
+    check only reads versions from the shared cache rather than unpickling
+    whole indexes.
+    """
+    now = timezone.now()
+    versions = get_versions([availability_version(company_id) for company_id in company_ids])
+    keys = {
+        company_id: f'bookings:{company_id}:{versions[availability_version(company_id)]}'
+        for company_id in company_ids
+    }
+    indexes = {company_id: _local_indexes.get(key) for company_id, key in keys.items()}
+    uncached = [keys[company_id] for company_id, index in indexes.items() if index is None]
+    if uncached:
+        found = cache.get_many(uncached)
+        indexes = {company_id: index or found.get(keys[company_id]) for company_id, index in indexes.items()}
+
+    window_end = (now + BOOKING_WINDOW).timestamp()
+    stale = [company_id for company_id, index in indexes.items() if index is None or index.horizon < window_end]
+    if stale:
+        built = _build_indexes(stale, now)
+        cache.set_many({keys[company_id]: index for company_id, index in built.items()},
+                       settings.AVAILABILITY_CACHE_TIMEOUT)
+        indexes.update(built)
+
+    with _local_lock:
+        for company_id, index in indexes.items():
+            _local_indexes[keys[company_id]] = index
+            _local_indexes.move_to_end(keys[company_id])
+        while len(_local_indexes) > LOCAL_INDEXES:
+            _local_indexes.popitem(last=False)
+    return indexes
+
+
+def get_booking_index(company_id):
+    return get_booking_indexes([company_id])[company_id]
+
+
+def has_conflict(company_id, start, hours):
+    """Whether a booking of ``hours`` from ``start`` overlaps one the company accepted."""
+    return get_booking_index(company_id).overlaps(start.timestamp(), booking_end(start, hours).timestamp())
+
+
+def free_slots(company_id, min_hours=None):
+    """
+    The stretches of the booking window in which ``company_id`` has no
+    accepted booking, as (start, end) datetimes, optionally only those at
+    least ``min_hours`` long.
+    """
+    now = timezone.now()
+    gaps = get_booking_index(company_id).free(now.timestamp(), (now + BOOKING_WINDOW).timestamp())
+    if min_hours:
+        gaps = [(start, end) for start, end in gaps if end - start >= min_hours * 3600]
+    return [(_datetime(start), _datetime(end)) for start, end in gaps]
+
+
+def available_companies(field, start, hours):
+    """
+    Companies that can work in ``field`` (their own, or any for "All in One"
+    companies, like Company.can_create_service) with no accepted job
+    overlapping ``hours`` from ``start``. Best rated first, then the least
+    booked; each is given a ``booked_hours`` attribute.
+    """
+    companies = list(
+        Company.objects.filter(Q(field=field) | Q(field='All in One')).select_related('user')
+    )
+    indexes = get_booking_indexes([company.pk for company in companies])
+    start_ts, end_ts = start.timestamp(), booking_end(start, hours).timestamp()
+    free = []
+    for company in companies:
+        index = indexes[company.pk]
+        if not index.overlaps(start_ts, end_ts):
+            company.booked_hours = index.booked / 3600
+            free.append(company)
+    free.sort(key=lambda company: (-(company.average_rating or 0), company.booked_hours, company.user.username))
+    return free
@@ -0,0 +1,72 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .converters import SLUG_FOR_FIELD
+from .models import Service
+from .pagination import paginate
+
+POPULAR_SERVICES = 'popular_services'
+
+
+def get_version(name):
+    """
+    Current version number of a cached data set. Entries are keyed by it, so
+    bumping the version invalidates everything cached under the old one.
+    """
+    key = f'version:{name}'
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock so a version that was evicted can never come
+        # back and revive entries cached under it
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def get_versions(names):
+    """``get_version`` for several data sets in one cache round trip."""
+    found = cache.get_many([f'version:{name}' for name in names])
+    return {name: found.get(f'version:{name}') or get_version(name) for name in names}
+
+
+def bump_version(name):
+    key = f'version:{name}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+def get_popular_services(limit=6):
+    key = f'{POPULAR_SERVICES}:{get_version(POPULAR_SERVICES)}:{limit}'
+    services = cache.get(key)
+    if services is None:
+        services = list(Service.get_most_requested(limit))
+        cache.set(key, services, settings.POPULAR_SERVICES_CACHE_TIMEOUT)
+    return services
+
+
+def field_version(field):
+    return f'field:{SLUG_FOR_FIELD[field]}'
+
+
+def bump_field_versions(fields):
+    for field in set(fields):
+        bump_version(field_version(field))
+
+
+def get_field_page(field, after=None, before=None):
+    """
+    One keyset page of the services in ``field``, cached until a service in
+    that field changes. Raises InvalidCursor for a bad cursor.
+    """
+    version_name = field_version(field)
+    key = f'{version_name}:{get_version(version_name)}:{after or ""}:{before or ""}'
+    page = cache.get(key)
+    if page is None:
+        services = Service.objects.filter(field=field).select_related('company__user')
+        page = paginate(services, Service.LISTING_ORDER, after=after, before=before)
+        cache.set(key, page, settings.FIELD_PAGE_CACHE_TIMEOUT)
+    return page
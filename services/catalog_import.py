@@ -0,0 +1,378 @@
+import csv
+import json
+import os
+import time
+from collections import Counter
+from contextlib import contextmanager
+from decimal import Decimal, InvalidOperation
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from users.models import User, Company, Customer
+
+from .availability import invalidate_availability
+from .cache import POPULAR_SERVICES, bump_field_versions, bump_version
+from .conditional import SERVICES, requests_marker, touch, touch_all
+from .facets import invalidate_facets
+from .models import Service, ServiceRequest
+
+# Rows of each type are written in this order within a batch, so a batch may
+# contain a company together with its services and their requests
+ROW_TYPES = ('company', 'customer', 'service', 'request')
+FIELD_NAMES = {name for name, _ in Company.FIELD_CHOICES}
+STATUSES = {status for status, _ in ServiceRequest._meta.get_field('status').choices}
+
+
+class RowError(ValueError):
+    pass
+
+
+def read_rows(path, fmt):
+    """
+    Yield ``(position, row, error)`` for every record in a JSONL or CSV file,
+    reading one line at a time. ``position`` is the 1-based record number
+    used for checkpoints.
+    """
+    with open(path, newline='', encoding='utf-8') as source:
+        if fmt == 'csv':
+            for position, row in enumerate(csv.DictReader(source), start=1):
+                yield position, {k: v for k, v in row.items() if k and v not in (None, '')}, None
+            return
+
+        position = 0
+        for line in source:
+            line = line.strip()
+            if not line:
+                continue
+            position += 1
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield position, None, f"invalid JSON: {e}"
+                continue
+            if not isinstance(row, dict):
+                yield position, None, "expected a JSON object"
+                continue
+            yield position, row, None
+
+
+def _required(row, key):
+    value = row.get(key)
+    if value in (None, ''):
+        raise RowError(f"missing '{key}'")
+    return str(value).strip()
+
+
+class BatchResult:
+    def __init__(self):
+        self.created = Counter()
+        self.errors = []
+        # Run totals only count rejections, a dirty file could have millions
+        self.error_count = 0
+
+    @property
+    def imported(self):
+        return sum(self.created.values())
+
+
+class CatalogImporter:
+    def __init__(self, dry_run=False, using='default'):
+        self.dry_run = dry_run
+        self.using = using
+        # Set while a dry run's batches share one transaction, see run()
+        self.rolling_back = False
+
+    @contextmanager
+    def run(self):
+        """
+        Wrap a whole import. A dry run keeps one transaction open across its
+        batches and rolls it back once at the end, so later batches can refer
+        to records validated by earlier ones, as they could in a real import.
+        """
+        if not self.dry_run:
+            yield
+            return
+        with transaction.atomic(using=self.using):
+            self.rolling_back = True
+            try:
+                yield
+            finally:
+                self.rolling_back = False
+                transaction.set_rollback(True, using=self.using)
+
+    def import_batch(self, batch):
+        """
+        Validate and write one batch of ``(position, row)`` pairs in a single
+        transaction. In dry-run mode the transaction is rolled back, so rows
+        are checked against the database exactly as a real import would;
+        within :meth:`run` that waits until the whole import is done.
+        """
+        result = BatchResult()
+        self.new_service_fields = set()
+        self.request_companies = set()
+        self.request_customers = set()
+        by_type = {row_type: [] for row_type in ROW_TYPES}
+        for position, row in batch:
+            row_type = str(row.get('type', '')).strip().lower()
+            if row_type not in by_type:
+                result.errors.append((position, f"unknown row type '{row.get('type', '')}'"))
+                continue
+            by_type[row_type].append((position, row))
+
+        with transaction.atomic(using=self.using):
+            result.created['company'] = self._import_users(by_type['company'], result.errors, company=True)
+            result.created['customer'] = self._import_users(by_type['customer'], result.errors, company=False)
+            result.created['service'] = self._import_services(by_type['service'], result.errors)
+            result.created['request'] = self._import_requests(by_type['request'], result.errors)
+            if self.dry_run and not self.rolling_back:
+                transaction.set_rollback(True, using=self.using)
+
+        if not self.dry_run and (result.created['service'] or result.created['request']):
+            # bulk_create skips the signals that normally invalidate these
+            bump_version(POPULAR_SERVICES)
+            bump_field_versions(self.new_service_fields)
+            invalidate_facets(self.new_service_fields)
+            touch(SERVICES)
+            for company_id in self.request_companies:
+                invalidate_availability(company_id)
+            touch_all(requests_marker(user_id) for user_id in self.request_companies | self.request_customers)
+        return result
+
+    def _import_users(self, rows, errors, company):
+        if not rows:
+            return 0
+        users = User.objects.using(self.using)
+        valid = []
+        for position, row in rows:
+            try:
+                username = _required(row, 'username')
+                email = _required(row, 'email')
+                if company:
+                    extra = _required(row, 'field')
+                    if extra not in FIELD_NAMES:
+                        raise RowError(f"unknown field '{extra}'")
+                else:
+                    extra = parse_date(_required(row, 'date_of_birth'))
+                    if extra is None:
+                        raise RowError("date_of_birth must be YYYY-MM-DD")
+            except (RowError, ValueError) as e:
+                errors.append((position, str(e)))
+                continue
+            valid.append((position, row, username, email, extra))
+
+        taken_usernames = set(users.filter(
+            username__in=[v[2] for v in valid]).values_list('username', flat=True))
+        taken_emails = set(users.filter(
+            email__in=[v[3] for v in valid]).values_list('email', flat=True))
+
+        new_users, profiles = [], {}
+        for position, row, username, email, extra in valid:
+            if username in taken_usernames:
+                errors.append((position, f"username '{username}' already exists"))
+                continue
+            if email in taken_emails:
+                errors.append((position, f"email '{email}' already exists"))
+                continue
+            taken_usernames.add(username)
+            taken_emails.add(email)
+            new_users.append(User(
+                username=username,
+                email=email,
+                is_company=company,
+                is_customer=not company,
+                # Imported accounts sign in after a password reset
+                password=make_password(None),
+            ))
+            profiles[username] = (row, extra)
+
+        users.bulk_create(new_users)
+        # SQLite does not hand back primary keys from bulk_create
+        ids = users.filter(username__in=profiles).values_list('username', 'id')
+        if company:
+            Company.objects.using(self.using).bulk_create([
+                Company(user_id=user_id, field=profiles[username][1],
+                        description=str(profiles[username][0].get('description', ''))[:500])
+                for username, user_id in ids
+            ])
+        else:
+            Customer.objects.using(self.using).bulk_create([
+                Customer(user_id=user_id, date_of_birth=profiles[username][1])
+                for username, user_id in ids
+            ])
+        return len(new_users)
+
+    def _import_services(self, rows, errors):
+        if not rows:
+            return 0
+        company_names = {str(row.get('company', '')).strip() for _, row in rows}
+        companies = {
+            username: (user_id, field)
+            for username, user_id, field in Company.objects.using(self.using).filter(
+                user__username__in=company_names).values_list('user__username', 'user_id', 'field')
+        }
+
+        existing = set(Service.objects.using(self.using).filter(
+            company_id__in=[company_id for company_id, _ in companies.values()],
+            name__in={str(row.get('name', '')).strip() for _, row in rows},
+        ).values_list('company_id', 'name'))
+
+        services = []
+        for position, row in rows:
+            try:
+                company_name = _required(row, 'company')
+                if company_name not in companies:
+                    raise RowError(f"unknown company '{company_name}'")
+                company_id, company_field = companies[company_name]
+                field = str(row.get('field') or company_field).strip()
+                if field not in FIELD_NAMES:
+                    raise RowError(f"unknown field '{field}'")
+                if company_field != 'All in One' and field != company_field:
+                    raise RowError(f"company '{company_name}' cannot offer {field} services")
+                name = _required(row, 'name')
+                if len(name) > 40:
+                    raise RowError("name is longer than 40 characters")
+                price_hour = Decimal(_required(row, 'price_hour'))
+                if price_hour < 0:
+                    raise RowError("price_hour cannot be negative")
+                if (company_id, name) in existing:
+                    raise RowError(f"company '{company_name}' already has a service named '{name}'")
+            except RowError as e:
+                errors.append((position, str(e)))
+                continue
+            except InvalidOperation:
+                errors.append((position, "price_hour must be a number"))
+                continue
+            existing.add((company_id, name))
+            services.append(Service(
+                company_id=company_id,
+                name=name,
+                description=str(row.get('description', '')),
+                price_hour=price_hour.quantize(Decimal('0.01')),
+                field=field,
+            ))
+
+        Service.objects.using(self.using).bulk_create(services)
+        self.new_service_fields.update(service.field for service in services)
+        return len(services)
+
+    def _import_requests(self, rows, errors):
+        if not rows:
+            return 0
+        services = {}
+        for company_name, name, service_id, company_id, price_hour in Service.objects.using(self.using).filter(
+            company__user__username__in={str(row.get('company', '')).strip() for _, row in rows},
+            name__in={str(row.get('service', '')).strip() for _, row in rows},
+        ).order_by('id').values_list('company__user__username', 'name', 'id', 'company_id', 'price_hour'):
+            # Requests attach to the oldest service when a company reuses a name
+            services.setdefault((company_name, name), (service_id, company_id, price_hour))
+        customers = dict(Customer.objects.using(self.using).filter(
+            user__username__in={str(row.get('customer', '')).strip() for _, row in rows}
+        ).values_list('user__username', 'user_id'))
+
+        requests = []
+        for position, row in rows:
+            try:
+                key = (_required(row, 'company'), _required(row, 'service'))
+                if key not in services:
+                    raise RowError(f"unknown service '{key[1]}' for company '{key[0]}'")
+                customer = _required(row, 'customer')
+                if customer not in customers:
+                    raise RowError(f"unknown customer '{customer}'")
+                requested_date = parse_datetime(_required(row, 'requested_date'))
+                if requested_date is None:
+                    raise RowError("requested_date must be an ISO 8601 datetime")
+                if timezone.is_naive(requested_date):
+                    requested_date = timezone.make_aware(requested_date)
+                hours_needed = int(row['hours_needed']) if row.get('hours_needed') not in (None, '') else None
+                if hours_needed is not None and not 1 <= hours_needed <= 24:
+                    raise RowError("hours_needed must be between 1 and 24")
+                status = str(row.get('status') or 'PENDING').strip().upper()
+                if status not in STATUSES:
+                    raise RowError(f"unknown status '{status}'")
+            except (RowError, ValueError) as e:
+                errors.append((position, str(e)))
+                continue
+            service_id, company_id, price_hour = services[key]
+            self.request_companies.add(company_id)
+            self.request_customers.add(customers[customer])
+            requests.append(ServiceRequest(
+                service_id=service_id,
+                customer_id=customers[customer],
+                requested_date=requested_date,
+                address=row.get('address'),
+                hours_needed=hours_needed,
+                # bulk_create skips ServiceRequest.save, which normally sets this
+                total_cost=price_hour * hours_needed if hours_needed else None,
+                notes=str(row.get('notes', '')),
+                status=status,
+            ))
+
+        ServiceRequest.objects.using(self.using).bulk_create(requests)
+        # ...and the receivers that keep request_count in step
+        for service_id, count in Counter(r.service_id for r in requests).items():
+            Service.objects.using(self.using).filter(pk=service_id).update(
+                request_count=F('request_count') + count)
+        return len(requests)
+
+
+def read_checkpoint(path):
+    if not path or not os.path.exists(path):
+        return 0
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)['position']
+
+
+def write_checkpoint(path, position):
+    # Write then rename, so an interrupted write never leaves a corrupt checkpoint
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'position': position, 'updated_at': timezone.now().isoformat()}, f)
+    os.replace(tmp_path, path)
+
+
+def run_import(rows, importer, batch_size=1000, start_after=0, checkpoint=None, report=None):
+    """
+    Feed ``rows`` from :func:`read_rows` through ``importer`` in batches,
+    skipping everything up to ``start_after`` and recording the last committed
+    position in ``checkpoint`` after each batch. ``report`` is called with
+    ``(batch_number, first, last, result, seconds)`` for every batch, the
+    only place rejected records are listed; the returned totals count them.
+    """
+    totals = BatchResult()
+    batch, rejected = [], []
+    batch_number = 0
+
+    def flush():
+        nonlocal batch_number
+        batch_number += 1
+        started = time.perf_counter()
+        result = importer.import_batch(batch)
+        result.errors = sorted(rejected + result.errors)
+        elapsed = time.perf_counter() - started
+        positions = [p for p, _ in batch] + [p for p, _ in rejected]
+        first, last = min(positions), max(positions)
+        if checkpoint and not importer.dry_run:
+            write_checkpoint(checkpoint, last)
+        totals.created.update(result.created)
+        totals.error_count += len(result.errors)
+        if report:
+            report(batch_number, first, last, result, elapsed)
+
+    with importer.run():
+        for position, row, error in rows:
+            if position <= start_after:
+                continue
+            if error:
+                rejected.append((position, error))
+            else:
+                batch.append((position, row))
+            if len(batch) + len(rejected) >= batch_size:
+                flush()
+                batch, rejected = [], []
+        if batch or rejected:
+            flush()
+    return totals
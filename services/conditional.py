@@ -0,0 +1,190 @@
+import asyncio
+import hashlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import quote_etag
+from django.views.decorators.http import condition
+
+from main.instrumentation import note_cold_cache
+from users.models import User
+from utils import db_sync_to_async
+
+from .models import Service, ServiceRequest
+
+SERVICES = 'services'
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def requests_marker(user_id):
+    return f'requests:{user_id}'
+
+
+def profile_marker(user_id):
+    return f'profile:{user_id}'
+
+
+def get_modified(name, initial):
+    """
+    When the data set ``name`` last changed. Kept in the cache by
+    :func:`touch`, so conditional requests don't touch the database; when
+    the entry is missing it is seeded once from ``initial()``.
+    """
+    key = f'modified:{name}'
+    modified = cache.get(key)
+    if modified is None:
+        note_cold_cache()
+        cache.add(key, initial() or EPOCH, None)
+        modified = cache.get(key) or EPOCH
+    return modified
+
+
+def touch(name, when=None):
+    cache.set(f'modified:{name}', when or timezone.now(), None)
+
+
+def touch_all(names, when=None):
+    when = when or timezone.now()
+    cache.set_many({f'modified:{name}': when for name in names}, None)
+
+
+def services_modified(request, *args, **kwargs):
+    return get_modified(SERVICES, lambda: Service.objects.aggregate(latest=Max('date'))['latest'])
+
+
+def _latest_request(user_id):
+    # A user's requests are the ones they made plus, for a company, the ones it received
+    latest = [
+        requests.aggregate(latest=Max('created_at'))['latest']
+        for requests in (
+            ServiceRequest.objects.filter(customer_id=user_id),
+            ServiceRequest.objects.filter(service__company_id=user_id),
+        )
+    ]
+    return max(filter(None, latest), default=None)
+
+
+def requests_modified(request, *args, **kwargs):
+    if not request.user.is_authenticated:
+        return None
+    user_id = request.user.pk
+    return get_modified(requests_marker(user_id), lambda: _latest_request(user_id))
+
+
+def settled(modified):
+    """
+    Whether a change made at ``modified`` has surely reached the read
+    replicas. Until then no validators are handed out, or a page read from a
+    lagging replica would be cached as the new version.
+    """
+    if not settings.DATABASE_REPLICAS:
+        return True
+    return timezone.now() - modified >= timedelta(seconds=settings.REPLICA_LAG_SECONDS)
+
+
+def make_etag(modified, request, *parts):
+    """Strong validator for one representation: the data's version plus everything that shapes the output."""
+    if not settled(modified):
+        return None
+    raw = '|'.join([modified.isoformat(), request.get_full_path(), *map(str, parts)])
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def services_last_modified(request, *args, **kwargs):
+    modified = services_modified(request)
+    return modified if settled(modified) else None
+
+
+def requests_last_modified(request, *args, **kwargs):
+    modified = requests_modified(request)
+    return modified if modified and settled(modified) else None
+
+
+def services_etag(request, *args, **kwargs):
+    return make_etag(services_modified(request), request)
+
+
+def requests_etag(request, *args, **kwargs):
+    modified = requests_modified(request)
+    if modified is None:
+        return None
+    return make_etag(modified, request, request.user.pk)
+
+
+def page_etag(request, modified, *parts):
+    """
+    Validator for an HTML page. Pages embed the visitor (navbar, owner-only
+    sections) and their CSRF token, so both are part of the representation.
+    """
+    return make_etag(modified, request, request.user.pk, request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''), *parts)
+
+
+def catalog_page_etag(request, *args, **kwargs):
+    # Every catalog page shows the navbar's category counts, so any service change counts
+    return page_etag(request, services_modified(request))
+
+
+def company_profile_etag(request, username, **kwargs):
+    """
+    Validator for a company's profile: its services, its own details and,
+    for the owner, the requests it received. Other profiles aren't conditional.
+    """
+    company_id = User.objects.filter(username=username, is_company=True).values_list('pk', flat=True).first()
+    if company_id is None:
+        return None
+    markers = [services_modified(request), get_modified(profile_marker(company_id), lambda: None)]
+    if request.user.pk == company_id:
+        markers.append(get_modified(requests_marker(company_id), lambda: _latest_request(company_id)))
+    return page_etag(request, max(markers), *[marker.isoformat() for marker in markers])
+
+
+def _page_cache_headers(request, response):
+    if response.has_header('ETag') or response.status_code == 304:
+        if request.user.is_authenticated:
+            patch_cache_control(response, private=True, no_cache=True)
+        else:
+            patch_cache_control(response, public=True, no_cache=True)
+        patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def conditional_page(etag_func):
+    """
+    Answer GETs of an HTML view with a 304 when ``etag_func``'s validator
+    matches. Anonymous copies may be kept by shared caches, signed-in ones
+    only by the browser; either way they're revalidated on every use.
+    Works on async views too, computing the validator off the event loop.
+    """
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                etag = None
+                if request.method in ('GET', 'HEAD'):
+                    etag = await db_sync_to_async(etag_func)(request, *args, **kwargs)
+                if etag:
+                    etag = quote_etag(etag)
+                    response = get_conditional_response(request, etag=etag)
+                    if response is not None:
+                        return _page_cache_headers(request, response)
+                response = await view(request, *args, **kwargs)
+                if etag:
+                    response.setdefault('ETag', etag)
+                return _page_cache_headers(request, response)
+            return async_wrapper
+
+        conditional_view = condition(etag_func=etag_func)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            return _page_cache_headers(request, conditional_view(request, *args, **kwargs))
+        if hasattr(view, 'as_async'):
+            # Keep the async twin from utils.async_view conditional as well
+            wrapper.as_async = decorator(view.as_async)
+        return wrapper
+    return decorator
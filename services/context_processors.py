@@ -0,0 +1,8 @@
+from django.utils.functional import SimpleLazyObject
+
+from .facets import get_facets
+
+
+def service_facets(request):
+    # Lazy, so responses that never render the navbar skip the cache lookups
+    return {'service_facets': SimpleLazyObject(get_facets)}
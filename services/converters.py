@@ -0,0 +1,25 @@
+import re
+
+from django.utils.text import slugify
+
+from users.models import Company
+
+# URL slug of every service field, e.g. 'all-in-one' -> 'All in One'
+FIELD_SLUGS = {slugify(name): name for name, _ in Company.FIELD_CHOICES}
+SLUG_FOR_FIELD = {name: slug for slug, name in FIELD_SLUGS.items()}
+
+
+class FieldConverter:
+    """Matches only known field slugs and hands the view the field name itself."""
+    regex = '|'.join(re.escape(slug) for slug in sorted(FIELD_SLUGS, key=len, reverse=True))
+
+    def to_python(self, value):
+        return FIELD_SLUGS[value]
+
+    def to_url(self, value):
+        # Accept either form, so templates can reverse with service.field
+        if value in SLUG_FOR_FIELD:
+            return SLUG_FOR_FIELD[value]
+        if value in FIELD_SLUGS:
+            return value
+        raise ValueError(f"Unknown service field {value!r}")
@@ -0,0 +1,111 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, router
+
+from main.instrumentation import note_cold_cache
+from users.models import Company
+
+from .cache import bump_version, get_versions
+from .converters import SLUG_FOR_FIELD
+from .models import Service
+
+FIELDS = [name for name, _ in Company.FIELD_CHOICES]
+PRICE_PLACES = Decimal('0.01')
+
+
+def facet_version(field):
+    return f'facets:{SLUG_FOR_FIELD[field]}'
+
+
+def invalidate_facets(fields):
+    """
+    Drop the cached facets of ``fields``. Only the version moves, so writes
+    and imports stay cheap; the next read recomputes what changed.
+    """
+    for field in set(fields):
+        bump_version(facet_version(field))
+
+
+def _empty_facet(field):
+    return {
+        'field': field,
+        'slug': SLUG_FOR_FIELD[field],
+        'count': 0,
+        'min_price': None,
+        'median_price': None,
+        'max_price': None,
+        'average_rating': None,
+    }
+
+
+# Every field's counts, price range, median and rating totals in one
+# statement. Both windows walk each field's services in (field, price_hour)
+# index order; keeping only the middle row, with the price after it for
+# even counts, gives one row per stocked field.
+FACETS_SQL = """
+    SELECT field, stocked, min_price, max_price, price_hour, next_price, rating_total, rating_count
+    FROM (
+        SELECT field, price_hour,
+               ROW_NUMBER() OVER prices AS position,
+               LEAD(price_hour) OVER prices AS next_price,
+               COUNT(*) OVER whole_field AS stocked,
+               MIN(price_hour) OVER whole_field AS min_price,
+               MAX(price_hour) OVER whole_field AS max_price,
+               SUM(rating_sum) OVER whole_field AS rating_total,
+               SUM(rating_count) OVER whole_field AS rating_count
+        FROM services_service
+        WHERE field IN ({placeholders})
+        WINDOW prices AS (PARTITION BY field ORDER BY price_hour),
+               whole_field AS (prices ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING)
+    )
+    WHERE position = (stocked + 1) / 2
+"""
+
+
+def _price(value):
+    # The cursor hands prices back as numbers, without their trailing zeros
+    return Decimal(str(value))
+
+
+def compute_facets(fields):
+    """
+    Facets for ``fields``: counts, price range, median price and rating
+    totals, all from one query.
+    """
+    facets = {field: _empty_facet(field) for field in fields}
+    using = router.db_for_read(Service)
+    with connections[using].cursor() as cursor:
+        cursor.execute(FACETS_SQL.format(placeholders=', '.join(['%s'] * len(fields))), list(fields))
+        rows = cursor.fetchall()
+    for field, count, min_price, max_price, middle, next_price, rating_total, rating_count in rows:
+        median = _price(middle) if count % 2 else (_price(middle) + _price(next_price)) / 2
+        facets[field].update(
+            count=count,
+            min_price=_price(min_price).quantize(PRICE_PLACES),
+            median_price=median.quantize(PRICE_PLACES),
+            max_price=_price(max_price).quantize(PRICE_PLACES),
+        )
+        if rating_count:
+            facets[field]['average_rating'] = round(rating_total / rating_count, 2)
+    return facets
+
+
+def get_facets():
+    """
+    Facets for every field, in FIELD_CHOICES order. Each field is cached
+    under its own version, so a change to one service only recomputes the
+    facet of its field.
+    """
+    versions = get_versions([facet_version(field) for field in FIELDS])
+    keys = {field: f'{facet_version(field)}:{versions[facet_version(field)]}' for field in FIELDS}
+    cached = cache.get_many(keys.values())
+
+    missing = [field for field in FIELDS if keys[field] not in cached]
+    if missing:
+        note_cold_cache()
+        computed = compute_facets(missing)
+        cache.set_many({keys[field]: computed[field] for field in missing}, settings.FACETS_CACHE_TIMEOUT)
+        cached.update({keys[field]: computed[field] for field in missing})
+    return [cached[keys[field]] for field in FIELDS]
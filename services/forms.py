@@ -1,7 +1,7 @@
 from django import forms
-from .models import Company, Review
+from .models import Company, Review, ServiceRequest
 from django.utils import timezone
-from datetime import timedelta
+from .availability import BOOKING_WINDOW, has_conflict
 
 
 class CreateNewService(forms.Form):
@@ -37,6 +37,18 @@ class CreateNewService(forms.Form):
         self.fields['name'].widget.attrs['autocomplete'] = 'off'
 
 
+def check_booking_window(requested_date):
+    now = timezone.now()
+    
+    if requested_date < now:
+        raise forms.ValidationError("Requested date cannot be in the past")
+    
+    if requested_date > now + BOOKING_WINDOW:
+        raise forms.ValidationError("Requested date cannot be more than 30 days in the future")
+        
+    return requested_date
+
+
 class RequestServiceForm(forms.Form):
     address = forms.CharField(
         max_length=255,
@@ -66,17 +78,24 @@ class RequestServiceForm(forms.Form):
         required=False
     )
 
+    def __init__(self, *args, service=None, **kwargs):
+        # With a service, times its company has already accepted a job for are refused
+        super().__init__(*args, **kwargs)
+        self.service = service
+
     def clean_requested_date(self):
-        requested_date = self.cleaned_data['requested_date']
-        now = timezone.now()
-        
-        if requested_date < now:
-            raise forms.ValidationError("Requested date cannot be in the past")
-        
-        if requested_date > now + timedelta(days=30):
-            raise forms.ValidationError("Requested date cannot be more than 30 days in the future")
-            
-        return requested_date
+        return check_booking_window(self.cleaned_data['requested_date'])
+
+    def clean(self):
+        cleaned_data = super().clean()
+        requested_date = cleaned_data.get('requested_date')
+        if self.service and requested_date and cleaned_data.get('hours_needed'):
+            if has_conflict(self.service.company_id, requested_date, cleaned_data['hours_needed']):
+                self.add_error(
+                    'requested_date',
+                    "The company already has a job booked at that time. Please choose another time."
+                )
+        return cleaned_data
 
 
 class ReviewForm(forms.ModelForm):
@@ -95,3 +114,77 @@ class ReviewForm(forms.ModelForm):
                 'placeholder': 'Share your experience with this service...'
             })
         }
+
+
+class ServiceSearchForm(forms.Form):
+    q = forms.CharField(
+        max_length=100,
+        label='Search',
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'What do you need done?'})
+    )
+    field = forms.ChoiceField(
+        required=False,
+        choices=(('', 'All fields'),) + Company.FIELD_CHOICES,
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    min_price = forms.DecimalField(
+        required=False,
+        min_value=0,
+        decimal_places=2,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'Min €/hour'})
+    )
+    max_price = forms.DecimalField(
+        required=False,
+        min_value=0,
+        decimal_places=2,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'Max €/hour'})
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        min_price = cleaned_data.get('min_price')
+        max_price = cleaned_data.get('max_price')
+        if min_price is not None and max_price is not None and min_price > max_price:
+            raise forms.ValidationError("Minimum price cannot be higher than maximum price")
+        return cleaned_data
+
+
+class CompanyAvailabilityForm(forms.Form):
+    field = forms.ChoiceField(
+        choices=Company.FIELD_CHOICES,
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    start = forms.DateTimeField(
+        label='When',
+        widget=forms.DateTimeInput(attrs={'type': 'datetime-local', 'class': 'form-control'})
+    )
+    hours = forms.IntegerField(
+        min_value=1,
+        max_value=24,
+        initial=1,
+        label='Hours needed',
+        widget=forms.NumberInput(attrs={'class': 'form-control'})
+    )
+
+    def clean_start(self):
+        return check_booking_window(self.cleaned_data['start'])
+
+
+class RequestExportForm(forms.Form):
+    FORMAT_CHOICES = (('csv', 'CSV'), ('jsonl', 'JSON Lines'))
+
+    format = forms.ChoiceField(choices=FORMAT_CHOICES, required=False)
+    start = forms.DateField(required=False, help_text="First requested date to include")
+    end = forms.DateField(required=False, help_text="Last requested date to include")
+    status = forms.ChoiceField(
+        required=False,
+        choices=(('', 'Any status'),) + tuple(ServiceRequest._meta.get_field('status').choices)
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start = cleaned_data.get('start')
+        end = cleaned_data.get('end')
+        if start and end and start > end:
+            raise forms.ValidationError("Start date cannot be after end date")
+        return cleaned_data
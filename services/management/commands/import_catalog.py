@@ -0,0 +1,62 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from services.catalog_import import CatalogImporter, read_checkpoint, read_rows, run_import
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream companies, customers, services and historical requests from a JSONL or CSV "
+        "file into the database in batches. Every record needs a 'type' of company, customer, "
+        "service or request; records must come after the records they refer to. Progress is "
+        "checkpointed after each batch and a rerun resumes where the last one stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="JSONL or CSV file to import.")
+        parser.add_argument('--format', choices=('jsonl', 'csv'), help="File format (default: from the extension).")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Records written per transaction.")
+        parser.add_argument('--checkpoint', help="Checkpoint file (default: <path>.checkpoint).")
+        parser.add_argument('--restart', action='store_true', help="Ignore an existing checkpoint.")
+        parser.add_argument('--dry-run', action='store_true', help="Validate every batch, then roll the whole import back.")
+        parser.add_argument('--database', default='default', help="Database alias to import into.")
+        parser.add_argument('--show-errors', type=int, default=20, help="Rejected records to list per batch.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f"{path} does not exist")
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1")
+        fmt = options['format'] or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+        checkpoint = options['checkpoint'] or f'{path}.checkpoint'
+        start_after = 0 if options['restart'] else read_checkpoint(checkpoint)
+        if start_after:
+            self.stdout.write(f"Resuming after record {start_after} (from {checkpoint})")
+
+        importer = CatalogImporter(dry_run=options['dry_run'], using=options['database'])
+        totals = run_import(
+            read_rows(path, fmt),
+            importer,
+            batch_size=options['batch_size'],
+            start_after=start_after,
+            checkpoint=checkpoint,
+            report=lambda *batch: self.report_batch(*batch, show_errors=options['show_errors']),
+        )
+
+        created = ', '.join(
+            f"{totals.created[row_type]} {label}" for row_type, label in
+            (('company', 'companies'), ('customer', 'customers'), ('service', 'services'), ('request', 'requests'))
+        )
+        verb = "Validated" if options['dry_run'] else "Imported"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {created}; rejected {totals.error_count} records."))
+
+    def report_batch(self, number, first, last, result, seconds, show_errors):
+        rate = (last - first + 1) / seconds if seconds else 0
+        self.stdout.write(
+            f"Batch {number}: records {first}-{last}, {result.imported} ok, "
+            f"{len(result.errors)} rejected in {seconds:.2f}s ({rate:.0f} records/s)"
+        )
+        for position, message in result.errors[:show_errors]:
+            self.stderr.write(f"  record {position}: {message}")
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from services.models import Service
+from services.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index from the existing services."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help="Database alias to rebuild.")
+
+    def handle(self, *args, **options):
+        rebuild_search_index(options['database'])
+        count = Service.objects.using(options['database']).count()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} services."))
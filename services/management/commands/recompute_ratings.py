@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from services.models import Review
+
+
+class Command(BaseCommand):
+    help = "Recompute service and company ratings from their reviews, repairing any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Rows fetched per database round trip.")
+
+    def handle(self, *args, **options):
+        services, companies = Review.recompute_ratings(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Repaired ratings on {services} services and {companies} companies."
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from services.models import Service
+
+
+class Command(BaseCommand):
+    help = "Recount requests per service and repair any drift in Service.request_count."
+
+    def handle(self, *args, **options):
+        fixed = Service.reconcile_request_counts()
+        self.stdout.write(self.style.SUCCESS(f"Repaired request counts on {fixed} services."))
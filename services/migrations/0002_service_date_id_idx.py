@@ -0,0 +1,17 @@
+# Generated by Django 3.1.14 on 2026-10-18 17:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='service',
+            index=models.Index(fields=['date', 'id'], name='service_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.1.14 on 2026-10-18 17:59
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_request_counts(apps, schema_editor):
+    Service = apps.get_model('services', 'Service')
+    ServiceRequest = apps.get_model('services', 'ServiceRequest')
+    counts = ServiceRequest.objects.filter(
+        service=OuterRef('pk')
+    ).order_by().values('service').annotate(total=Count('id')).values('total')
+    Service.objects.update(request_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0003_service_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='service',
+            name='request_count',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.RunPython(backfill_request_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 3.1.14 on 2026-10-18 18:00
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_rating_totals(apps, schema_editor):
+    Service = apps.get_model('services', 'Service')
+    Company = apps.get_model('users', 'Company')
+    Review = apps.get_model('services', 'Review')
+
+    for model, lookup in ((Service, 'service'), (Company, 'service__company')):
+        reviews = Review.objects.filter(**{lookup: OuterRef('pk')}).order_by().values(lookup)
+        model.objects.update(
+            rating_sum=Coalesce(Subquery(reviews.annotate(total=Sum('rating')).values('total')), 0),
+            rating_count=Coalesce(Subquery(reviews.annotate(total=Count('id')).values('total'),
+                                           output_field=IntegerField()), 0),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_company_rating_totals'),
+        ('services', '0004_service_request_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='service',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_rating_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.1.14 on 2026-10-18 18:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0005_rating_totals'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='service',
+            index=models.Index(fields=['field', '-date', '-id'], name='service_field_date_idx'),
+        ),
+    ]
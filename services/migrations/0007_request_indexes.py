@@ -0,0 +1,46 @@
+# Generated by Django 3.1.14 on 2026-10-18 18:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_company_rating_totals'),
+        ('services', '0006_service_field_date_index'),
+    ]
+
+    operations = [
+        # New indexes first, so the foreign keys are never left unindexed
+        migrations.AddIndex(
+            model_name='servicerequest',
+            index=models.Index(fields=['customer', '-created_at', '-id'], name='request_customer_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='servicerequest',
+            index=models.Index(fields=['customer', '-requested_date'], name='request_customer_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='servicerequest',
+            index=models.Index(fields=['service', '-created_at', '-id'], name='request_service_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='servicerequest',
+            index=models.Index(fields=['service', '-requested_date'], name='request_service_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='servicerequest',
+            index=models.Index(condition=models.Q(status='PENDING'), fields=['service', 'requested_date'], name='request_pending_idx'),
+        ),
+        migrations.AlterField(
+            model_name='servicerequest',
+            name='customer',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='users.customer'),
+        ),
+        migrations.AlterField(
+            model_name='servicerequest',
+            name='service',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='services.service'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.1.14 on 2026-10-18 18:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0007_request_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['customer', '-created_at', '-id'], name='review_customer_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['service', '-created_at', '-id'], name='review_service_created_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.1.14 on 2026-10-18 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0008_review_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='service',
+            index=models.Index(fields=['field', 'price_hour'], name='service_field_price_idx'),
+        ),
+    ]
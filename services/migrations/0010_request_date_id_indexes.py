@@ -0,0 +1,29 @@
+# Generated by Django 3.1.14 on 2026-10-18 19:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0009_service_field_price_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='servicerequest',
+            name='request_customer_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='servicerequest',
+            name='request_service_date_idx',
+        ),
+        migrations.AddIndex(
+            model_name='servicerequest',
+            index=models.Index(fields=['customer', '-requested_date', '-id'], name='request_customer_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='servicerequest',
+            index=models.Index(fields=['service', '-requested_date', '-id'], name='request_service_date_idx'),
+        ),
+    ]
@@ -1,9 +1,37 @@
-from django.db import models
+from django.db import models, router, transaction
+from django.db.models import Case, Count, F, FloatField, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Round
 from django.core.validators import MaxValueValidator, MinValueValidator
 from users.models import Company, Customer, User
 
 
+def round_rating(total, count, empty):
+    # Half-up, matching SQL ROUND in rating_changes
+    return int(total / count + 0.5) if count else empty
+
+
+def rating_changes(delta_sum, delta_count, empty):
+    """
+    Update kwargs that fold one review change into a running rating sum and
+    count, and refresh the rounded star value in the same statement.
+    """
+    total = F('rating_sum') + delta_sum
+    count = F('rating_count') + delta_count
+    return {
+        'rating_sum': total,
+        'rating_count': count,
+        'rating': Case(
+            When(rating_count=-delta_count, then=Value(empty)),
+            default=Cast(Round(Cast(total, FloatField()) / count), IntegerField()),
+            output_field=IntegerField(),
+        ),
+    }
+
+
 class Service(models.Model):
+    # newest first, with id breaking ties between services saved in the same instant
+    LISTING_ORDER = ('-date', '-id')
+
     company = models.ForeignKey(Company, on_delete=models.CASCADE)
     name = models.CharField(max_length=40)
     description = models.TextField()
@@ -13,28 +41,58 @@ class Service(models.Model):
         default=1,
         help_text="Rating from 1 to 5 stars"
     )
+    # Running totals behind rating, maintained by Review
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
     
     field = models.CharField(max_length=30, blank=False,
                              null=False, choices=Company.FIELD_CHOICES)
     date = models.DateTimeField(auto_now=True, null=False)
+    # Kept in step with ServiceRequest inserts/deletes by services.signals
+    request_count = models.PositiveIntegerField(default=0, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date', 'id'], name='service_date_id_idx'),
+            # Category pages: one field, newest first
+            models.Index(fields=['field', '-date', '-id'], name='service_field_date_idx'),
+            # Median price of a field (services.facets)
+            models.Index(fields=['field', 'price_hour'], name='service_field_price_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    @property
+    def average_rating(self):
+        if not self.rating_count:
+            return None
+        return self.rating_sum / self.rating_count
+
     def get_request_count(self):
-        return self.servicerequest_set.count()
+        return self.request_count
 
     @staticmethod
     def get_most_requested(limit=6):
-        from django.db.models import Count
-        return Service.objects.annotate(
-            request_count=Count('servicerequest')
-        ).order_by('-request_count')[:limit]
+        return Service.objects.select_related('company__user').order_by('-request_count', '-id')[:limit]
+
+    @staticmethod
+    def reconcile_request_counts():
+        """Repair services whose stored request_count has drifted; returns how many were fixed."""
+        drifted = Service.objects.annotate(
+            actual=Count('servicerequest')
+        ).exclude(request_count=F('actual')).values_list('id', 'actual')
+        fixed = 0
+        for service_id, actual in drifted.iterator():
+            Service.objects.filter(pk=service_id).update(request_count=actual)
+            fixed += 1
+        return fixed
 
 
 class ServiceRequest(models.Model):
-    service = models.ForeignKey(Service, on_delete=models.CASCADE)
-    customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
+    # Both foreign keys lead the composite indexes below, which stand in for their own
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, db_index=False)
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, db_index=False)
     requested_date = models.DateTimeField()
     address = models.CharField(max_length=255, null=True, blank=True)  # Make it nullable initially
     hours_needed = models.PositiveIntegerField(null=True, blank=True)  # Make it nullable initially
@@ -48,11 +106,27 @@ class ServiceRequest(models.Model):
     ], default='PENDING')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # A customer's requests newest first (request lists, the API), and by appointment (profile)
+            models.Index(fields=['customer', '-created_at', '-id'], name='request_customer_created_idx'),
+            models.Index(fields=['customer', '-requested_date', '-id'], name='request_customer_date_idx'),
+            # A company's requests are found through its services
+            models.Index(fields=['service', '-created_at', '-id'], name='request_service_created_idx'),
+            models.Index(fields=['service', '-requested_date', '-id'], name='request_service_date_idx'),
+            # Requests still waiting for the company, a small share of the table
+            models.Index(
+                fields=['service', 'requested_date'], condition=Q(status='PENDING'), name='request_pending_idx'
+            ),
+        ]
+
     def save(self, *args, **kwargs):
         # Calculate total cost before saving
         if self.hours_needed and self.service and not self.total_cost:
             self.total_cost = self.service.price_hour * self.hours_needed
-        super().save(*args, **kwargs)
+        # post_save receivers (request counter) commit or roll back with the row
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
 
 class Review(models.Model):
     service_request = models.OneToOneField('ServiceRequest', on_delete=models.CASCADE)
@@ -67,20 +141,58 @@ class Review(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Reviews on a profile, newest first
+            models.Index(fields=['customer', '-created_at', '-id'], name='review_customer_created_idx'),
+            models.Index(fields=['service', '-created_at', '-id'], name='review_service_created_idx'),
+        ]
 
     def __str__(self):
         return f"Review by {self.customer.user.username} for {self.service.name}"
 
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        # Update service average rating
-        service_reviews = Review.objects.filter(service=self.service)
-        avg_rating = service_reviews.aggregate(models.Avg('rating'))['rating__avg']
-        self.service.rating = round(avg_rating) if avg_rating else 0
-        self.service.save()
-        
-        # Update company average rating
-        company_reviews = Review.objects.filter(service__company=self.service.company)
-        avg_company_rating = company_reviews.aggregate(models.Avg('rating'))['rating__avg']
-        self.service.company.rating = round(avg_company_rating) if avg_company_rating else 0
-        self.service.company.save()
+        using = kwargs.get('using')
+        with transaction.atomic(using=using):
+            if self._state.adding:
+                delta_sum, delta_count = self.rating, 1
+            else:
+                previous = Review.objects.using(using).filter(pk=self.pk).values_list('rating', flat=True).first()
+                delta_sum, delta_count = self.rating - (previous or 0), 0
+            if delta_sum or delta_count:
+                # Ahead of the insert so post_save receivers see the new totals
+                Review.apply_rating_delta(
+                    self.service_id, delta_sum, delta_count,
+                    using=using or router.db_for_write(Review, instance=self)
+                )
+            super().save(*args, **kwargs)
+
+    @staticmethod
+    def apply_rating_delta(service_id, delta_sum, delta_count, using=None):
+        """Fold a review change into the running ratings of its service and company."""
+        Service.objects.using(using).filter(pk=service_id).update(
+            **rating_changes(delta_sum, delta_count, empty=1)
+        )
+        Company.objects.using(using).filter(service__id=service_id).update(
+            **rating_changes(delta_sum, delta_count, empty=0)
+        )
+
+    @staticmethod
+    def recompute_ratings(batch_size=500):
+        """
+        Rebuild rating sums, counts and stars from the reviews themselves.
+        Returns how many services and companies had drifted.
+        """
+        fixed = {}
+        for model, path, empty in ((Service, 'review', 1), (Company, 'service__review', 0)):
+            totals = model.objects.annotate(
+                actual_sum=Coalesce(Sum(f'{path}__rating'), 0),
+                actual_count=Count(f'{path}__id'),
+            ).values_list('pk', 'rating_sum', 'rating_count', 'rating', 'actual_sum', 'actual_count')
+
+            fixed[model.__name__] = 0
+            for pk, stored_sum, stored_count, stored_rating, total, count in totals.iterator(chunk_size=batch_size):
+                rating = round_rating(total, count, empty)
+                if (stored_sum, stored_count, stored_rating) != (total, count, rating):
+                    model.objects.filter(pk=pk).update(rating_sum=total, rating_count=count, rating=rating)
+                    fixed[model.__name__] += 1
+        return fixed['Service'], fixed['Company']
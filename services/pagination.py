@@ -0,0 +1,142 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 20
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def get_page_size():
+    return getattr(settings, 'SERVICES_PAGE_SIZE', DEFAULT_PAGE_SIZE)
+
+
+def _serialize(value):
+    if isinstance(value, (datetime, date)):
+        # isoformat keeps microseconds, which the keyset comparison needs
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def encode_cursor(values):
+    raw = json.dumps([_serialize(v) for v in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, model, ordering):
+    """Turn a cursor token back into typed values for the ordering fields."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor("Malformed cursor.")
+
+    if not isinstance(values, list) or len(values) != len(ordering):
+        raise InvalidCursor("Cursor does not match the listing order.")
+
+    decoded = []
+    for name, value in zip(ordering, values):
+        field = model._meta.get_field(name.lstrip('-'))
+        try:
+            decoded.append(field.to_python(value))
+        except ValidationError:
+            raise InvalidCursor("Malformed cursor.")
+    return decoded
+
+
+def _keyset_filter(ordering, values, forward=True):
+    """
+    Build the "comes after this row" condition for a multi-column ordering,
+    e.g. for ('-date', '-id'): date <= d AND (date < d OR (date = d AND id < i)).
+    The redundant bound on the first column is what lets the database seek
+    into the index instead of walking it from the start.
+    """
+    condition = Q()
+    for i, name in enumerate(ordering):
+        descending = name.startswith('-')
+        lookup = 'lt' if descending == forward else 'gt'
+        clause = Q(**{f'{name.lstrip("-")}__{lookup}': values[i]})
+        for prev_name, prev_value in zip(ordering[:i], values[:i]):
+            clause &= Q(**{prev_name.lstrip('-'): prev_value})
+        condition |= clause
+    if len(ordering) > 1:
+        first = ordering[0]
+        lookup = 'lte' if first.startswith('-') == forward else 'gte'
+        condition = Q(**{f'{first.lstrip("-")}__{lookup}': values[0]}) & condition
+    return condition
+
+
+def _reverse(ordering):
+    return [name[1:] if name.startswith('-') else f'-{name}' for name in ordering]
+
+
+class KeysetPage:
+    def __init__(self, items, ordering, has_next, has_previous):
+        self.items = items
+        self.ordering = ordering
+        self.has_next = has_next
+        self.has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+    def _cursor_for(self, item):
+        return encode_cursor([getattr(item, name.lstrip('-')) for name in self.ordering])
+
+    @property
+    def next_cursor(self):
+        if self.has_next and self.items:
+            return self._cursor_for(self.items[-1])
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous and self.items:
+            return self._cursor_for(self.items[0])
+        return None
+
+
+def paginate(queryset, ordering, after=None, before=None, page_size=None):
+    """
+    Return one page of ``queryset`` ordered by ``ordering``, which must end in
+    a unique column (usually ``id``) so that every row has a stable position.
+
+    ``after`` and ``before`` are cursor tokens taken from a previous page's
+    ``next_cursor``/``previous_cursor``. Each page costs a single query that
+    seeks through the ordering index instead of counting or offsetting.
+    """
+    page_size = page_size or get_page_size()
+    ordering = list(ordering)
+
+    if before:
+        values = decode_cursor(before, queryset.model, ordering)
+        rows = list(
+            queryset.filter(_keyset_filter(ordering, values, forward=False))
+            .order_by(*_reverse(ordering))[:page_size + 1]
+        )
+        has_previous = len(rows) > page_size
+        items = rows[:page_size][::-1]
+        return KeysetPage(items, ordering, has_next=True, has_previous=has_previous)
+
+    if after:
+        values = decode_cursor(after, queryset.model, ordering)
+        queryset = queryset.filter(_keyset_filter(ordering, values))
+
+    rows = list(queryset.order_by(*ordering)[:page_size + 1])
+    return KeysetPage(rows[:page_size], ordering, has_next=len(rows) > page_size, has_previous=bool(after))
@@ -0,0 +1,120 @@
+import re
+
+from django.conf import settings
+from django.db import connections, router
+
+from .models import Service
+
+FTS_TABLE = 'services_service_fts'
+
+# External-content FTS5 table: the index stores only tokens and reads the
+# text back from services_service, and the triggers keep both in step for
+# every write path (ORM saves, bulk_create, queryset updates, raw SQL).
+SEARCH_INDEX_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, description,
+        content='services_service', content_rowid='id',
+        tokenize='porter unicode61'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON services_service BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON services_service BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF name, description ON services_service BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+]
+
+# Name matches count for more than description matches when ranking
+NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+
+def create_search_index(connection):
+    """
+    Create the FTS table and its sync triggers if they are missing.
+
+    SQLite drops a table's triggers whenever Django rebuilds the table during
+    a migration, so this also runs after every migrate.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for statement in SEARCH_INDEX_SQL:
+            cursor.execute(statement)
+
+
+def rebuild_search_index(using='default'):
+    connection = connections[using]
+    create_search_index(connection)
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def build_match_query(text):
+    """
+    Turn free text into an FTS5 query: every word must match, as a prefix,
+    so "plumb repair" finds "Plumbing repairs". Quoting each term keeps FTS
+    operators typed by users from being interpreted.
+    """
+    terms = re.findall(r'\w+', text.lower())
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def search_services(query, field=None, min_price=None, max_price=None, limit=None):
+    """Return services matching ``query``, best BM25 match first."""
+    match = build_match_query(query)
+    if not match:
+        return []
+    limit = limit or getattr(settings, 'SEARCH_RESULTS_LIMIT', 50)
+    using = router.db_for_read(Service)
+    services = Service.objects.using(using).select_related('company__user')
+
+    if connections[using].vendor != 'sqlite':
+        services = services.filter(name__icontains=query)
+        if field:
+            services = services.filter(field=field)
+        if min_price is not None:
+            services = services.filter(price_hour__gte=min_price)
+        if max_price is not None:
+            services = services.filter(price_hour__lte=max_price)
+        return list(services.order_by(*Service.LISTING_ORDER)[:limit])
+
+    sql = [
+        f"SELECT s.id FROM {FTS_TABLE} JOIN services_service s ON s.id = {FTS_TABLE}.rowid",
+        f"WHERE {FTS_TABLE} MATCH %s",
+    ]
+    params = [match]
+    if field:
+        sql.append("AND s.field = %s")
+        params.append(field)
+    if min_price is not None:
+        sql.append("AND s.price_hour >= %s")
+        params.append(min_price)
+    if max_price is not None:
+        sql.append("AND s.price_hour <= %s")
+        params.append(max_price)
+    sql.append(f"ORDER BY bm25({FTS_TABLE}, %s, %s) LIMIT %s")
+    params += [NAME_WEIGHT, DESCRIPTION_WEIGHT, limit]
+
+    with connections[using].cursor() as cursor:
+        cursor.execute(' '.join(sql), params)
+        ids = [row[0] for row in cursor.fetchall()]
+
+    by_id = services.in_bulk(ids)
+    return [by_id[pk] for pk in ids if pk in by_id]
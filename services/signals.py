@@ -0,0 +1,134 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .availability import invalidate_availability
+from .cache import POPULAR_SERVICES, bump_field_versions, bump_version
+from users.models import Company
+
+from .conditional import SERVICES, profile_marker, requests_marker, touch, touch_all
+from .facets import invalidate_facets
+from .models import Review, Service, ServiceRequest
+
+
+def _adjust_request_count(service_request, delta, using):
+    services = Service.objects.using(using).filter(pk=service_request.service_id)
+    if delta < 0:
+        services = services.filter(request_count__gt=0)
+    services.update(request_count=F('request_count') + delta)
+
+    # Keep an already loaded service in step with the row we just changed
+    if ServiceRequest.service.is_cached(service_request):
+        service = service_request.service
+        service.request_count = max(service.request_count + delta, 0)
+
+
+@receiver(post_save, sender=ServiceRequest)
+def count_new_request(sender, instance, created, using, **kwargs):
+    if created:
+        _adjust_request_count(instance, 1, using)
+
+
+@receiver(post_delete, sender=ServiceRequest)
+def uncount_deleted_request(sender, instance, using, **kwargs):
+    _adjust_request_count(instance, -1, using)
+
+
+@receiver(post_delete, sender=Review)
+def unrate_deleted_review(sender, instance, using, **kwargs):
+    Review.apply_rating_delta(instance.service_id, -instance.rating, -1, using=using)
+
+
+@receiver(post_save, sender=ServiceRequest)
+@receiver(post_delete, sender=ServiceRequest)
+def invalidate_popular_on_request_change(sender, instance, using, **kwargs):
+    # Only inserts and deletes move request counts. Bumped once committed, as
+    # ServiceRequest.save runs in a transaction and a home page rendered in
+    # between would cache the old counts under the new version
+    if kwargs.get('created', True):
+        transaction.on_commit(lambda: bump_version(POPULAR_SERVICES), using=using)
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+def invalidate_popular_on_service_change(sender, instance, **kwargs):
+    bump_version(POPULAR_SERVICES)
+
+
+@receiver(pre_save, sender=Service)
+def remember_previous_field(sender, instance, using, **kwargs):
+    # An edit that moves a service to another field changes both category pages
+    if not instance._state.adding:
+        instance._previous_field = Service.objects.using(using).filter(
+            pk=instance.pk).values_list('field', flat=True).first()
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+def invalidate_field_caches(sender, instance, **kwargs):
+    fields = [instance.field]
+    if getattr(instance, '_previous_field', None):
+        fields.append(instance._previous_field)
+    bump_field_versions(fields)
+    invalidate_facets(fields)
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_facet_rating(sender, instance, using, **kwargs):
+    if Review.service.is_cached(instance):
+        field = instance.service.field
+    else:
+        field = Service.objects.using(using).filter(
+            pk=instance.service_id).values_list('field', flat=True).first()
+    if field:
+        # Review.save runs in a transaction; a navbar rendered before it
+        # commits would cache the old rating totals under the new version
+        transaction.on_commit(lambda: invalidate_facets([field]), using=using)
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def touch_services(sender, instance, using, **kwargs):
+    # Reviews move the ratings shown with each service. Touched once committed,
+    # or a revalidation in between would pin the old page to the new validator
+    transaction.on_commit(lambda: touch(SERVICES), using=using)
+
+
+def _request_company_id(service_request, using):
+    if ServiceRequest.service.is_cached(service_request):
+        return service_request.service.company_id
+    return Service.objects.using(using).filter(
+        pk=service_request.service_id).values_list('company_id', flat=True).first()
+
+
+@receiver(post_save, sender=ServiceRequest)
+@receiver(post_delete, sender=ServiceRequest)
+def touch_requests(sender, instance, using, **kwargs):
+    company_id = _request_company_id(instance, using)
+    names = [requests_marker(instance.customer_id)]
+    if company_id:
+        names.append(requests_marker(company_id))
+    # New and deleted requests change request_count
+    if kwargs.get('created', True):
+        names.append(SERVICES)
+    transaction.on_commit(lambda: touch_all(names), using=using)
+
+
+@receiver(post_save, sender=ServiceRequest)
+@receiver(post_delete, sender=ServiceRequest)
+def invalidate_bookings(sender, instance, using, **kwargs):
+    # Only accepted requests are in the index, but a save may be what moved one out.
+    # Bumping before commit would let a concurrent check cache the old rows
+    # under the new version.
+    company_id = _request_company_id(instance, using)
+    if company_id:
+        transaction.on_commit(lambda: invalidate_availability(company_id), using=using)
+
+
+@receiver(post_save, sender=Company)
+def touch_profile(sender, instance, **kwargs):
+    touch(profile_marker(instance.pk))
@@ -1,9 +1,30 @@
 
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 from django.utils import timezone
+from main.testing import on_commit_callbacks
 from users.models import User, Company, Customer
+from users.sections import section_page
+from .api import REQUEST_ORDER
+from .availability import BookingIndex, available_companies, free_slots, has_conflict
+from .catalog_import import CatalogImporter, read_rows, run_import
+from .conditional import services_modified
+from .facets import FIELDS, compute_facets, get_facets
+from .forms import RequestServiceForm
 from .models import Service, ServiceRequest, Review
+from .pagination import encode_cursor, paginate
+from .search import FTS_TABLE, search_services
+from .views import requests_for
 from decimal import Decimal
+from io import StringIO
+import json
+import os
+import re
+import tempfile
 
 class ServiceModelTests(TestCase):
     def setUp(self):
@@ -276,3 +297,1356 @@ class ReviewModelTests(TestCase):
         self.assertEqual(self.service.rating, 4)  # (5 + 3) / 2 = 4
         self.assertEqual(self.company.rating, 4)
 
+    def test_exact_average_alongside_stars(self):
+        """Test the running sum and count give the exact average"""
+        Review.objects.create(
+            service_request=self.service_request,
+            service=self.service,
+            customer=self.customer,
+            rating=4
+        )
+        other_request = ServiceRequest.objects.create(
+            service=self.service,
+            customer=self.customer,
+            requested_date=timezone.now() + timezone.timedelta(days=2),
+            status='COMPLETED'
+        )
+        Review.objects.create(service_request=other_request, service=self.service, customer=self.customer, rating=5)
+
+        self.service.refresh_from_db()
+        self.company.refresh_from_db()
+        self.assertEqual((self.service.rating_sum, self.service.rating_count), (9, 2))
+        self.assertEqual(self.service.average_rating, 4.5)
+        self.assertEqual(self.service.rating, 5)
+        self.assertEqual(self.company.average_rating, 4.5)
+
+    def test_review_save_does_not_reaggregate(self):
+        """Test saving a review costs a fixed number of queries"""
+        # savepoint, service update, company update, insert, release
+        with self.assertNumQueries(5):
+            Review.objects.create(
+                service_request=self.service_request,
+                service=self.service,
+                customer=self.customer,
+                rating=5
+            )
+
+    def test_edit_and_delete_review(self):
+        """Test changing or removing a review moves the running totals"""
+        review = Review.objects.create(
+            service_request=self.service_request,
+            service=self.service,
+            customer=self.customer,
+            rating=5
+        )
+        review.rating = 2
+        review.save()
+        self.service.refresh_from_db()
+        self.assertEqual((self.service.rating_sum, self.service.rating_count, self.service.rating), (2, 1, 2))
+
+        review.delete()
+        self.service.refresh_from_db()
+        self.company.refresh_from_db()
+        self.assertEqual((self.service.rating_sum, self.service.rating_count), (0, 0))
+        self.assertIsNone(self.service.average_rating)
+        self.assertEqual(self.company.rating, 0)
+
+    def test_recompute_command_repairs_drift(self):
+        """Test the recompute command rebuilds totals from the reviews"""
+        Review.objects.create(
+            service_request=self.service_request,
+            service=self.service,
+            customer=self.customer,
+            rating=3
+        )
+        Service.objects.filter(pk=self.service.pk).update(rating_sum=40, rating_count=9, rating=4)
+
+        out = StringIO()
+        call_command('recompute_ratings', stdout=out)
+        self.service.refresh_from_db()
+        self.assertEqual((self.service.rating_sum, self.service.rating_count, self.service.rating), (3, 1, 3))
+        self.assertIn('1 services and 0 companies', out.getvalue())
+
+
+@override_settings(SERVICES_PAGE_SIZE=2)
+class ServiceListViewTests(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(
+            user=User.objects.create_user(
+                username='testcompany',
+                password='testpass123',
+                email='company@test.com',
+                is_company=True
+            ),
+            field='Plumbing'
+        )
+        self.services = [
+            Service.objects.create(
+                company=self.company,
+                name=f'Service {i}',
+                description='Test Description',
+                price_hour=Decimal('50.00'),
+                field='Plumbing'
+            )
+            for i in range(5)
+        ]
+        self.url = reverse('services_list')
+
+    def test_first_page_is_newest_services(self):
+        """Test the first page holds the newest services and links to the next page"""
+        response = self.client.get(self.url)
+        page = response.context['page']
+        self.assertEqual([s.name for s in page], ['Service 4', 'Service 3'])
+        self.assertTrue(page.has_next)
+        self.assertFalse(page.has_previous)
+
+    def test_next_and_previous_cursors(self):
+        """Test walking forward and back through pages with cursor tokens"""
+        first = self.client.get(self.url).context['page']
+        second = self.client.get(self.url, {'after': first.next_cursor}).context['page']
+        self.assertEqual([s.name for s in second], ['Service 2', 'Service 1'])
+        self.assertTrue(second.has_previous)
+
+        last = self.client.get(self.url, {'after': second.next_cursor}).context['page']
+        self.assertEqual([s.name for s in last], ['Service 0'])
+        self.assertFalse(last.has_next)
+
+        back = self.client.get(self.url, {'before': second.previous_cursor}).context['page']
+        self.assertEqual([s.name for s in back], ['Service 4', 'Service 3'])
+        self.assertFalse(back.has_previous)
+
+    def test_query_count_is_bounded(self):
+        """Test a page costs the same number of queries regardless of catalog size"""
+        get_facets()  # the navbar's facets are cached on their own
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+        for i in range(20):
+            Service.objects.create(
+                company=self.company,
+                name=f'Extra {i}',
+                description='Test Description',
+                price_hour=Decimal('50.00'),
+                field='Plumbing'
+            )
+        get_facets()
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+
+    def test_invalid_cursor_returns_404(self):
+        """Test a tampered cursor is rejected"""
+        response = self.client.get(self.url, {'after': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(self.url, {'after': encode_cursor([1])})
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(SERVICES_PAGE_SIZE=2)
+class ServiceFieldViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.company = Company.objects.create(
+            user=User.objects.create_user(
+                username='testcompany',
+                password='testpass123',
+                email='company@test.com',
+                is_company=True
+            ),
+            field='All in One'
+        )
+        for i in range(3):
+            Service.objects.create(
+                company=self.company,
+                name=f'Service {i}',
+                description='Test Description',
+                price_hour=Decimal('50.00'),
+                field='House Keeping'
+            )
+        self.url = reverse('service_field', args=['House Keeping'])
+
+    def test_slugs_map_to_field_names(self):
+        """Test field slugs resolve to the exact field name"""
+        self.assertEqual(self.url, '/services/house-keeping/')
+        self.assertEqual(self.client.get('/services/all-in-one/').context['field'], 'All in One')
+        self.assertEqual(self.client.get('/services/not-a-field/').status_code, 404)
+
+    def test_requests_list_is_not_shadowed(self):
+        """Test the requests list is no longer taken for a field page"""
+        self.client.force_login(self.company.user)
+        response = self.client.get(reverse('service_requests_list'))
+        self.assertTemplateUsed(response, 'services/requests_list.html')
+
+    def test_pages_are_cached(self):
+        """Test a category page is only queried on the first visit"""
+        # The navbar's facets and the catalog's modified marker are cached on their own
+        get_facets()
+        services_modified(None)
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual([s.name for s in response.context['page']], ['Service 2', 'Service 1'])
+        after = self.client.get(self.url, {'after': response.context['page'].next_cursor})
+        self.assertEqual([s.name for s in after.context['page']], ['Service 0'])
+
+    def test_service_change_invalidates_field(self):
+        """Test saving a service refreshes its field's pages only"""
+        other = reverse('service_field', args=['Painting'])
+        self.client.get(self.url)
+        self.client.get(other)
+        Service.objects.create(
+            company=self.company,
+            name='New Service',
+            description='Test Description',
+            price_hour=Decimal('50.00'),
+            field='House Keeping'
+        )
+        self.assertContains(self.client.get(self.url), 'New Service')
+        with self.assertNumQueries(0):
+            self.client.get(other)
+
+    def test_moving_service_invalidates_both_fields(self):
+        """Test moving a service to another field refreshes both pages"""
+        other = reverse('service_field', args=['Painting'])
+        self.client.get(self.url)
+        self.client.get(other)
+        service = Service.objects.get(name='Service 2')
+        service.field = 'Painting'
+        service.save()
+        self.assertContains(self.client.get(other), 'Service 2')
+        self.assertNotContains(self.client.get(self.url), 'Service 2')
+
+
+class ServiceFacetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.company = Company.objects.create(
+            user=User.objects.create_user(
+                username='testcompany',
+                password='testpass123',
+                email='company@test.com',
+                is_company=True
+            ),
+            field='All in One'
+        )
+        self.customer = Customer.objects.create(
+            user=User.objects.create_user(
+                username='testcustomer',
+                password='testpass123',
+                email='customer@test.com',
+                is_customer=True
+            ),
+            date_of_birth=timezone.now().date()
+        )
+        self.services = [
+            Service.objects.create(
+                company=self.company,
+                name=f'Service {price}',
+                description='Test Description',
+                price_hour=Decimal(price),
+                field='Plumbing'
+            )
+            for price in ('20.00', '30.00', '45.00', '80.00')
+        ]
+        self.url = reverse('service_facets')
+
+    def facets(self):
+        return {facet['field']: facet for facet in self.client.get(self.url).json()['fields']}
+
+    def test_counts_and_price_statistics(self):
+        """Test every field is listed with its count and price spread"""
+        facets = self.facets()
+        self.assertEqual(len(facets), len(Company.FIELD_CHOICES))
+        plumbing = facets['Plumbing']
+        self.assertEqual(plumbing['count'], 4)
+        self.assertEqual(
+            (plumbing['min_price'], plumbing['median_price'], plumbing['max_price']),
+            ('20.00', '37.50', '80.00')
+        )
+        self.assertEqual(plumbing['url'], '/services/plumbing/')
+        self.assertEqual(facets['Locks']['count'], 0)
+        self.assertIsNone(facets['Locks']['median_price'])
+
+    def test_computed_in_one_grouped_query(self):
+        """Test a cold cache computes every field, medians included, in one grouped query"""
+        cache.clear()
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+
+    def test_service_change_refreshes_only_its_field(self):
+        """Test saving a service only invalidates its own field's facet"""
+        self.client.get(self.url)
+        with self.assertNumQueries(1):  # insert
+            Service.objects.create(
+                company=self.company,
+                name='Lock Service',
+                description='Test Description',
+                price_hour=Decimal('60.00'),
+                field='Locks'
+            )
+        # The next read recomputes Locks alone
+        with self.assertNumQueries(1):
+            facets = self.facets()
+        self.assertEqual(facets['Locks']['count'], 1)
+        self.assertEqual(facets['Locks']['median_price'], '60.00')
+        self.assertEqual(facets['Plumbing']['count'], 4)
+
+    def test_reviews_refresh_average_rating(self):
+        """Test reviews update the field's average rating once they commit"""
+        self.facets()
+        with on_commit_callbacks():
+            for rating in (5, 2):
+                Review.objects.create(
+                    service_request=ServiceRequest.objects.create(
+                        service=self.services[0],
+                        customer=self.customer,
+                        requested_date=timezone.now(),
+                        status='COMPLETED'
+                    ),
+                    service=self.services[0],
+                    customer=self.customer,
+                    rating=rating
+                )
+            self.assertIsNone(self.facets()['Plumbing']['average_rating'])
+        self.assertEqual(self.facets()['Plumbing']['average_rating'], 3.5)
+
+    def test_navbar_shows_counts(self):
+        """Test the navbar lists each field with its service count"""
+        response = self.client.get(reverse('services_list'))
+        self.assertContains(response, 'Plumbing <span class="facet-count">(4)</span>', html=False)
+
+
+class ConditionalPageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.company = Company.objects.create(
+            user=User.objects.create_user(
+                username='testcompany',
+                password='testpass123',
+                email='company@test.com',
+                is_company=True
+            ),
+            field='Plumbing'
+        )
+        self.customer = Customer.objects.create(
+            user=User.objects.create_user(
+                username='testcustomer',
+                password='testpass123',
+                email='customer@test.com',
+                is_customer=True
+            ),
+            date_of_birth=timezone.now().date()
+        )
+        self.service = Service.objects.create(
+            company=self.company,
+            name='Test Service',
+            description='Test Description',
+            price_hour=Decimal('50.00'),
+            field='Plumbing'
+        )
+        self.urls = [
+            reverse('services_list'),
+            reverse('service_detail', args=[self.service.id]),
+            reverse('service_field', args=['Plumbing']),
+            reverse('profile', args=['testcompany']),
+        ]
+
+    def test_unchanged_pages_are_not_modified(self):
+        """Test revalidating an unchanged page gets a 304 with the same headers"""
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response['Cache-Control'], 'public, no-cache')
+                self.assertIn('Cookie', response['Vary'])
+                revalidated = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(revalidated.status_code, 304)
+                self.assertEqual(revalidated['Cache-Control'], 'public, no-cache')
+
+    def test_catalog_revalidation_skips_the_view(self):
+        """Test a 304 for an anonymous visitor runs no queries"""
+        etag = self.client.get(self.urls[0])['ETag']
+        with self.assertNumQueries(0):
+            self.client.get(self.urls[0], HTTP_IF_NONE_MATCH=etag)
+
+    def test_changes_invalidate_pages(self):
+        """Test services, reviews and company edits make the pages stale"""
+        etags = {url: self.client.get(url)['ETag'] for url in self.urls}
+        self.service.price_hour = Decimal('60.00')
+        with on_commit_callbacks():
+            self.service.save()
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        profile = self.urls[-1]
+        etag = self.client.get(profile)['ETag']
+        self.company.description = 'Now with more pipes'
+        self.company.save()
+        response = self.client.get(profile, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Now with more pipes')
+
+    def test_pages_are_per_visitor(self):
+        """Test signing in changes the validator and keeps the copy private"""
+        etag = self.client.get(self.urls[0])['ETag']
+        self.client.force_login(self.customer.user)
+        response = self.client.get(self.urls[0], HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+    def test_owner_profile_follows_requests(self):
+        """Test the owner's profile goes stale when a request comes in"""
+        self.client.force_login(self.company.user)
+        profile = self.urls[-1]
+        etag = self.client.get(profile)['ETag']
+        self.assertEqual(self.client.get(profile, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with on_commit_callbacks():
+            ServiceRequest.objects.create(
+                service=self.service,
+                customer=self.customer,
+                requested_date=timezone.now() + timezone.timedelta(days=1)
+            )
+        response = self.client.get(profile, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'testcustomer')
+
+    def test_customer_profile_is_not_conditional(self):
+        """Test customer profiles always render in full"""
+        response = self.client.get(reverse('profile', args=['testcustomer']))
+        self.assertFalse(response.has_header('ETag'))
+
+
+@override_settings(SERVICES_PAGE_SIZE=2)
+class ServiceApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.company = Company.objects.create(
+            user=User.objects.create_user(
+                username='testcompany',
+                password='testpass123',
+                email='company@test.com',
+                is_company=True
+            ),
+            field='All in One'
+        )
+        self.customer = Customer.objects.create(
+            user=User.objects.create_user(
+                username='testcustomer',
+                password='testpass123',
+                email='customer@test.com',
+                is_customer=True
+            ),
+            date_of_birth=timezone.now().date()
+        )
+        self.services = [
+            Service.objects.create(
+                company=self.company,
+                name=f'Service {i}',
+                description='Test Description',
+                price_hour=Decimal('50.00'),
+                field='Plumbing' if i % 2 else 'Painting'
+            )
+            for i in range(3)
+        ]
+        self.url = reverse('api:services')
+
+    def test_service_list_with_sparse_fields(self):
+        """Test the list returns only the requested fields, newest first"""
+        data = self.client.get(self.url, {'fields': 'id,name'}).json()
+        self.assertEqual(data['results'], [
+            {'id': self.services[2].id, 'name': 'Service 2'},
+            {'id': self.services[1].id, 'name': 'Service 1'},
+        ])
+        self.assertIsNone(data['previous'])
+        data = self.client.get(data['next']).json()
+        self.assertEqual([s['name'] for s in data['results']], ['Service 0'])
+        self.assertIn('fields=id%2Cname', data['previous'])
+
+    def test_bad_parameters(self):
+        """Test unknown fields, bad limits and bad cursors are JSON errors"""
+        for params in ({'fields': 'name,secret'}, {'limit': '0'}, {'limit': 'x'}, {'after': 'nope'}):
+            with self.subTest(params=params):
+                response = self.client.get(self.url, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+
+    def test_service_detail(self):
+        """Test a single service and a missing one"""
+        data = self.client.get(reverse('api:service_detail', args=[self.services[0].id])).json()
+        self.assertEqual((data['name'], data['price_hour'], data['company']), ('Service 0', '50.00', 'testcompany'))
+        response = self.client.get(reverse('api:service_detail', args=[999]))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {'error': 'Service not found.'})
+
+    def test_categories(self):
+        """Test the category overview and one category's services"""
+        categories = {c['field']: c for c in self.client.get(reverse('api:categories')).json()['results']}
+        self.assertEqual(categories['Plumbing']['count'], 1)
+        data = self.client.get(categories['Painting']['url'], {'fields': 'name'}).json()
+        self.assertEqual(data['results'], [{'name': 'Service 2'}, {'name': 'Service 0'}])
+
+    def test_unchanged_catalog_is_not_modified(self):
+        """Test revalidating an unchanged list costs a 304 and no queries"""
+        response = self.client.get(self.url)
+        self.assertEqual(response['Cache-Control'], 'public, no-cache')
+        with self.assertNumQueries(0):
+            revalidated = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+        revalidated = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(revalidated.status_code, 304)
+
+        # A different representation has a different validator
+        other = self.client.get(self.url, {'fields': 'id'}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(other.status_code, 200)
+
+    def test_service_change_invalidates_etag(self):
+        """Test editing a service changes the list's validator"""
+        etag = self.client.get(self.url)['ETag']
+        self.services[0].name = 'Renamed'
+        with on_commit_callbacks():
+            self.services[0].save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_requests_need_login(self):
+        """Test anonymous clients get a JSON 401"""
+        response = self.client.get(reverse('api:requests'))
+        self.assertEqual(response.status_code, 401)
+
+    def test_own_requests(self):
+        """Test customers see their requests and companies the ones they received"""
+        service_request = ServiceRequest.objects.create(
+            service=self.services[0],
+            customer=self.customer,
+            requested_date=timezone.now() + timezone.timedelta(days=1),
+            hours_needed=2
+        )
+        url = reverse('api:requests')
+        for user in (self.customer.user, self.company.user):
+            with self.subTest(user=user.username):
+                self.client.force_login(user)
+                response = self.client.get(url, {'fields': 'id,service_name,customer,total_cost'})
+                self.assertEqual(response.json()['results'], [{
+                    'id': service_request.id,
+                    'service_name': 'Service 0',
+                    'customer': 'testcustomer',
+                    'total_cost': '100.00',
+                }])
+                self.assertIn('private', response['Cache-Control'])
+
+    def test_request_change_invalidates_etag(self):
+        """Test a status change makes the requests list stale for both sides"""
+        service_request = ServiceRequest.objects.create(
+            service=self.services[0],
+            customer=self.customer,
+            requested_date=timezone.now() + timezone.timedelta(days=1)
+        )
+        self.client.force_login(self.company.user)
+        url = reverse('api:requests')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        service_request.status = 'ACCEPTED'
+        with on_commit_callbacks():
+            service_request.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class QueryPlanTests(TestCase):
+    """EXPLAIN QUERY PLAN of the hot queries, which should all be index lookups"""
+    FULL_SCAN = re.compile(r'\bSCAN (?:TABLE )?(\w+)$')
+
+    def setUp(self):
+        self.company = Company.objects.create(
+            user=User.objects.create_user(
+                username='testcompany',
+                password='testpass123',
+                email='company@test.com',
+                is_company=True
+            ),
+            field='Plumbing'
+        )
+        self.customer = Customer.objects.create(
+            user=User.objects.create_user(
+                username='testcustomer',
+                password='testpass123',
+                email='customer@test.com',
+                is_customer=True
+            ),
+            date_of_birth=timezone.now().date()
+        )
+        self.service = Service.objects.create(
+            company=self.company,
+            name='Test Service',
+            description='Test Description',
+            price_hour=Decimal('50.00'),
+            field='Plumbing'
+        )
+
+    def hot_queries(self):
+        """(name, queryset, whether the index must also provide the order)"""
+        customer, company = self.customer.user, self.company.user
+        return [
+            ('service listing', Service.objects.order_by(*Service.LISTING_ORDER)[:20], True),
+            ('category page', Service.objects.filter(field='Plumbing').order_by(*Service.LISTING_ORDER)[:20], True),
+            ('popular services', Service.get_most_requested(), True),
+            ('company services', Service.objects.filter(company=self.company), False),
+            ('customer requests', requests_for(customer).order_by(*REQUEST_ORDER)[:20], True),
+            ('customer history', requests_for(customer).order_by('-requested_date', '-id'), True),
+            ('company requests', requests_for(company).order_by(*REQUEST_ORDER)[:20], False),
+            ('company schedule', requests_for(company).order_by('-requested_date', '-id'), False),
+            ('service requests', ServiceRequest.objects.filter(service=self.service).order_by(*REQUEST_ORDER), True),
+            ('pending requests', ServiceRequest.objects.filter(
+                service=self.service, status='PENDING').order_by('requested_date'), True),
+            ('company pending', requests_for(company).filter(status='PENDING').order_by('requested_date'), False),
+            ('request review', Review.objects.filter(service_request_id=1), False),
+            ('customer reviews', Review.objects.filter(customer_id=customer.pk).order_by('-created_at', '-id'), True),
+            ('company reviews', Review.objects.filter(service__company_id=company.pk).order_by('-created_at', '-id'), False),
+        ]
+
+    def test_hot_queries_use_indexes(self):
+        """Test no hot query falls back to a full table scan or an unindexed sort"""
+        if connection.vendor != 'sqlite':
+            self.skipTest("Plans are checked against SQLite")
+        for name, queryset, ordered in self.hot_queries():
+            with self.subTest(query=name):
+                plan = queryset.explain()
+                scans = [line for line in plan.splitlines() if self.FULL_SCAN.search(line)]
+                self.assertEqual(scans, [], f"{name} scans a whole table:\n{plan}")
+                if ordered:
+                    self.assertNotIn('TEMP B-TREE', plan, f"{name} sorts without an index:\n{plan}")
+
+    def executed_plan(self, run):
+        """The plan of the last query ``run`` executes."""
+        with CaptureQueriesContext(connection) as captured:
+            run()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + captured.captured_queries[-1]['sql'])
+            return '\n'.join(row[-1] for row in cursor.fetchall())
+
+    def test_later_pages_seek(self):
+        """Test a page after a cursor seeks into the listing index rather than walking it"""
+        if connection.vendor != 'sqlite':
+            self.skipTest("Plans are checked against SQLite")
+        cursor = encode_cursor([self.service.date, self.service.id])
+        for name, queryset in [
+            ('service listing', Service.objects.all()),
+            ('category page', Service.objects.filter(field='Plumbing')),
+        ]:
+            for direction in ('after', 'before'):
+                with self.subTest(query=name, direction=direction):
+                    plan = self.executed_plan(
+                        lambda: paginate(queryset, Service.LISTING_ORDER, **{direction: cursor})
+                    )
+                    self.assertNotIn('SCAN', plan, f"{name} walks the index:\n{plan}")
+                    self.assertIn('date<' if direction == 'after' else 'date>', plan)
+                    self.assertNotIn('TEMP B-TREE', plan, f"{name} sorts without an index:\n{plan}")
+
+    def test_facets_use_index(self):
+        """Test the facets query numbers each field's prices in (field, price_hour) index order"""
+        if connection.vendor != 'sqlite':
+            self.skipTest("Plans are checked against SQLite")
+        plan = self.executed_plan(lambda: compute_facets(FIELDS))
+        self.assertIn('service_field_price_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan, f"the facets sort or group without an index:\n{plan}")
+
+    def test_profile_sections_use_indexes(self):
+        """Test the queries section_page actually runs, first and later pages, are index lookups"""
+        if connection.vendor != 'sqlite':
+            self.skipTest("Plans are checked against SQLite")
+        customer, company = self.customer.user, self.company.user
+        cursor = encode_cursor([timezone.now(), 1])
+        # (profile, section, whether the index must also provide the order);
+        # a company's sections reach its requests through its services, so sort
+        for user, section, ordered in [
+            (customer, 'history', True),
+            (customer, 'reviews', True),
+            (company, 'services', False),
+            (company, 'pending', False),
+            (company, 'history', False),
+            (company, 'reviews', False),
+        ]:
+            for after in (None, cursor):
+                with self.subTest(user=user.username, section=section, after=after):
+                    plan = self.executed_plan(lambda: section_page(user, user, section, after=after))
+                    scans = [line for line in plan.splitlines() if self.FULL_SCAN.search(line)]
+                    self.assertEqual(scans, [], f"{section} scans a whole table:\n{plan}")
+                    if ordered:
+                        self.assertNotIn('TEMP B-TREE', plan, f"{section} sorts without an index:\n{plan}")
+
+
+class ServiceSearchTests(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(
+            user=User.objects.create_user(
+                username='testcompany',
+                password='testpass123',
+                email='company@test.com',
+                is_company=True
+            ),
+            field='All in One'
+        )
+        self.leak = Service.objects.create(
+            company=self.company,
+            name='Leak Repair',
+            description='We fix dripping taps and burst pipes',
+            price_hour=Decimal('40.00'),
+            field='Plumbing'
+        )
+        self.boiler = Service.objects.create(
+            company=self.company,
+            name='Boiler Service',
+            description='Annual check, including any small leak',
+            price_hour=Decimal('90.00'),
+            field='Water Heaters'
+        )
+        self.garden = Service.objects.create(
+            company=self.company,
+            name='Lawn Mowing',
+            description='Weekly garden upkeep',
+            price_hour=Decimal('25.00'),
+            field='Gardening'
+        )
+
+    def test_name_matches_rank_first(self):
+        """Test a name match ranks above a description-only match"""
+        self.assertEqual(search_services('leak'), [self.leak, self.boiler])
+
+    def test_prefix_and_stemmed_terms(self):
+        """Test partial words and plurals still match"""
+        self.assertEqual(search_services('repairs'), [self.leak])
+        self.assertEqual(search_services('gard'), [self.garden])
+        self.assertEqual(search_services('leak*('), [self.leak, self.boiler])
+
+    def test_field_and_price_filters(self):
+        """Test search results can be narrowed by field and price"""
+        self.assertEqual(search_services('leak', field='Water Heaters'), [self.boiler])
+        self.assertEqual(search_services('leak', max_price=Decimal('50')), [self.leak])
+        self.assertEqual(search_services('leak', min_price=Decimal('50')), [self.boiler])
+
+    def test_index_follows_updates_and_deletes(self):
+        """Test the index is kept in sync with service changes"""
+        self.garden.name = 'Hedge Trimming'
+        self.garden.save()
+        self.assertEqual(search_services('hedge'), [self.garden])
+        self.assertEqual(search_services('lawn'), [])
+
+        self.leak.delete()
+        self.assertEqual(search_services('leak'), [self.boiler])
+
+    def test_rebuild_command(self):
+        """Test the rebuild command restores a wiped index"""
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('delete-all')")
+        self.assertEqual(search_services('leak'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(search_services('leak'), [self.leak, self.boiler])
+
+    def test_search_view(self):
+        """Test the search page renders ranked results"""
+        response = self.client.get(reverse('service_search'), {'q': 'leak', 'field': 'Plumbing'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['services'], [self.leak])
+        self.assertContains(response, 'Leak Repair')
+
+
+class RequestCountTests(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(
+            user=User.objects.create_user(
+                username='testcompany',
+                password='testpass123',
+                email='company@test.com',
+                is_company=True
+            ),
+            field='Plumbing'
+        )
+        self.customer = Customer.objects.create(
+            user=User.objects.create_user(
+                username='testcustomer',
+                password='testpass123',
+                email='customer@test.com',
+                is_customer=True
+            ),
+            date_of_birth=timezone.now().date()
+        )
+        self.service = Service.objects.create(
+            company=self.company,
+            name='Test Plumbing Service',
+            description='Test Description',
+            price_hour=Decimal('50.00'),
+            field='Plumbing'
+        )
+
+    def make_request(self, service=None):
+        return ServiceRequest.objects.create(
+            service=service or self.service,
+            customer=self.customer,
+            requested_date=timezone.now() + timezone.timedelta(days=1)
+        )
+
+    def test_counter_follows_creates_and_deletes(self):
+        """Test request_count is incremented and decremented in the database"""
+        first = self.make_request()
+        self.make_request()
+        self.service.refresh_from_db()
+        self.assertEqual(self.service.request_count, 2)
+
+        first.delete()
+        self.service.refresh_from_db()
+        self.assertEqual(self.service.request_count, 1)
+
+    def test_status_change_does_not_recount(self):
+        """Test saving an existing request leaves the counter alone"""
+        request = self.make_request()
+        request.status = 'ACCEPTED'
+        request.save()
+        self.service.refresh_from_db()
+        self.assertEqual(self.service.request_count, 1)
+
+    def test_reconcile_command_repairs_drift(self):
+        """Test the reconcile command fixes counts that drifted"""
+        self.make_request()
+        self.make_request()
+        Service.objects.filter(pk=self.service.pk).update(request_count=7)
+
+        out = StringIO()
+        call_command('reconcile_request_counts', stdout=out)
+        self.service.refresh_from_db()
+        self.assertEqual(self.service.request_count, 2)
+        self.assertIn('1 services', out.getvalue())
+
+    def test_home_page_reads_stored_counts(self):
+        """Test the popular list is one indexed read with company names joined in"""
+        for i in range(6):
+            service = Service.objects.create(
+                company=self.company,
+                name=f'Service {i}',
+                description='Test Description',
+                price_hour=Decimal('50.00'),
+                field='Plumbing'
+            )
+            for _ in range(i):
+                self.make_request(service)
+        get_facets()  # the navbar's facets are cached on their own
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('main:home'))
+        self.assertEqual(response.context['popular_services'][0].name, 'Service 5')
+        self.assertContains(response, '5 requests')
+
+
+class ImportCatalogTests(TestCase):
+    records = [
+        {'type': 'company', 'username': 'pipes', 'email': 'pipes@test.com', 'field': 'Plumbing'},
+        {'type': 'company', 'username': 'allround', 'email': 'all@test.com', 'field': 'All in One'},
+        {'type': 'customer', 'username': 'jane', 'email': 'jane@test.com', 'date_of_birth': '1990-05-01'},
+        {'type': 'service', 'company': 'pipes', 'name': 'Leak Repair', 'description': 'Taps', 'price_hour': '40'},
+        {'type': 'service', 'company': 'allround', 'name': 'Painting', 'price_hour': '30', 'field': 'Painting'},
+        {'type': 'service', 'company': 'pipes', 'name': 'Gardening', 'price_hour': '30', 'field': 'Gardening'},
+        {'type': 'request', 'company': 'pipes', 'service': 'Leak Repair', 'customer': 'jane',
+         'requested_date': '2024-03-01T10:00:00', 'hours_needed': 3, 'status': 'COMPLETED'},
+        {'type': 'request', 'company': 'pipes', 'service': 'Leak Repair', 'customer': 'nobody',
+         'requested_date': '2024-03-01T10:00:00'},
+    ]
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'catalog.jsonl')
+        with open(self.path, 'w') as f:
+            for record in self.records:
+                f.write(json.dumps(record) + '\n')
+            f.write('{not json\n')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def run_import(self, *args):
+        out, err = StringIO(), StringIO()
+        call_command('import_catalog', self.path, *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_import_creates_catalog(self):
+        """Test a file of mixed records is imported with its references resolved"""
+        out, err = self.run_import('--batch-size', '4')
+        self.assertIn('Imported 2 companies, 1 customers, 2 services, 1 requests; rejected 3 records', out)
+        self.assertIn('Batch 3:', out)
+        self.assertIn("cannot offer Gardening services", err)
+        self.assertIn("unknown customer 'nobody'", err)
+        self.assertIn("invalid JSON", err)
+
+        service = Service.objects.get(name='Leak Repair')
+        self.assertEqual(service.request_count, 1)
+        request = ServiceRequest.objects.get()
+        self.assertEqual(request.total_cost, Decimal('120.00'))
+        self.assertEqual(request.status, 'COMPLETED')
+        self.assertTrue(User.objects.get(username='jane').is_customer)
+        self.assertFalse(User.objects.get(username='pipes').has_usable_password())
+
+    def test_run_totals_count_rejections(self):
+        """Test the run totals count rejected records without keeping them"""
+        reported = []
+        totals = run_import(read_rows(self.path, 'jsonl'), CatalogImporter(), batch_size=4,
+                            report=lambda *batch: reported.append(len(batch[3].errors)))
+        self.assertEqual(totals.error_count, 3)
+        self.assertEqual(sum(reported), 3)
+        self.assertEqual(totals.errors, [])
+
+    def test_imported_requests_reach_booking_index(self):
+        """Test accepted requests imported for an existing company show up as conflicts"""
+        cache.clear()
+        self.run_import()
+        company_id = Company.objects.get(user__username='pipes').pk
+        start = timezone.now().replace(microsecond=0) + timezone.timedelta(days=2)
+        self.assertFalse(has_conflict(company_id, start, 1))
+        CatalogImporter().import_batch([(1, {
+            'type': 'request', 'company': 'pipes', 'service': 'Leak Repair', 'customer': 'jane',
+            'requested_date': start.isoformat(), 'hours_needed': 2, 'status': 'ACCEPTED',
+        })])
+        self.assertTrue(has_conflict(company_id, start, 1))
+
+    def test_imported_requests_invalidate_request_lists(self):
+        """Test importing requests makes both sides' request lists stale"""
+        cache.clear()
+        self.run_import()
+        url = reverse('api:requests')
+        etags = {}
+        for username in ('pipes', 'jane'):
+            self.client.force_login(User.objects.get(username=username))
+            etags[username] = self.client.get(url)['ETag']
+        CatalogImporter().import_batch([(1, {
+            'type': 'request', 'company': 'pipes', 'service': 'Leak Repair', 'customer': 'jane',
+            'requested_date': '2024-04-01T10:00:00',
+        })])
+        for username, etag in etags.items():
+            with self.subTest(username=username):
+                self.client.force_login(User.objects.get(username=username))
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_dry_run_writes_nothing(self):
+        """Test a dry run validates the file and rolls every batch back"""
+        out, _ = self.run_import('--dry-run')
+        self.assertIn('Validated 2 companies, 1 customers, 2 services, 1 requests', out)
+        self.assertFalse(User.objects.exists())
+        self.assertFalse(os.path.exists(self.path + '.checkpoint'))
+
+    def test_dry_run_across_batches(self):
+        """Test a dry run in small batches resolves records validated by earlier batches"""
+        out, err = self.run_import('--dry-run', '--batch-size', '2')
+        self.assertIn('Validated 2 companies, 1 customers, 2 services, 1 requests; rejected 3 records', out)
+        self.assertNotIn("unknown company 'pipes'", err)
+        self.assertFalse(User.objects.exists())
+        self.assertFalse(Service.objects.exists())
+
+    def test_rerun_resumes_from_checkpoint(self):
+        """Test a second run skips records committed by the first"""
+        self.run_import()
+        out, _ = self.run_import()
+        self.assertIn('Resuming after record 9', out)
+        self.assertEqual(User.objects.count(), 3)
+
+        out, err = self.run_import('--restart')
+        self.assertIn("username 'pipes' already exists", err)
+        self.assertIn("already has a service named 'Leak Repair'", err)
+        self.assertEqual(Service.objects.count(), 2)
+
+    def test_csv_import(self):
+        """Test CSV files with a header row are accepted"""
+        path = os.path.join(self.tmpdir.name, 'catalog.csv')
+        with open(path, 'w') as f:
+            f.write('type,username,email,field,company,name,price_hour\n')
+            f.write('company,pipes,pipes@test.com,Plumbing,,,\n')
+            f.write('service,,,,pipes,Leak Repair,40.5\n')
+        call_command('import_catalog', path, stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(Service.objects.get().price_hour, Decimal('40.50'))
+
+
+class ExportServiceRequestsTests(TestCase):
+    def setUp(self):
+        self.company_user = User.objects.create_user(
+            username='testcompany',
+            password='testpass123',
+            email='company@test.com',
+            is_company=True
+        )
+        self.company = Company.objects.create(user=self.company_user, field='Plumbing')
+        self.customer = Customer.objects.create(
+            user=User.objects.create_user(
+                username='testcustomer',
+                password='testpass123',
+                email='customer@test.com',
+                is_customer=True
+            ),
+            date_of_birth=timezone.now().date()
+        )
+        self.service = Service.objects.create(
+            company=self.company,
+            name='Test Plumbing Service',
+            description='Test Description',
+            price_hour=Decimal('50.00'),
+            field='Plumbing'
+        )
+        self.day = timezone.now() + timezone.timedelta(days=5)
+        for offset, status in ((0, 'PENDING'), (1, 'COMPLETED'), (2, 'COMPLETED')):
+            ServiceRequest.objects.create(
+                service=self.service,
+                customer=self.customer,
+                requested_date=self.day + timezone.timedelta(days=offset),
+                hours_needed=2,
+                status=status
+            )
+        self.url = reverse('export_service_requests')
+
+    def read(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_company_csv_export(self):
+        """Test a company streams its received requests as CSV"""
+        self.client.force_login(self.company_user)
+        response = self.client.get(self.url)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = self.read(response).splitlines()
+        self.assertEqual(lines[0].split(',')[:5], ['id', 'service', 'company', 'customer', 'status'])
+        self.assertEqual(len(lines), 4)
+        self.assertIn('testcustomer', lines[1])
+        self.assertIn('100.00', lines[1])
+
+    def test_customer_jsonl_export_with_filters(self):
+        """Test a customer can filter their export by status and date range"""
+        self.client.force_login(self.customer.user)
+        start = (self.day + timezone.timedelta(days=1)).date()
+        response = self.client.get(self.url, {
+            'format': 'jsonl', 'status': 'COMPLETED', 'start': start.isoformat(), 'end': start.isoformat()
+        })
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['status'], 'COMPLETED')
+        self.assertEqual(rows[0]['company'], 'testcompany')
+
+    def test_other_users_requests_are_not_exported(self):
+        """Test a company only exports requests for its own services"""
+        other = User.objects.create_user(
+            username='othercompany',
+            password='testpass123',
+            email='other@test.com',
+            is_company=True
+        )
+        Company.objects.create(user=other, field='Plumbing')
+        self.client.force_login(other)
+        lines = self.read(self.client.get(self.url)).splitlines()
+        self.assertEqual(len(lines), 1)
+
+    def test_invalid_filters(self):
+        """Test bad filter values are rejected"""
+        self.client.force_login(self.company_user)
+        response = self.client.get(self.url, {'start': '2024-02-01', 'end': '2024-01-01'})
+        self.assertEqual(response.status_code, 400)
+
+
+class BulkStatusUpdateTests(TestCase):
+    def setUp(self):
+        self.company_user = User.objects.create_user(
+            username='testcompany',
+            password='testpass123',
+            email='company@test.com',
+            is_company=True
+        )
+        self.company = Company.objects.create(user=self.company_user, field='Plumbing')
+        self.customer = Customer.objects.create(
+            user=User.objects.create_user(
+                username='testcustomer',
+                password='testpass123',
+                email='customer@test.com',
+                is_customer=True
+            ),
+            date_of_birth=timezone.now().date()
+        )
+        self.service = Service.objects.create(
+            company=self.company,
+            name='Test Plumbing Service',
+            description='Test Description',
+            price_hour=Decimal('50.00'),
+            field='Plumbing'
+        )
+        self.requests = {
+            status: ServiceRequest.objects.create(
+                service=self.service,
+                customer=self.customer,
+                requested_date=timezone.now() + timezone.timedelta(days=5),
+                status=status
+            )
+            for status in ('PENDING', 'ACCEPTED', 'COMPLETED')
+        }
+        self.url = reverse('bulk_update_service_requests')
+
+    def test_outcome_per_request(self):
+        """Test allowed transitions are applied with one UPDATE and the rest reported"""
+        other_company = Company.objects.create(
+            user=User.objects.create_user(
+                username='othercompany',
+                password='testpass123',
+                email='other@test.com',
+                is_company=True
+            ),
+            field='Plumbing'
+        )
+        other_request = ServiceRequest.objects.create(
+            service=Service.objects.create(
+                company=other_company, name='Other', description='Other', price_hour=Decimal('10.00'),
+                field='Plumbing'
+            ),
+            customer=self.customer,
+            requested_date=timezone.now(),
+        )
+        pending, accepted, completed = self.requests.values()
+        self.client.force_login(self.company_user)
+        # Session, user, one SELECT and one UPDATE inside a savepoint
+        with self.assertNumQueries(6):
+            response = self.client.post(self.url, {
+                'status': 'CANCELLED',
+                'request_id': [pending.pk, accepted.pk, completed.pk, other_request.pk, 0],
+            })
+        self.assertEqual(response.json(), {'status': 'CANCELLED', 'results': [
+            {'id': pending.pk, 'outcome': 'updated'},
+            {'id': accepted.pk, 'outcome': 'invalid_transition'},
+            {'id': completed.pk, 'outcome': 'invalid_transition'},
+            {'id': other_request.pk, 'outcome': 'not_found'},
+            {'id': 0, 'outcome': 'not_found'},
+        ]})
+        statuses = dict(ServiceRequest.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses[pending.pk], 'CANCELLED')
+        self.assertEqual(statuses[accepted.pk], 'ACCEPTED')
+        self.assertEqual(statuses[other_request.pk], 'PENDING')
+
+        response = self.client.post(self.url, {'status': 'COMPLETED', 'request_id': [accepted.pk]})
+        self.assertEqual(response.json()['results'], [{'id': accepted.pk, 'outcome': 'updated'}])
+
+    def test_update_invalidates_request_etags(self):
+        """Test bulk updates move the conditional request markers like saves do"""
+        self.client.force_login(self.customer.user)
+        etag = self.client.get(reverse('api:requests'))['ETag']
+        self.client.force_login(self.company_user)
+        self.client.post(self.url, {'status': 'ACCEPTED', 'request_id': [self.requests['PENDING'].pk]})
+        self.client.force_login(self.customer.user)
+        response = self.client.get(reverse('api:requests'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_bad_requests(self):
+        """Test customers, unknown statuses and bad ids are refused"""
+        self.client.force_login(self.customer.user)
+        response = self.client.post(self.url, {'status': 'ACCEPTED', 'request_id': [self.requests['PENDING'].pk]})
+        self.assertEqual(response.status_code, 403)
+
+        self.client.force_login(self.company_user)
+        for data in [
+            {'status': 'PENDING', 'request_id': [self.requests['PENDING'].pk]},
+            {'status': 'ACCEPTED', 'request_id': ['x']},
+            {'status': 'ACCEPTED'},
+        ]:
+            with self.subTest(data=data):
+                self.assertEqual(self.client.post(self.url, data).status_code, 400)
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+        self.assertEqual(ServiceRequest.objects.filter(status='PENDING').count(), 1)
+
+
+class AvailabilityTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.company = Company.objects.create(
+            user=User.objects.create_user(
+                username='testcompany',
+                password='testpass123',
+                email='company@test.com',
+                is_company=True
+            ),
+            field='Plumbing'
+        )
+        self.customer = Customer.objects.create(
+            user=User.objects.create_user(
+                username='testcustomer',
+                password='testpass123',
+                email='customer@test.com',
+                is_customer=True
+            ),
+            date_of_birth=timezone.now().date()
+        )
+        self.service = Service.objects.create(
+            company=self.company,
+            name='Test Plumbing Service',
+            description='Test Description',
+            price_hour=Decimal('50.00'),
+            field='Plumbing'
+        )
+        self.day = (timezone.now() + timezone.timedelta(days=3)).replace(hour=9, minute=0, second=0, microsecond=0)
+        self.booking = ServiceRequest.objects.create(
+            service=self.service,
+            customer=self.customer,
+            requested_date=self.day,
+            hours_needed=3,
+            status='ACCEPTED'
+        )
+
+    def form(self, start, hours=1):
+        return RequestServiceForm({
+            'address': '1 Test Street',
+            'hours_needed': hours,
+            'requested_date': start.strftime('%Y-%m-%d %H:%M'),
+        }, service=self.service)
+
+    def test_booking_index(self):
+        """Test overlap checks and gaps, with bookings that overlap each other"""
+        index = BookingIndex([(10, 50), (20, 30), (60, 70)], horizon=100)
+        self.assertTrue(index.overlaps(40, 45))
+        self.assertTrue(index.overlaps(0, 11))
+        self.assertFalse(index.overlaps(50, 60))
+        self.assertFalse(index.overlaps(70, 80))
+        self.assertEqual(index.free(0, 100), [(0, 10), (50, 60), (70, 100)])
+        self.assertEqual(index.free(25, 65), [(50, 60)])
+
+    def test_overlapping_requests_are_refused(self):
+        """Test requests overlapping an accepted job fail validation, adjacent ones pass"""
+        hour = timezone.timedelta(hours=1)
+        self.assertFalse(self.form(self.day + hour).is_valid())
+        self.assertFalse(self.form(self.day - hour, hours=2).is_valid())
+        self.assertTrue(self.form(self.day + 3 * hour).is_valid())
+        self.assertTrue(self.form(self.day - hour).is_valid())
+        # Without a service there's nothing to check against
+        self.assertTrue(RequestServiceForm({
+            'address': '1 Test Street', 'hours_needed': 1, 'requested_date': self.day.strftime('%Y-%m-%d %H:%M')
+        }).is_valid())
+
+        self.client.force_login(self.customer.user)
+        response = self.client.post(reverse('request_service', args=[self.service.id]), {
+            'address': '1 Test Street', 'hours_needed': 1, 'requested_date': self.day.strftime('%Y-%m-%d %H:%M')
+        })
+        self.assertContains(response, 'already has a job booked')
+        self.assertEqual(ServiceRequest.objects.count(), 1)
+
+    def test_index_follows_request_changes(self):
+        """Test accepting, cancelling and bulk updates change what conflicts"""
+        self.assertTrue(has_conflict(self.company.pk, self.day, 1))
+        with self.assertNumQueries(0):
+            has_conflict(self.company.pk, self.day, 1)
+
+        self.booking.status = 'CANCELLED'
+        self.booking.save()
+        # The index only moves on once the change is committed
+        self.assertTrue(has_conflict(self.company.pk, self.day, 1))
+        with on_commit_callbacks():
+            self.booking.save()
+        self.assertFalse(has_conflict(self.company.pk, self.day, 1))
+
+        pending = ServiceRequest.objects.create(
+            service=self.service,
+            customer=self.customer,
+            requested_date=self.day + timezone.timedelta(days=1),
+            hours_needed=2
+        )
+        self.assertFalse(has_conflict(self.company.pk, pending.requested_date, 1))
+        self.client.force_login(self.company.user)
+        self.client.post(reverse('bulk_update_service_requests'), {'status': 'ACCEPTED', 'request_id': [pending.pk]})
+        self.assertTrue(has_conflict(self.company.pk, pending.requested_date, 1))
+
+    def test_free_slots(self):
+        """Test the free slot endpoint lists the gaps around accepted jobs"""
+        slots = free_slots(self.company.pk)
+        self.assertEqual(len(slots), 2)
+        self.assertEqual(slots[0][1], self.day)
+        self.assertEqual(slots[1][0], self.day + timezone.timedelta(hours=3))
+
+        url = reverse('service_availability', args=[self.service.id])
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'hours': 24})
+        self.assertEqual(len(response.json()['free']), 2)
+        self.assertEqual(self.client.get(url, {'hours': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'hours': 0}).status_code, 400)
+
+
+class AvailableCompaniesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.customer = Customer.objects.create(
+            user=User.objects.create_user(
+                username='testcustomer',
+                password='testpass123',
+                email='customer@test.com',
+                is_customer=True
+            ),
+            date_of_birth=timezone.now().date()
+        )
+        self.companies = {}
+        for username, field, rating_sum, rating_count in [
+            ('plumber', 'Plumbing', 8, 2),
+            ('busyplumber', 'Plumbing', 10, 2),
+            ('allrounder', 'All in One', 8, 2),
+            ('painter', 'Painting', 10, 2),
+        ]:
+            self.companies[username] = Company.objects.create(
+                user=User.objects.create_user(
+                    username=username,
+                    password='testpass123',
+                    email=f'{username}@test.com',
+                    is_company=True
+                ),
+                field=field,
+                rating_sum=rating_sum,
+                rating_count=rating_count
+            )
+        self.day = (timezone.now() + timezone.timedelta(days=3)).replace(hour=9, minute=0, second=0, microsecond=0)
+        self.book('busyplumber', self.day - timezone.timedelta(days=1), 8)
+
+    def book(self, username, start, hours):
+        service = Service.objects.create(
+            company=self.companies[username],
+            name=f'{username} service',
+            description='Test Description',
+            price_hour=Decimal('20.00'),
+            field=self.companies[username].field
+        )
+        with on_commit_callbacks():
+            return ServiceRequest.objects.create(
+                service=service,
+                customer=self.customer,
+                requested_date=start,
+                hours_needed=hours,
+                status='ACCEPTED'
+            )
+
+    def test_ranked_by_rating_then_workload(self):
+        """Test field and All in One companies come back best rated, then least booked, first"""
+        names = [c.user.username for c in available_companies('Plumbing', self.day, 2)]
+        self.assertEqual(names, ['busyplumber', 'allrounder', 'plumber'])
+        self.book('allrounder', self.day + timezone.timedelta(days=2), 3)
+        names = [c.user.username for c in available_companies('Plumbing', self.day, 2)]
+        self.assertEqual(names, ['busyplumber', 'plumber', 'allrounder'])
+        self.assertEqual([c.user.username for c in available_companies('All in One', self.day, 2)], ['allrounder'])
+
+    def test_busy_companies_are_left_out(self):
+        """Test a company with an accepted job in the slot is not offered"""
+        self.book('busyplumber', self.day + timezone.timedelta(hours=1), 2)
+        names = [c.user.username for c in available_companies('Plumbing', self.day, 2)]
+        self.assertEqual(names, ['allrounder', 'plumber'])
+        names = [c.user.username for c in available_companies('Plumbing', self.day + timezone.timedelta(hours=3), 2)]
+        self.assertIn('busyplumber', names)
+
+    def test_timelines_are_loaded_together(self):
+        """Test every candidate's timeline comes from one query, then from the cache"""
+        with self.assertNumQueries(2):
+            available_companies('Plumbing', self.day, 2)
+        with self.assertNumQueries(1):
+            available_companies('Plumbing', self.day, 2)
+
+    def test_search_page(self):
+        """Test the page lists free companies and validates the slot"""
+        url = reverse('available_companies')
+        response = self.client.get(url, {
+            'field': 'Plumbing', 'start': self.day.strftime('%Y-%m-%d %H:%M'), 'hours': 2
+        })
+        self.assertEqual([c.user.username for c in response.context['companies']],
+                         ['busyplumber', 'allrounder', 'plumber'])
+        self.assertContains(response, '8h booked')
+        response = self.client.get(url, {
+            'field': 'Plumbing', 'start': (self.day - timezone.timedelta(days=10)).strftime('%Y-%m-%d %H:%M'),
+            'hours': 2
+        })
+        self.assertIsNone(response.context['companies'])
+        self.assertContains(response, 'cannot be in the past')
@@ -0,0 +1,48 @@
+from django.db import transaction
+
+from .availability import invalidate_availability
+from .conditional import requests_marker, touch
+from .models import ServiceRequest
+
+# Status -> the statuses a company may move a request on to
+TRANSITIONS = {
+    'PENDING': ('ACCEPTED', 'CANCELLED'),
+    'ACCEPTED': ('COMPLETED',),
+}
+TARGETS = {target for targets in TRANSITIONS.values() for target in targets}
+
+
+def bulk_transition(company_id, request_ids, status):
+    """
+    Move the requests in ``request_ids`` that company ``company_id`` received
+    to ``status``, all with one UPDATE. Returns ``{id: outcome}`` where
+    outcome is 'updated', 'not_found' (missing or another company's) or
+    'invalid_transition'.
+    """
+    sources = [source for source, targets in TRANSITIONS.items() if status in targets]
+    with transaction.atomic():
+        rows = ServiceRequest.objects.select_for_update().filter(
+            pk__in=request_ids, service__company_id=company_id
+        ).values_list('pk', 'status', 'customer_id')
+        current = {pk: (current_status, customer_id) for pk, current_status, customer_id in rows}
+        movable = {pk for pk, (current_status, _) in current.items() if current_status in sources}
+        if movable:
+            # The status guard repeats the check above in case a row moved on meanwhile
+            ServiceRequest.objects.filter(pk__in=movable, status__in=sources).update(status=status)
+
+    # update() sends no post_save, so do what its receivers would here
+    if movable:
+        invalidate_availability(company_id)
+        touch(requests_marker(company_id))
+        for customer_id in {current[pk][1] for pk in movable}:
+            touch(requests_marker(customer_id))
+
+    outcomes = {}
+    for pk in request_ids:
+        if pk not in current:
+            outcomes[pk] = 'not_found'
+        elif pk in movable:
+            outcomes[pk] = 'updated'
+        else:
+            outcomes[pk] = 'invalid_transition'
+    return outcomes
@@ -1,14 +1,23 @@
-from django.urls import path
+from django.urls import path, register_converter
 from . import views as v
+from .converters import FieldConverter
+
+register_converter(FieldConverter, 'field')
 
 urlpatterns = [  
     path('', v.service_list, name='services_list'),
     path('<int:id>/', v.index, name='service_detail'),
     path('create/', v.create, name='create_service'),
-    path('<str:field>/', v.service_field, name='service_field'),
+    path('search/', v.search, name='service_search'),
+    path('facets/', v.service_facets, name='service_facets'),
+    path('available/', v.available, name='available_companies'),
+    path('<field:field>/', v.service_field, name='service_field'),
     path('<int:id>/request_service/', v.request_service, name='request_service'),
+    path('<int:id>/availability/', v.service_availability, name='service_availability'),
     # Service request management
     path('requests/', v.service_requests_list, name='service_requests_list'),
+    path('requests/export/', v.export_service_requests, name='export_service_requests'),
+    path('requests/bulk-update/', v.bulk_update_service_requests, name='bulk_update_service_requests'),
     path('requests/<int:request_id>/', v.service_request_detail, name='service_request_detail'),
     path('requests/<int:request_id>/update/', v.update_service_request, name='update_service_request'),
     path('requests/<int:request_id>/cancel/', v.cancel_service_request, name='cancel_service_request'),
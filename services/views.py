@@ -1,22 +1,55 @@
+import csv
+import json
+from datetime import datetime, time, timedelta
+
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponseRedirect
+from django.http import HttpResponseBadRequest, HttpResponseRedirect, Http404, JsonResponse, StreamingHttpResponse
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.core.serializers.json import DjangoJSONEncoder
+from django.urls import reverse
+from django.utils import timezone
+from django.views.decorators.http import require_GET, require_POST
 
 from users.models import Company, Customer, User
-from utils import calculate_age  
+from utils import async_view, calculate_age
 
 from .models import Service, ServiceRequest, Review
-from .forms import CreateNewService, RequestServiceForm, ReviewForm
+from .availability import available_companies, free_slots
+from .cache import get_field_page
+from .conditional import catalog_page_etag, conditional_page
+from .facets import get_facets
+from .forms import CompanyAvailabilityForm, CreateNewService, RequestExportForm, RequestServiceForm, ReviewForm, ServiceSearchForm
+from .pagination import InvalidCursor, paginate
+from .search import search_services
+from .transitions import TARGETS, bulk_transition
 
 
+@conditional_page(catalog_page_etag)
+@async_view
 def service_list(request):
-    services = Service.objects.all().order_by("-date")
-    print(f"Number of services found: {services.count()}")  # DEBUG line
-    return render(request, 'services/list.html', {'services': services})
+    # company and its user come in through the same join, so each page is one query
+    services = Service.objects.select_related('company__user')
+    try:
+        page = paginate(
+            services, Service.LISTING_ORDER,
+            after=request.GET.get('after'), before=request.GET.get('before')
+        )
+    except InvalidCursor:
+        raise Http404("Invalid page cursor")
+    return render(request, 'services/list.html', {'services': page, 'page': page})
+
 
+def service_facets(request):
+    return JsonResponse({'fields': [
+        dict(facet, url=reverse('service_field', args=[facet['slug']])) for facet in get_facets()
+    ]})
 
+
+@conditional_page(catalog_page_etag)
+@async_view
 def index(request, id):
-    service = Service.objects.get(id=id)
+    service = Service.objects.select_related('company__user').get(id=id)
     return render(request, 'services/single_service.html', {'service': service})
 
 
@@ -44,12 +77,39 @@ def create(request):
     return render(request, 'services/create.html', {'form': form})
 
 
+@conditional_page(catalog_page_etag)
+@async_view
 def service_field(request, field):
-    # Convert URL-friendly format to the actual field name
-    field = field.replace('-', ' ').title()
-    services = Service.objects.filter(field=field)
-    
-    return render(request, 'services/field.html', {'services': services, 'field': field})
+    # FieldConverter has already turned the slug into the field name
+    try:
+        page = get_field_page(field, after=request.GET.get('after'), before=request.GET.get('before'))
+    except InvalidCursor:
+        raise Http404("Invalid page cursor")
+    return render(request, 'services/field.html', {'services': page, 'page': page, 'field': field})
+
+
+def search(request):
+    form = ServiceSearchForm(request.GET or None)
+    results = None
+    if form.is_valid():
+        results = search_services(
+            form.cleaned_data['q'],
+            field=form.cleaned_data['field'] or None,
+            min_price=form.cleaned_data['min_price'],
+            max_price=form.cleaned_data['max_price'],
+        )
+    return render(request, 'services/search.html', {'form': form, 'services': results})
+
+
+def available(request):
+    # Companies free for a job in a field at a given time
+    form = CompanyAvailabilityForm(request.GET or None)
+    companies = None
+    if form.is_valid():
+        companies = available_companies(
+            form.cleaned_data['field'], form.cleaned_data['start'], form.cleaned_data['hours']
+        )
+    return render(request, 'services/available.html', {'form': form, 'companies': companies})
 
 
 def request_service(request, id):
@@ -58,7 +118,7 @@ def request_service(request, id):
         
     service = Service.objects.get(id=id)
     if request.method == 'POST':
-        form = RequestServiceForm(request.POST)
+        form = RequestServiceForm(request.POST, service=service)
         if form.is_valid():
             service_request = ServiceRequest(
                 service=service,
@@ -75,23 +135,108 @@ def request_service(request, id):
         form = RequestServiceForm()
     return render(request, 'services/request_service.html', {'form': form, 'service': service})
 
+@require_GET
+def service_availability(request, id):
+    # Free stretches of the booking window, for picking a time before requesting
+    service = get_object_or_404(Service, id=id)
+    try:
+        min_hours = int(request.GET.get('hours', 1))
+    except ValueError:
+        return JsonResponse({'error': "hours must be a number"}, status=400)
+    if not 1 <= min_hours <= 24:
+        return JsonResponse({'error': "hours must be between 1 and 24"}, status=400)
+    return JsonResponse({
+        'service': service.id,
+        'hours': min_hours,
+        'free': [{'start': start, 'end': end} for start, end in free_slots(service.company_id, min_hours)],
+    })
+
+def requests_for(user):
+    """Service requests a customer made, or a company received."""
+    # Customer and Company share the user's primary key, so no profile lookup is needed
+    if user.is_customer:
+        return ServiceRequest.objects.filter(customer_id=user.pk)
+    return ServiceRequest.objects.filter(service__company_id=user.pk)
+
+
 @login_required
 def service_requests_list(request):
-    if request.user.is_customer:
-        # For customers, show their own requests
-        requests = ServiceRequest.objects.filter(
-            customer=request.user.customer
-        ).select_related('service', 'service__company', 'customer', 'customer__user'
-        ).order_by('-created_at')  # Added ordering here
-    else:
-        # For companies, show requests for their services
-        requests = ServiceRequest.objects.filter(
-            service__company=request.user.company
-        ).select_related('service', 'service__company', 'customer', 'customer__user'
-        ).order_by('-created_at')  # Added ordering here
-    
+    # Customers see their own requests, companies the requests for their services
+    # The review comes in through the same join, so the list is one query however long it is
+    requests = requests_for(request.user).select_related(
+        'service', 'service__company', 'customer', 'customer__user', 'review'
+    ).order_by('-created_at', '-id')
+
     return render(request, 'services/requests_list.html', {'requests': requests})
 
+
+class Echo:
+    """File-like object that hands back what is written, for streaming csv.writer output."""
+    def write(self, value):
+        return value
+
+
+EXPORT_COLUMNS = (
+    ('id', 'id'),
+    ('service', 'service__name'),
+    ('company', 'service__company__user__username'),
+    ('customer', 'customer__user__username'),
+    ('status', 'status'),
+    ('requested_date', 'requested_date'),
+    ('hours_needed', 'hours_needed'),
+    ('total_cost', 'total_cost'),
+    ('address', 'address'),
+    ('notes', 'notes'),
+    ('created_at', 'created_at'),
+)
+
+
+@login_required
+def export_service_requests(request):
+    if not (request.user.is_customer or request.user.is_company):
+        return redirect('services_list')
+
+    form = RequestExportForm(request.GET)
+    if not form.is_valid():
+        return HttpResponseBadRequest(form.errors.as_text())
+
+    requests = requests_for(request.user)
+    tz = timezone.get_current_timezone()
+    # Whole-day bounds as datetimes, so the filter can use the requested_date index
+    if form.cleaned_data['start']:
+        start = timezone.make_aware(datetime.combine(form.cleaned_data['start'], time.min), tz)
+        requests = requests.filter(requested_date__gte=start)
+    if form.cleaned_data['end']:
+        end = timezone.make_aware(datetime.combine(form.cleaned_data['end'] + timedelta(days=1), time.min), tz)
+        requests = requests.filter(requested_date__lt=end)
+    if form.cleaned_data['status']:
+        requests = requests.filter(status=form.cleaned_data['status'])
+
+    # Plain tuples streamed in chunks keep memory flat however long the history is
+    header = [name for name, _ in EXPORT_COLUMNS]
+    rows = requests.order_by('created_at', 'id').values_list(
+        *[path for _, path in EXPORT_COLUMNS]
+    ).iterator(chunk_size=2000)
+
+    if form.cleaned_data['format'] == 'jsonl':
+        content = (json.dumps(dict(zip(header, row)), cls=DjangoJSONEncoder) + '\n' for row in rows)
+        content_type, extension = 'application/x-ndjson', 'jsonl'
+    else:
+        writer = csv.writer(Echo())
+        content = (writer.writerow(row) for row in _with_header(header, rows))
+        content_type, extension = 'text/csv', 'csv'
+
+    response = StreamingHttpResponse(content, content_type=content_type)
+    filename = f"service-requests-{timezone.localdate().isoformat()}.{extension}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def _with_header(header, rows):
+    yield header
+    yield from rows
+
+
 @login_required
 def service_request_detail(request, request_id):
     service_request = get_object_or_404(ServiceRequest, id=request_id)
@@ -136,6 +281,30 @@ def update_service_request(request, request_id):
             service_request.save()
     return redirect('service_request_detail', request_id=request_id)
 
+@login_required
+@require_POST
+def bulk_update_service_requests(request):
+    # Companies move many of the requests they received on at once
+    if not request.user.is_company:
+        return JsonResponse({'error': "Only companies can update request statuses."}, status=403)
+    status = request.POST.get('status')
+    if status not in TARGETS:
+        return JsonResponse({'error': f"status must be one of {', '.join(sorted(TARGETS))}"}, status=400)
+    try:
+        request_ids = list(dict.fromkeys(int(pk) for pk in request.POST.getlist('request_id')))
+    except ValueError:
+        return JsonResponse({'error': "request_id must be a number"}, status=400)
+    if not 1 <= len(request_ids) <= settings.BULK_UPDATE_MAX_REQUESTS:
+        return JsonResponse(
+            {'error': f"Send between 1 and {settings.BULK_UPDATE_MAX_REQUESTS} request_id values"}, status=400
+        )
+
+    outcomes = bulk_transition(request.user.pk, request_ids, status)
+    return JsonResponse({
+        'status': status,
+        'results': [{'id': pk, 'outcome': outcome} for pk, outcome in outcomes.items()],
+    })
+
 @login_required
 def cancel_service_request(request, request_id):
     service_request = get_object_or_404(ServiceRequest, id=request_id)
@@ -3,11 +3,28 @@ from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
-class EmailBackend(ModelBackend):
+
+class RoleModelBackend(ModelBackend):
+    """ModelBackend that loads the user's company or customer profile with the user."""
+
+    def get_user(self, user_id):
+        try:
+            user = User._default_manager.select_related('company', 'customer').get(pk=user_id)
+        except User.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
+
+
+class EmailBackend(RoleModelBackend):
     def authenticate(self, request, email=None, password=None, **kwargs):
+        if email is None or password is None:
+            return None
         try:
             user = User.objects.get(email=email)
-            if user.check_password(password):
-                return user
         except User.DoesNotExist:
-            return None
\ No newline at end of file
+            # Hash anyway so response times don't reveal which emails exist
+            User().set_password(password)
+            return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
@@ -2,9 +2,10 @@ from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.db import transaction
 from django.core.exceptions import ValidationError
+from django.core.validators import FileExtensionValidator
 
 from datetime import date
-from .models import User, Company, Customer
+from .models import User, Company, Customer, validate_image_format, validate_image_size
 
 
 class DateInput(forms.DateInput):
@@ -83,13 +84,32 @@ class CustomerSignUpForm(UserCreationForm):
 
 class CompanySignUpForm(UserCreationForm):
     field = forms.ChoiceField(choices=Company.FIELD_CHOICES)
-    image = forms.ImageField(required=False)
+    # A FileField with header-only checks; ImageField would decode the whole upload
+    image = forms.FileField(
+        required=False,
+        widget=forms.ClearableFileInput(attrs={'accept': 'image/png,image/jpeg'}),
+        validators=[
+            FileExtensionValidator(allowed_extensions=['jpg', 'png', 'jpeg']),
+            validate_image_size,
+            validate_image_format
+        ]
+    )
     description = forms.CharField(widget=forms.Textarea, max_length=500, required=False)
 
     class Meta(UserCreationForm.Meta):
         model = User
         fields = ('username', 'email', 'password1', 'password2')
 
+    def __init__(self, *args, upload_errors=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Uploads that ImageUploadHandler dropped while they streamed in
+        self.upload_errors = upload_errors or {}
+
+    def clean_image(self):
+        if 'image' in self.upload_errors:
+            raise ValidationError(self.upload_errors['image'])
+        return self.cleaned_data.get('image')
+
     def save(self):
         user = super().save(commit=False)
         user.is_company = True
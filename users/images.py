@@ -0,0 +1,112 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps, features
+
+# Widths generated for every company image; the profile shows it at up to
+# 300px, so "large" covers high density screens
+VARIANT_WIDTHS = {'thumb': 150, 'medium': 300, 'large': 600}
+FORMATS = {'webp': 'WEBP', 'jpg': 'JPEG'}
+
+logger = logging.getLogger('netfix.images')
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'IMAGE_VARIANT_WORKERS', 2),
+            thread_name_prefix='image-variants',
+        )
+    return _executor
+
+
+def variant_name(name, label, extension):
+    """Storage name of a variant, stored next to the original: ``<name>_<label>.<extension>``."""
+    root, _ = os.path.splitext(name)
+    return f'{root}_{label}.{extension}'
+
+
+def available_formats():
+    return [ext for ext, fmt in FORMATS.items() if fmt != 'WEBP' or features.check('webp')]
+
+
+def generate_variants(name, storage=default_storage, force=False):
+    """
+    Write resized WebP and JPEG copies of the image stored as ``name``.
+    Widths the original cannot fill are skipped rather than upscaled, as are
+    variants that already exist unless ``force`` is set. Returns the names
+    written.
+    """
+    with storage.open(name, 'rb') as f:
+        original = Image.open(f)
+        original.load()
+    # Phone photos often rely on the EXIF orientation tag
+    original = ImageOps.exif_transpose(original)
+    if original.mode not in ('RGB', 'L'):
+        background = Image.new('RGB', original.size, 'white')
+        rgba = original.convert('RGBA')
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        original = background
+    elif original.mode == 'L':
+        original = original.convert('RGB')
+
+    written = []
+    for label, width in VARIANT_WIDTHS.items():
+        if width >= original.width:
+            continue
+        resized = None
+        for extension in available_formats():
+            target = variant_name(name, label, extension)
+            if storage.exists(target):
+                if not force:
+                    continue
+                storage.delete(target)
+            if resized is None:
+                height = max(1, round(original.height * width / original.width))
+                resized = original.resize((width, height), Image.LANCZOS)
+            buffer = BytesIO()
+            resized.save(buffer, FORMATS[extension], quality=82, optimize=True)
+            written.append(storage.save(target, ContentFile(buffer.getvalue())))
+    return written
+
+
+def _log_failure(name):
+    def callback(future):
+        # Nothing waits on the future, so this is the only place a failure shows
+        if not future.cancelled() and future.exception() is not None:
+            logger.error("Generating image variants of %s failed", name, exc_info=future.exception())
+    return callback
+
+
+def _submit_variants(name):
+    future = get_executor().submit(generate_variants, name)
+    future.add_done_callback(_log_failure(name))
+    return future
+
+
+def schedule_variants(name):
+    """Generate variants in the worker pool once the upload's transaction commits."""
+    transaction.on_commit(lambda: _submit_variants(name))
+
+
+def existing_variants(name, extension, storage=default_storage):
+    """``(width, url)`` for each variant of ``name`` in ``extension`` present in storage, narrowest first."""
+    variants = []
+    for label, width in VARIANT_WIDTHS.items():
+        target = variant_name(name, label, extension)
+        if storage.exists(target):
+            variants.append((width, storage.url(target)))
+    return variants
+
+
+def srcset(variants):
+    return ', '.join(f'{url} {width}w' for width, url in variants)
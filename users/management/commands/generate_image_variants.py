@@ -0,0 +1,34 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from users import images
+from users.models import Company
+
+
+class Command(BaseCommand):
+    help = "Generate resized WebP and JPEG variants for company images uploaded before they existed."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Regenerate variants that already exist.")
+        parser.add_argument('--workers', type=int, default=settings.IMAGE_VARIANT_WORKERS,
+                            help="Images resized in parallel.")
+
+    def handle(self, *args, **options):
+        names = Company.objects.exclude(image='').exclude(image__isnull=True).values_list('image', flat=True)
+        written = failed = 0
+        with ThreadPoolExecutor(max_workers=max(1, options['workers'])) as executor:
+            futures = {
+                executor.submit(images.generate_variants, name, force=options['force']): name
+                for name in names.iterator()
+            }
+            for future in as_completed(futures):
+                try:
+                    written += len(future.result())
+                except (OSError, ValueError) as e:
+                    failed += 1
+                    self.stderr.write(f"{futures[future]}: {e}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {written} variants for {len(futures)} images; {failed} could not be read."
+        ))
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY
+from django.utils.deprecation import MiddlewareMixin
+
+# Backends that sessions created by earlier releases may name, and what now loads their users
+LEGACY_BACKENDS = {
+    'django.contrib.auth.backends.ModelBackend': 'users.backend.RoleModelBackend',
+}
+
+
+class LegacySessionBackendMiddleware(MiddlewareMixin):
+    """
+    Point sessions that name a backend no longer in AUTHENTICATION_BACKENDS
+    at its replacement, so those visitors stay signed in and have their
+    company or customer loaded with the user. Goes between SessionMiddleware
+    and AuthenticationMiddleware.
+    """
+
+    def process_request(self, request):
+        if settings.SESSION_COOKIE_NAME not in request.COOKIES:
+            return
+        backend = request.session.get(BACKEND_SESSION_KEY)
+        if backend in LEGACY_BACKENDS:
+            request.session[BACKEND_SESSION_KEY] = LEGACY_BACKENDS[backend]
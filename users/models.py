@@ -4,34 +4,41 @@ from django.core.validators import MaxValueValidator, MinValueValidator, FileExt
 from django.core.exceptions import ValidationError
 
 import uuid
-from PIL import Image
 import os
+from functools import lru_cache
 from django.conf import settings
+from django.utils.functional import cached_property
+
+from . import images
+from .uploadhandlers import MAX_IMAGE_SIZE, ImageRejected, check_image_header
+
+@lru_cache(maxsize=None)
+def _ensure_directory(path):
+    os.makedirs(path, exist_ok=True)
 
 def get_unique_filepath(instance, filename):
     extension = filename.split('.')[-1]
     unique_filename = f'{uuid.uuid4()}.{extension}'
     upload_path = f'uploads/company/{unique_filename}'
     
-    # Create the full path
-    full_path = os.path.join(settings.MEDIA_ROOT, 'uploads', 'company')
-    
-    # Create directories if they don't exist
-    os.makedirs(full_path, exist_ok=True)
+    # Create the directory once per process rather than on every upload
+    _ensure_directory(os.path.join(settings.MEDIA_ROOT, 'uploads', 'company'))
     
     return upload_path
 
 def validate_image_size(value):
-    limit = 5 << 20  # 5 MB in bytes (5 * 1024 * 1024)
-    if value.size > limit:
+    if value.size > MAX_IMAGE_SIZE:
          raise ValidationError(f"Image size should not exceed 5 MB. Current size: {value.size / 1024 / 1024:.2f} MB")
      
 def validate_image_format(value):
+    # Only the header is read; the pixel data is never decoded
     try:
-        img = Image.open(value)
-        img.verify()
-    except (IOError, SyntaxError):
-        raise ValidationError("Invalid image file.")   
+        value.seek(0)
+        check_image_header(value.chunks())
+    except ImageRejected as e:
+        raise ValidationError(str(e))
+    finally:
+        value.seek(0)
 
 class User(AbstractUser):
     is_customer = models.BooleanField(default=False)
@@ -58,6 +65,9 @@ class Company(models.Model):
     field = models.CharField(max_length=100, choices=FIELD_CHOICES)
     description = models.TextField(max_length=500, blank=True)
     rating = models.IntegerField(validators=[MaxValueValidator(5), MinValueValidator(0)], default=0)
+    # Running totals over the reviews of every service the company owns
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
     image = models.ImageField(
         upload_to=get_unique_filepath,
         null=True,
@@ -72,6 +82,40 @@ class Company(models.Model):
     def __str__(self):
         return self.user.username
 
+    def save(self, *args, **kwargs):
+        new_image = bool(self.image) and not self.image._committed
+        super().save(*args, **kwargs)
+        if new_image:
+            images.schedule_variants(self.image.name)
+
+    @property
+    def average_rating(self):
+        if not self.rating_count:
+            return None
+        return self.rating_sum / self.rating_count
+
+    @cached_property
+    def image_variants(self):
+        # Variants are written in the background, so fall back to the original until they exist
+        if not self.image:
+            return {}
+        return {ext: images.existing_variants(self.image.name, ext) for ext in images.available_formats()}
+
+    @property
+    def image_thumb(self):
+        jpegs = self.image_variants.get('jpg')
+        if jpegs:
+            return jpegs[0][1]
+        return self.image.url if self.image else ''
+
+    @property
+    def image_srcset(self):
+        return images.srcset(self.image_variants.get('jpg', []))
+
+    @property
+    def image_srcset_webp(self):
+        return images.srcset(self.image_variants.get('webp', []))
+
     def can_create_service(self, service_field):
         return self.field == 'All in One' or self.field == service_field
 
@@ -0,0 +1,93 @@
+from django.conf import settings
+
+from services.models import Review, Service, ServiceRequest
+from services.pagination import paginate
+
+HISTORY_ORDER = ('-requested_date', '-id')
+PENDING_ORDER = ('requested_date', 'id')
+REVIEW_ORDER = ('-created_at', '-id')
+
+
+def _services(user, viewer):
+    return Service.objects.filter(company_id=user.pk), Service.LISTING_ORDER
+
+
+def _pending(user, viewer):
+    # Requests waiting for the company to accept or decline, soonest first
+    if viewer.pk != user.pk:
+        return None
+    requests = ServiceRequest.objects.filter(service__company_id=user.pk, status='PENDING')
+    return requests.select_related('service', 'customer__user'), PENDING_ORDER
+
+
+def _company_history(user, viewer):
+    if viewer.pk != user.pk:
+        return None
+    requests = ServiceRequest.objects.filter(service__company_id=user.pk).exclude(status='PENDING')
+    return requests.select_related('service', 'customer__user'), HISTORY_ORDER
+
+
+def _customer_history(user, viewer):
+    requests = ServiceRequest.objects.filter(customer_id=user.pk)
+    return requests.select_related('service__company__user', 'review'), HISTORY_ORDER
+
+
+def _company_reviews(user, viewer):
+    reviews = Review.objects.filter(service__company_id=user.pk)
+    return reviews.select_related('service', 'customer__user'), REVIEW_ORDER
+
+
+def _customer_reviews(user, viewer):
+    reviews = Review.objects.filter(customer_id=user.pk)
+    return reviews.select_related('service__company__user'), REVIEW_ORDER
+
+
+# Section name -> (title, visible page source), in page order
+COMPANY_SECTIONS = {
+    'services': ("Available Services", _services),
+    'pending': ("Pending Requests", _pending),
+    'history': ("Service Requests", _company_history),
+    'reviews': ("Reviews", _company_reviews),
+}
+CUSTOMER_SECTIONS = {
+    'history': ("Previous Requested Services", _customer_history),
+    'reviews': ("Reviews", _customer_reviews),
+}
+
+
+def _sections(user):
+    if user.is_company:
+        return COMPANY_SECTIONS
+    if user.is_customer:
+        return CUSTOMER_SECTIONS
+    return {}
+
+
+def section_page(user, viewer, name, after=None):
+    """
+    One page of section ``name`` of ``user``'s profile as seen by ``viewer``,
+    or None when there is no such section or it's private to the owner.
+    """
+    sections = _sections(user)
+    if name not in sections:
+        return None
+    section = sections[name][1](user, viewer)
+    if section is None:
+        return None
+    queryset, ordering = section
+    return paginate(queryset, ordering, after=after, page_size=settings.PROFILE_SECTION_PAGE_SIZE)
+
+
+def profile_sections(user, viewer):
+    """The first page of every section of ``user``'s profile that ``viewer`` may see."""
+    sections = []
+    for name, (title, _) in _sections(user).items():
+        page = section_page(user, viewer, name)
+        if page is not None:
+            sections.append({
+                'name': name,
+                'title': title,
+                'template': f'users/sections/{name}.html',
+                'page': page,
+            })
+    return sections
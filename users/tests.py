@@ -1,11 +1,31 @@
 from django.test import TestCase, Client
 from django.urls import reverse
 from django.utils import timezone
-from django.contrib.auth import get_user_model, authenticate
+from django.contrib.auth import BACKEND_SESSION_KEY, get_user_model, authenticate
 from django.core.exceptions import ValidationError
 from .models import User, Customer, Company
 from .forms import CustomerSignUpForm, CompanySignUpForm, UserLoginForm
 from datetime import date, timedelta
+from io import BytesIO, StringIO
+import shutil
+import tempfile
+import time
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import override_settings
+from PIL import Image
+
+from unittest import mock
+
+from django.core.cache import cache
+
+from .backend import RoleModelBackend
+from .images import generate_variants, schedule_variants, variant_name
+from concurrent.futures import Future
+from main.testing import on_commit_callbacks
+from decimal import Decimal
+from services.models import Service, ServiceRequest, Review
 
 class UserModelTests(TestCase):
     def setUp(self):
@@ -76,6 +96,75 @@ class CompanyModelTests(TestCase):
         """Test string representation of Company"""
         self.assertEqual(str(self.company), 'testcompany')
 
+class CompanyImageVariantTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.company = Company.objects.create(
+            user=User.objects.create_user(
+                username='testcompany',
+                email='company@test.com',
+                password='testpass123',
+                is_company=True
+            ),
+            field='Plumbing',
+            image=self.upload('logo.png', (800, 400))
+        )
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def upload(self, name, size):
+        buffer = BytesIO()
+        Image.new('RGBA', size, (200, 40, 40, 128)).save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def test_falls_back_to_original(self):
+        """Test helpers serve the original until variants are generated"""
+        self.assertEqual(self.company.image_thumb, self.company.image.url)
+        self.assertEqual(self.company.image_srcset, '')
+
+    def test_generate_variants(self):
+        """Test every width narrower than the original is written in both formats"""
+        written = generate_variants(self.company.image.name)
+        self.assertEqual(len(written), 6)
+        with Image.open(f'{self.media_root}/{variant_name(self.company.image.name, "medium", "webp")}') as img:
+            self.assertEqual((img.format, img.size), ('WEBP', (300, 150)))
+
+        company = Company.objects.get(pk=self.company.pk)
+        self.assertTrue(company.image_thumb.endswith('_thumb.jpg'))
+        self.assertIn('_large.webp 600w', company.image_srcset_webp)
+        self.assertEqual(generate_variants(self.company.image.name), [])
+
+    def test_failed_generation_is_logged(self):
+        """Test a variant job that raises in the worker pool is logged"""
+        future = Future()
+        with mock.patch('users.images.get_executor') as get_executor:
+            get_executor.return_value.submit.return_value = future
+            with on_commit_callbacks():
+                schedule_variants(self.company.image.name)
+        with self.assertLogs('netfix.images', 'ERROR') as logs:
+            future.set_exception(OSError('disk full'))
+        self.assertIn(self.company.image.name, logs.output[0])
+        self.assertIn('disk full', logs.output[0])
+
+    def test_small_images_are_not_upscaled(self):
+        """Test only widths below the original are generated"""
+        self.company.image = self.upload('small.png', (200, 200))
+        self.company.save()
+        written = generate_variants(self.company.image.name)
+        self.assertEqual(len(written), 2)
+        self.assertTrue(all('_thumb.' in name for name in written))
+
+    def test_backfill_command(self):
+        """Test the backfill command generates variants for existing images"""
+        out = StringIO()
+        call_command('generate_image_variants', stdout=out)
+        self.assertIn('Wrote 6 variants for 1 images', out.getvalue())
+        self.assertIn('srcset=', self.client.get(reverse('profile', args=['testcompany'])).content.decode())
+
 class CustomerSignUpFormTests(TestCase):
     def setUp(self):
         self.valid_data = {
@@ -134,6 +223,72 @@ class CompanySignUpFormTests(TestCase):
         self.assertFalse(form.is_valid())
         self.assertIn('field', form.errors)
 
+class CompanyImageUploadTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.url = reverse('users:register_company')
+        self.data = {
+            'username': 'newcompany',
+            'email': 'newcompany@test.com',
+            'password1': 'testpass123',
+            'password2': 'testpass123',
+            'field': 'Plumbing',
+            'description': 'Test company'
+        }
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def png(self, size=(64, 64), padding=0):
+        buffer = BytesIO()
+        Image.new('RGB', size, 'blue').save(buffer, 'PNG')
+        return buffer.getvalue() + b'\0' * padding
+
+    def post(self, name, content):
+        upload = SimpleUploadedFile(name, content, content_type='image/png')
+        return self.client.post(self.url, dict(self.data, image=upload))
+
+    def test_valid_image_is_saved(self):
+        """Test a valid image upload is stored with the company"""
+        response = self.post('logo.png', self.png())
+        self.assertEqual(response.status_code, 302)
+        company = Company.objects.get(user__username='newcompany')
+        self.assertTrue(company.image.name.startswith('uploads/company/'))
+
+    def test_oversized_image_is_rejected(self):
+        """Test uploads over 5 MB are dropped while streaming"""
+        response = self.post('logo.png', self.png(padding=6 << 20))
+        self.assertEqual(response.status_code, 200)
+        self.assertFormError(response, 'form', 'image', 'Image size should not exceed 5 MB.')
+        self.assertFalse(User.objects.filter(username='newcompany').exists())
+
+    def test_non_image_is_rejected(self):
+        """Test files without a PNG or JPEG signature are rejected"""
+        response = self.post('logo.png', b'GIF89a' + b'0' * 100)
+        self.assertFormError(response, 'form', 'image', 'Upload a valid PNG or JPEG image.')
+
+    def test_huge_dimensions_are_rejected(self):
+        """Test dimensions are checked from the header alone"""
+        response = self.post('logo.png', self.png(size=(7000, 1)))
+        self.assertFormError(
+            response, 'form', 'image',
+            'Image dimensions should not exceed 6000px. Current size: 7000x1px'
+        )
+
+    def test_truncated_image_is_rejected(self):
+        """Test an image that ends before its header is rejected"""
+        response = self.post('logo.png', self.png()[:12])
+        self.assertFormError(response, 'form', 'image', 'Invalid image file.')
+
+    def test_csrf_still_enforced(self):
+        """Test the signup form still requires a CSRF token"""
+        client = Client(enforce_csrf_checks=True)
+        response = client.post(self.url, self.data)
+        self.assertEqual(response.status_code, 403)
+
 class UserViewTests(TestCase):
     def setUp(self):
         self.client = Client()
@@ -232,3 +387,248 @@ class EmailBackendTests(TestCase):
 
         user = authenticate(None, email='wrong@test.com', password='testpass123')
         self.assertIsNone(user)
+
+    def test_inactive_user_cannot_authenticate(self):
+        """Test inactive users are refused like ModelBackend refuses them"""
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(authenticate(None, email='test@test.com', password='testpass123'))
+
+class RoleModelBackendTests(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(
+            user=User.objects.create_user(
+                username='testcompany',
+                email='company@test.com',
+                password='testpass123',
+                is_company=True
+            ),
+            field='Plumbing'
+        )
+        self.customer = Customer.objects.create(
+            user=User.objects.create_user(
+                username='testcustomer',
+                email='customer@test.com',
+                password='testpass123',
+                is_customer=True
+            ),
+            date_of_birth=date(1990, 1, 1)
+        )
+
+    def test_get_user_loads_role(self):
+        """Test the signed-in user comes with their company or customer"""
+        backend = RoleModelBackend()
+        with self.assertNumQueries(1):
+            company_user = backend.get_user(self.company.pk)
+            self.assertEqual(company_user.company.field, 'Plumbing')
+        with self.assertNumQueries(1):
+            customer_user = backend.get_user(self.customer.pk)
+            self.assertEqual(customer_user.customer.date_of_birth, date(1990, 1, 1))
+
+        self.company.user.is_active = False
+        self.company.user.save()
+        self.assertIsNone(backend.get_user(self.company.pk))
+        self.assertIsNone(backend.get_user(0))
+
+    def test_legacy_session_upgraded(self):
+        """Test sessions from the stock ModelBackend stay signed in and move to RoleModelBackend"""
+        self.client.force_login(self.customer.user, backend='django.contrib.auth.backends.ModelBackend')
+        # Rewriting the session is a one-off write the login page's budget leaves out
+        with self.assertLogs('netfix.performance', 'WARNING'):
+            response = self.client.get(reverse('users:login'))
+        self.assertEqual(response.wsgi_request.user, self.customer.user)
+        self.assertEqual(self.client.session[BACKEND_SESSION_KEY], 'users.backend.RoleModelBackend')
+
+    def test_signup_uses_email_backend(self):
+        """Test new accounts are signed in through EmailBackend"""
+        self.client.post(reverse('users:register_customer'), {
+            'username': 'newcustomer',
+            'email': 'new@test.com',
+            'password1': 'complexpass123',
+            'password2': 'complexpass123',
+            'date_of_birth': '1990-01-01'
+        })
+        self.assertEqual(self.client.session[BACKEND_SESSION_KEY], 'users.backend.EmailBackend')
+
+class LoginThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('users:login')
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@test.com',
+            password='testpass123'
+        )
+
+    def tearDown(self):
+        # Don't leave lockouts behind for other tests logging in
+        cache.clear()
+
+    def login(self, password='wrongpass', email='test@test.com', ip='10.0.0.1'):
+        return self.client.post(self.url, {'email': email, 'password': password}, REMOTE_ADDR=ip)
+
+    def test_email_locked_after_repeated_failures(self):
+        """Test an email is locked out after too many failures"""
+        for _ in range(5):
+            self.assertEqual(self.login().status_code, 200)
+        response = self.login()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '60')
+        # Even the right password is refused while locked
+        self.assertEqual(self.login(password='testpass123', ip='10.0.0.2').status_code, 429)
+
+    def test_throttled_attempts_skip_hashing(self):
+        """Test locked out attempts never reach the password hasher"""
+        for _ in range(6):
+            self.login()
+        with mock.patch('django.contrib.auth.hashers.PBKDF2PasswordHasher.encode') as encode:
+            self.assertEqual(self.login().status_code, 429)
+        encode.assert_not_called()
+
+    def test_ip_locked_across_emails(self):
+        """Test one client spraying many emails is locked out by IP"""
+        for i in range(20):
+            self.assertEqual(self.login(email=f'user{i}@test.com').status_code, 200)
+        self.assertEqual(self.login(email='other@test.com').status_code, 429)
+        self.assertEqual(self.login(email='other@test.com', ip='10.0.0.2').status_code, 200)
+
+    def test_lockout_grows_exponentially(self):
+        """Test each repeated lockout lasts twice as long"""
+        for _ in range(6):
+            self.login()
+        with mock.patch('users.throttle.time.time', return_value=time.time() + 61):
+            self.assertEqual(self.login()['Retry-After'], '120')
+
+    def test_success_resets_failures(self):
+        """Test a successful login clears the email's failure count"""
+        for _ in range(4):
+            self.login()
+        self.assertEqual(self.login(password='testpass123').status_code, 302)
+        self.client.logout()
+        for _ in range(4):
+            self.assertEqual(self.login().status_code, 200)
+
+
+@override_settings(PROFILE_SECTION_PAGE_SIZE=2)
+class ProfileSectionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.company = Company.objects.create(
+            user=User.objects.create_user(
+                username='testcompany',
+                password='testpass123',
+                email='company@test.com',
+                is_company=True
+            ),
+            field='Plumbing'
+        )
+        self.customer = Customer.objects.create(
+            user=User.objects.create_user(
+                username='testcustomer',
+                password='testpass123',
+                email='customer@test.com',
+                is_customer=True
+            ),
+            date_of_birth=date(1990, 1, 1)
+        )
+        self.services = [
+            Service.objects.create(
+                company=self.company,
+                name=f'Service {i}',
+                description='Test Description',
+                price_hour=Decimal('50.00'),
+                field='Plumbing'
+            )
+            for i in range(3)
+        ]
+        self.requests = [
+            ServiceRequest.objects.create(
+                service=self.services[0],
+                customer=self.customer,
+                requested_date=timezone.now() + timedelta(days=i + 1),
+                hours_needed=1,
+                status=status
+            )
+            for i, status in enumerate(['PENDING', 'ACCEPTED', 'COMPLETED'])
+        ]
+        Review.objects.create(
+            service_request=self.requests[2],
+            service=self.services[0],
+            customer=self.customer,
+            rating=4,
+            comment='Great job'
+        )
+        self.company_url = reverse('profile', args=['testcompany'])
+        self.customer_url = reverse('profile', args=['testcustomer'])
+
+    def section_names(self, response):
+        return [section['name'] for section in response.context['sections']]
+
+    def test_company_profile_first_pages(self):
+        """Test visitors see the first page of the public sections only"""
+        response = self.client.get(self.company_url)
+        self.assertEqual(self.section_names(response), ['services', 'reviews'])
+        services = response.context['sections'][0]['page']
+        self.assertEqual([s.name for s in services], ['Service 2', 'Service 1'])
+        self.assertContains(response, 'data-fragment')
+        self.assertContains(response, 'Great job')
+
+    def test_owner_sees_requests(self):
+        """Test the company sees its pending requests apart from the rest"""
+        self.client.force_login(self.company.user)
+        response = self.client.get(self.company_url)
+        self.assertEqual(self.section_names(response), ['services', 'pending', 'history', 'reviews'])
+        sections = {section['name']: section['page'] for section in response.context['sections']}
+        self.assertEqual([r.status for r in sections['pending']], ['PENDING'])
+        self.assertEqual([r.status for r in sections['history']], ['COMPLETED', 'ACCEPTED'])
+
+    def test_load_more(self):
+        """Test the fragment endpoint serves the next page of a section"""
+        page = self.client.get(self.company_url).context['sections'][0]['page']
+        url = reverse('profile_section', args=['testcompany', 'services'])
+        response = self.client.get(url, {'after': page.next_cursor})
+        self.assertContains(response, 'Service 0')
+        self.assertNotContains(response, 'Service 1')
+        self.assertNotContains(response, 'data-fragment')
+        self.assertNotContains(response, '<html')
+
+    def test_unavailable_sections(self):
+        """Test unknown, private and badly paged sections are not found"""
+        for username, section, params in [
+            ('testcompany', 'nope', {}),
+            ('testcompany', 'pending', {}),
+            ('testcustomer', 'services', {}),
+            ('testcompany', 'services', {'after': 'bad'}),
+        ]:
+            with self.subTest(section=section, params=params):
+                url = reverse('profile_section', args=[username, section])
+                self.assertEqual(self.client.get(url, params).status_code, 404)
+
+    def test_customer_profile(self):
+        """Test a customer's history and reviews, in a fixed number of queries"""
+        response = self.client.get(self.customer_url)
+        self.assertEqual(self.section_names(response), ['history', 'reviews'])
+        self.assertContains(response, 'Reviewed')
+        with self.assertNumQueries(4):
+            self.client.get(self.customer_url)
+
+        # 500 reviewed bookings cost no more
+        ServiceRequest.objects.bulk_create([
+            ServiceRequest(
+                service=self.services[1],
+                customer=self.customer,
+                requested_date=timezone.now() + timedelta(days=10, minutes=i),
+                status='COMPLETED'
+            )
+            for i in range(500)
+        ])
+        Review.objects.bulk_create([
+            Review(service_request=r, service=self.services[1], customer=self.customer, rating=5)
+            for r in ServiceRequest.objects.filter(service=self.services[1])
+        ])
+        with self.assertNumQueries(4):
+            response = self.client.get(self.customer_url)
+        self.assertEqual(response.content.decode().count('Reviewed'), 2)
+        with self.assertNumQueries(3):
+            self.client.get(reverse('profile_section', args=['testcustomer', 'history']),
+                            {'after': response.context['sections'][0]['page'].next_cursor})
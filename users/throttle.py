@@ -0,0 +1,83 @@
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def _settings():
+    return (
+        getattr(settings, 'LOGIN_FAILURE_LIMITS', {'email': 5, 'ip': 20}),
+        getattr(settings, 'LOGIN_FAILURE_WINDOW', 15 * 60),
+        getattr(settings, 'LOGIN_LOCKOUT_BASE', 60),
+        getattr(settings, 'LOGIN_LOCKOUT_MAX', 60 * 60),
+    )
+
+
+def _identities(request, email):
+    # Hashed so arbitrary emails make safe cache keys
+    email = hashlib.sha256(email.strip().lower().encode()).hexdigest()[:32]
+    ip = request.META.get('REMOTE_ADDR') or 'unknown'
+    return [('email', email), ('ip', ip)]
+
+
+def _failures(scope, ident, now, window):
+    """
+    Sliding-window estimate of recent failures: the current fixed window
+    plus the previous one weighted by how much of it still overlaps.
+    """
+    bucket = int(now // window)
+    current_key = f'login:fail:{scope}:{ident}:{bucket}'
+    previous_key = f'login:fail:{scope}:{ident}:{bucket - 1}'
+    counts = cache.get_many([current_key, previous_key])
+    overlap = 1 - (now % window) / window
+    return counts.get(current_key, 0) + counts.get(previous_key, 0) * overlap
+
+
+def login_retry_after(request, email):
+    """Seconds until ``email`` may try again from this client, or None. Costs one cache read, no hashing."""
+    now = time.time()
+    keys = [f'login:lock:{scope}:{ident}' for scope, ident in _identities(request, email)]
+    locked_until = max(cache.get_many(keys).values(), default=None)
+    if locked_until is None or locked_until <= now:
+        return None
+    return math.ceil(locked_until - now)
+
+
+def record_login_failure(request, email):
+    """
+    Count a failed login against the email and the client IP. An identity
+    that goes over its limit is locked out, for twice as long each time it
+    happens again. Returns the lockout in seconds, or None.
+    """
+    limits, window, base, maximum = _settings()
+    now = time.time()
+    bucket = int(now // window)
+    lockout = None
+    for scope, ident in _identities(request, email):
+        key = f'login:fail:{scope}:{ident}:{bucket}'
+        cache.add(key, 0, window * 2)
+        cache.incr(key)
+        if _failures(scope, ident, now, window) <= limits[scope]:
+            continue
+
+        level_key = f'login:level:{scope}:{ident}'
+        cache.add(level_key, 0, maximum * 4)
+        level = cache.incr(level_key) - 1
+        seconds = min(base * 2 ** level, maximum)
+        cache.set(f'login:lock:{scope}:{ident}', now + seconds, seconds)
+        lockout = max(lockout or 0, seconds)
+    return lockout
+
+
+def reset_login_failures(request, email):
+    """Forget failures and lockout history for an email after it signs in successfully."""
+    window = _settings()[1]
+    bucket = int(time.time() // window)
+    (scope, ident), _ = _identities(request, email)
+    cache.delete_many([
+        f'login:fail:{scope}:{ident}:{bucket}',
+        f'login:fail:{scope}:{ident}:{bucket - 1}',
+        f'login:level:{scope}:{ident}',
+    ])
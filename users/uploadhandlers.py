@@ -0,0 +1,116 @@
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from PIL import Image, ImageFile
+
+MAX_IMAGE_SIZE = 5 << 20  # 5 MB
+# Largest accepted width or height; bigger images are mostly decompression bombs
+MAX_IMAGE_DIMENSION = 6000
+# JPEG EXIF blocks can push the frame header this far into the file
+MAX_HEADER_BYTES = 128 * 1024
+SIGNATURES = {
+    b'\x89PNG\r\n\x1a\n': 'PNG',
+    b'\xff\xd8\xff': 'JPEG',
+}
+
+
+class ImageRejected(ValueError):
+    pass
+
+
+class ImageHeaderReader:
+    """
+    Incrementally check an image from its first bytes: magic number, then
+    format and dimensions from the header. Pixel data is never decoded.
+    """
+    FEED_SIZE = 4096
+
+    def __init__(self):
+        self.parser = ImageFile.Parser()
+        self.read = 0
+        self.format = None
+        self.size = None
+
+    @property
+    def done(self):
+        return self.size is not None
+
+    def feed(self, data):
+        """Feed the next chunk; returns True once the header has been read, raising ImageRejected if it is bad."""
+        if self.done:
+            return True
+        if self.read == 0 and not any(data.startswith(signature) for signature in SIGNATURES):
+            raise ImageRejected("Upload a valid PNG or JPEG image.")
+        # Small slices, so the parser stops as soon as it has the header and
+        # never starts decoding the rest of a large chunk
+        for offset in range(0, len(data), self.FEED_SIZE):
+            try:
+                self.parser.feed(data[offset:offset + self.FEED_SIZE])
+            except Image.DecompressionBombError:
+                raise ImageRejected("Image dimensions are too large.")
+            self.read += len(data[offset:offset + self.FEED_SIZE])
+            image = self.parser.image
+            if image is not None:
+                return self._check(image)
+            if self.read >= MAX_HEADER_BYTES:
+                raise ImageRejected("Invalid image file.")
+        return False
+
+    def _check(self, image):
+        if image.format not in SIGNATURES.values():
+            raise ImageRejected("Upload a valid PNG or JPEG image.")
+        width, height = image.size
+        if max(width, height) > MAX_IMAGE_DIMENSION:
+            raise ImageRejected(
+                f"Image dimensions should not exceed {MAX_IMAGE_DIMENSION}px. "
+                f"Current size: {width}x{height}px"
+            )
+        self.format, self.size = image.format, image.size
+        return True
+
+
+def check_image_header(chunks):
+    """Run ``ImageHeaderReader`` over an iterable of chunks, reading only as far as the header."""
+    reader = ImageHeaderReader()
+    for chunk in chunks:
+        if reader.feed(chunk):
+            return reader
+    raise ImageRejected("Invalid image file.")
+
+
+class ImageUploadHandler(FileUploadHandler):
+    """
+    Validate image uploads in ``field_names`` while they stream in. A file
+    that is too large or does not start with a sane PNG/JPEG header is
+    dropped at the first bad chunk instead of being buffered whole; the
+    reason is left in ``request.upload_errors`` for the form to report.
+    Other files and fields pass straight through to the next handler.
+    """
+
+    def __init__(self, request=None, field_names=('image',)):
+        super().__init__(request)
+        self.field_names = field_names
+        if request is not None and not hasattr(request, 'upload_errors'):
+            request.upload_errors = {}
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.active = field_name in self.field_names
+        self.received = 0
+        self.reader = ImageHeaderReader()
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.active:
+            return raw_data
+        self.received += len(raw_data)
+        try:
+            if self.received > MAX_IMAGE_SIZE:
+                raise ImageRejected("Image size should not exceed 5 MB.")
+            self.reader.feed(raw_data)
+        except ImageRejected as e:
+            self.request.upload_errors[self.field_name] = str(e)
+            raise SkipFile()
+        return raw_data
+
+    def file_complete(self, file_size):
+        # The next handler builds the uploaded file; one that ended before its
+        # header was complete is rejected by validate_image_format
+        return None
@@ -1,11 +1,21 @@
+import math
+
+from django.http import Http404
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.defaultfilters import pluralize
 from django.contrib.auth import login, authenticate
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
 from django.views.generic import CreateView
 
 from .forms import CustomerSignUpForm, CompanySignUpForm, UserLoginForm
-from .models import User, Company, Customer
-from services.models import ServiceRequest, Service
-from utils import calculate_age
+from .models import User
+from .sections import profile_sections, section_page
+from .throttle import login_retry_after, record_login_failure, reset_login_failures
+from .uploadhandlers import ImageUploadHandler
+from services.conditional import company_profile_etag, conditional_page
+from services.pagination import InvalidCursor
+from utils import async_view, calculate_age
 
 
 def register(request):
@@ -24,15 +34,27 @@ class CustomerSignUpView(CreateView):
     def form_valid(self, form):
         user = form.save()
         # Specify the backend when logging in
-        login(self.request, user, backend='django.contrib.auth.backends.ModelBackend')
+        login(self.request, user, backend='users.backend.EmailBackend')
         return redirect('/')
 
 
+# Upload handlers can only be swapped before CSRF checks read request.POST,
+# so the check is moved inside the view
+@method_decorator(csrf_exempt, name='dispatch')
 class CompanySignUpView(CreateView):
     model = User
     form_class = CompanySignUpForm
     template_name = 'users/register_company.html'
 
+    def dispatch(self, request, *args, **kwargs):
+        request.upload_handlers.insert(0, ImageUploadHandler(request))
+        return csrf_protect(super().dispatch)(request, *args, **kwargs)
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs['upload_errors'] = getattr(self.request, 'upload_errors', {})
+        return kwargs
+
     def get_context_data(self, **kwargs):
         kwargs['user_type'] = 'company'
         return super().get_context_data(**kwargs)
@@ -40,7 +62,7 @@ class CompanySignUpView(CreateView):
     def form_valid(self, form):
         user = form.save()
         # Specify the backend when logging in
-        login(self.request, user, backend='django.contrib.auth.backends.ModelBackend')
+        login(self.request, user, backend='users.backend.EmailBackend')
         return redirect('/')
         
 
@@ -50,50 +72,65 @@ def LoginUserView(request):
         if form.is_valid():
             email = form.cleaned_data['email']
             password = form.cleaned_data['password']
+            # Refuse throttled clients before authenticate spends a password hash
+            retry_after = login_retry_after(request, email)
+            if retry_after:
+                return throttled_login(request, form, retry_after)
             user = authenticate(request, email=email, password=password)
             if user:
+                reset_login_failures(request, email)
                 login(request, user)
                 if user.is_customer:
                     return redirect('profile', username=user.username)
                 else:
                     return redirect('profile', username=user.username)
             else:
+                retry_after = record_login_failure(request, email)
+                if retry_after:
+                    return throttled_login(request, form, retry_after)
                 form.add_error(None, "Invalid email or password.")
     else:
         form = UserLoginForm()
     return render(request, 'users/login.html', {'form': form})
 
+def throttled_login(request, form, retry_after):
+    minutes = math.ceil(retry_after / 60)
+    form.add_error(None, f"Too many failed login attempts. Try again in {minutes} minute{pluralize(minutes)}.")
+    response = render(request, 'users/login.html', {'form': form}, status=429)
+    response['Retry-After'] = str(retry_after)
+    return response
+
+@conditional_page(company_profile_etag)
+@async_view
 def ProfileView(request, username):
-    user = get_object_or_404(User, username=username)
-    
+    user = get_object_or_404(User.objects.select_related('customer', 'company'), username=username)
+    if not (user.is_customer or user.is_company):
+        return redirect('/')
+
+    # Only the header and the first page of each section; the rest is
+    # fetched from profile_section as the visitor asks for it
+    context = {
+        'user': user,
+        'profile_user': user,
+        'sections': profile_sections(user, request.user),
+    }
     if user.is_customer:
-        customer = Customer.objects.get(user=user)
-        user_age = calculate_age(customer.date_of_birth)
-        
-        # Get all service requests for this customer, ordered by most recent first
-        service_history = ServiceRequest.objects.filter(
-            customer=customer
-        ).select_related('service', 'service__company').order_by('-requested_date')
-        
-        return render(request, 'users/profile.html', {
-            'user': user,
-            'user_age': user_age,
-            'sh': service_history
-        })
-    
-    elif user.is_company:
-        company = Company.objects.get(user=user)
-        services = Service.objects.filter(company=company)
-        
-        # Get all service requests for this company's services
-        service_requests = ServiceRequest.objects.filter(
-            service__company=company
-        ).select_related('service', 'customer', 'customer__user').order_by('-requested_date')
-        
-        return render(request, 'users/profile.html', {
-            'user': user,
-            'services': services,
-            'service_requests': service_requests
-        })
-    
-    return redirect('/')
+        context['user_age'] = calculate_age(user.customer.date_of_birth)
+    return render(request, 'users/profile.html', context)
+
+
+@conditional_page(company_profile_etag)
+@async_view
+def profile_section(request, username, section):
+    user = get_object_or_404(User, username=username)
+    try:
+        page = section_page(user, request.user, section, after=request.GET.get('after'))
+    except InvalidCursor:
+        raise Http404("Invalid page cursor")
+    if page is None:
+        raise Http404("No such section")
+    return render(request, f'users/sections/{section}.html', {
+        'page': page,
+        'section': section,
+        'profile_user': user,
+    })
@@ -1,5 +1,79 @@
+from contextlib import nullcontext
 from datetime import date
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.db import close_old_connections
+from django.urls import URLPattern, URLResolver
+
+from main.instrumentation import current_query_stats
+
+# The site's URLs with the async twins of views made by async_view
+ASGI_URLCONF = 'netfix.asgi_urls'
+
 
 def calculate_age(born):
     today = date.today()
-    return today.year - born.year - ((today.month, today.day) < (born.month, born.day))
\ No newline at end of file
+    return today.year - born.year - ((today.month, today.day) < (born.month, born.day))
+
+
+def db_sync_to_async(func):
+    """
+    sync_to_async for code that uses the ORM, which has no async API. With
+    settings.ASYNC_DB_THREAD_SENSITIVE the calls share Django's one sync
+    thread; otherwise each runs on a worker thread with its own connection,
+    closed afterwards per CONN_MAX_AGE just as at the end of a request.
+    """
+    thread_sensitive = settings.ASYNC_DB_THREAD_SENSITIVE
+
+    @wraps(func)
+    def run(*args, **kwargs):
+        stats = current_query_stats()
+        try:
+            with stats.count_queries() if stats else nullcontext():
+                return func(*args, **kwargs)
+        finally:
+            if not thread_sensitive:
+                close_old_connections()
+    return sync_to_async(run, thread_sensitive=thread_sensitive)
+
+
+def async_view(view):
+    """
+    Give ``view`` a coroutine twin, ``view.as_async``, that runs it through
+    db_sync_to_async. WSGI keeps serving the plain view, since wrapping it
+    would only add an async_to_sync round trip; ASGI serves the twin through
+    ASGI_URLCONF.
+    """
+    @wraps(view)
+    async def as_async(request, *args, **kwargs):
+        return await db_sync_to_async(view)(request, *args, **kwargs)
+    view.as_async = as_async
+    return view
+
+
+def async_urlpatterns(patterns):
+    """``patterns`` with every view that has an ``as_async`` twin swapped for it."""
+    converted = []
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            converted.append(URLResolver(
+                pattern.pattern, async_urlpatterns(pattern.url_patterns),
+                pattern.default_kwargs, pattern.app_name, pattern.namespace,
+            ))
+        else:
+            callback = getattr(pattern.callback, 'as_async', pattern.callback)
+            converted.append(URLPattern(pattern.pattern, callback, pattern.default_args, pattern.name))
+    return converted
+
+
+class AsyncViewsASGIHandler(ASGIHandler):
+    """ASGIHandler that resolves requests against ASGI_URLCONF."""
+
+    def create_request(self, scope, body_file):
+        request, error_response = super().create_request(scope, body_file)
+        if request is not None:
+            request.urlconf = ASGI_URLCONF
+        return request, error_response